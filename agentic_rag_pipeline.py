@@ -1,17 +1,23 @@
-import sys
-import os
-
-
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from src.model.rewrite_query import process_dialog_symptoms
 from src.search.milvus_search import search_similar_diseases
-from src.rerank.reranker import rerank_diseases_with_topk
+from src.search.cascade import cascade_rank
 from src.model.analyzer import analyze_diagnosis
 from src.search.neo4j_diagnose import neo4j_diagnosis_search
-from src.model.doctor import diagnose
+from src.model.doctor import diagnose, start_diagnosis, continue_diagnosis, fused_diagnose, read_disease_list
 from src.model.rewrite_disease_cause import rewrite_disease_cause
 from src.model.iteration import iterative_diagnose
+from src.model.verifier import verify_diagnosis, ACCEPT, REJECT
+from src.search.fusion import fuse_results
+from src.search.record_store import get_record_store
+from src.search.disease_graph import get_disease_graph
+from src.utils.resilience import BackendError
+from src.utils.planner import ExecutionPlanner
+from src.model.config import CASCADE_CONFIG, DISEASE_GRAPH_CONFIG, VERIFIER_CONFIG, SYMPTOM_WAIT_MAX
+
+_stage_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="stage")
 
 def parse_neo4j_result(neo4j_text: str) -> dict:
     result = {
@@ -70,29 +76,160 @@ def process_graph_data_with_simplified_cause(disease_name: str, neo4j_text: str,
         print(f"处理疾病 {disease_name} 的图数据库信息出错: {str(e)}，跳过该疾病")
         return ""
 
-def get_initial_diagnosis_data(user_input: str, model_name: str = None, top_k: int = 10, silent_mode: bool = False) -> dict:
+def retrieve_with_symptom_extraction(user_input: str, model_name: str = None, top_k: int = 10, silent_mode: bool = False, milvus_results: list = None, planner: ExecutionPlanner = None):
+    # 症状提取与原始对话的推测性检索并行执行；提取结果返回后再用标准化症状检索一次并合并
+    # 提取最多等待到剩余预算只够诊断的时间（且不超过 SYMPTOM_WAIT_MAX），超时时只用推测性检索的结果
+    # 复制当前上下文，使症状提取调用沿用本请求的租户和优先级
+    symptom_future = _stage_executor.submit(contextvars.copy_context().run, process_dialog_symptoms, user_input, model_name)
+
+    if milvus_results is None:
+        if not silent_mode:
+            print(f"\n步骤1: 向量搜索(top_k={top_k})，同时提取症状...")
+        milvus_results = search_similar_diseases(user_input, top_k=top_k, with_desc=False)
+    elif not silent_mode:
+        # 服务模式下原始对话的检索已由批处理器提前完成
+        print("\n步骤1: 使用预取的向量搜索结果，同时提取症状...")
+
+    planner = planner or ExecutionPlanner(model_name=model_name)
+    try:
+        symptoms = symptom_future.result(timeout=planner.wait_time(SYMPTOM_WAIT_MAX, "doctor"))
+    except FutureTimeoutError:
+        if not silent_mode:
+            print("症状提取超时，只使用原始对话的检索结果")
+        planner.skip("symptom_extraction")
+        symptoms = []
+    except Exception as e:
+        print(f"症状提取出错: {str(e)}")
+        symptoms = []
+    if not symptoms:
+        return milvus_results, []
+    if not silent_mode:
+        print(f"提取到症状: {symptoms}")
+
+    symptom_results = search_similar_diseases("，".join(symptoms), top_k=top_k, symptoms=symptoms, with_desc=False)
+    merged_results = fuse_results([
+        (symptom_results, 'similarity_score', 0.6),
+        (milvus_results, 'similarity_score', 0.4)
+    ], top_k)
+    return merged_results, symptoms
+
+def expand_candidates(vector_results: list, disease_names: list, neighbors_per_disease: int = 0) -> list:
+    # 按名称从本地记录库补全不在候选列表中的疾病；neighbors_per_disease>0 时再从近邻表补充相似疾病和并发疾病
+    record_store = get_record_store()
+    if record_store is None or not disease_names:
+        return vector_results
+    known_names = {result.get('name') for result in vector_results}
+    names = list(disease_names)
+    disease_graph = get_disease_graph() if neighbors_per_disease > 0 else None
+    if disease_graph is not None:
+        names.extend(disease_graph.expand(disease_names, neighbors_per_disease, exclude=known_names))
+    expanded_results = list(vector_results)
+    for disease_name in names:
+        if disease_name in known_names:
+            continue
+        record = record_store.get_by_name(disease_name)
+        if record is not None:
+            expanded_results.append(record.to_result(0.0))
+            known_names.add(disease_name)
+    return expanded_results
+
+def add_recommended_candidates(vector_results: list, diagnostic_suggestions: dict) -> list:
+    # 专家推荐但不在候选列表中的疾病及其近邻，从本地记录库补全描述和症状，不再做一次向量检索
+    if not diagnostic_suggestions:
+        return vector_results
+    return expand_candidates(
+        vector_results,
+        diagnostic_suggestions.get("recommended_diseases", []),
+        DISEASE_GRAPH_CONFIG["retry_expand"]
+    )
+
+def fetch_graph_data(target_diseases: list, model_name: str = None, silent_mode: bool = False, graph_cache: dict = None, planner: ExecutionPlanner = None) -> dict:
+    # 查询图数据库并简化病因；每个疾病的病因简化前检查剩余时间是否足够
+    planner = planner or ExecutionPlanner(model_name=model_name)
+    graph_data = {}
+    for disease_name in target_diseases:
+        # 多轮会话中已处理过的疾病直接复用，不再查询图数据库和简化病因
+        if graph_cache is not None and disease_name in graph_cache:
+            graph_data[disease_name] = graph_cache[disease_name]
+            if not silent_mode:
+                print(f"✓ 疾病 {disease_name} 使用会话缓存")
+            continue
+        if not planner.allow("cause_rewrite", "cause_rewrite", "doctor"):
+            if not silent_mode:
+                print("剩余时间不足，跳过其余疾病的病因简化")
+            break
+        if not silent_mode:
+            print(f"查询疾病: {disease_name}")
+        disease_info = neo4j_diagnosis_search(disease_name)
+        if disease_info:
+            processed_info = process_graph_data_with_simplified_cause(
+                disease_name, disease_info, model_name
+            )
+            if processed_info:
+                graph_data[disease_name] = processed_info
+                if graph_cache is not None:
+                    graph_cache[disease_name] = processed_info
+                if not silent_mode:
+                    print(f"✓ 疾病 {disease_name} 信息处理完成")
+            else:
+                if not silent_mode:
+                    print(f"✗ 疾病 {disease_name} 信息处理失败，跳过")
+        else:
+            if not silent_mode:
+                print(f"✗ 疾病 {disease_name} 未找到图数据库信息")
+    return graph_data
+
+def get_initial_diagnosis_data(user_input: str, model_name: str = None, top_k: int = 10, silent_mode: bool = False, milvus_results: list = None, graph_cache: dict = None, extract_symptoms: bool = True, planner: ExecutionPlanner = None, analyze: bool = True) -> dict:
+    # analyze=False 时只做检索和级联筛选，分析与图数据库补充由合并模式的诊断调用决定
+    planner = planner or ExecutionPlanner(model_name=model_name)
     try:
         if not silent_mode:
             print("获取初始诊断数据...")
             print(f"用户输入: {user_input}")
-        if not silent_mode:
-            print(f"\n步骤1: 向量搜索(top_k={top_k})...")
-        milvus_results = search_similar_diseases(user_input, top_k=top_k)
+        symptoms = []
+        if extract_symptoms:
+            milvus_results, symptoms = retrieve_with_symptom_extraction(
+                user_input, model_name, top_k, silent_mode, milvus_results, planner
+            )
+        elif milvus_results is None:
+            if not silent_mode:
+                print(f"\n步骤1: 向量搜索(top_k={top_k})...")
+            milvus_results = search_similar_diseases(user_input, top_k=top_k, with_desc=False)
+        elif not silent_mode:
+            print("\n步骤1: 使用预取的向量搜索结果...")
         if not silent_mode:
             print(f"搜索到 {len(milvus_results)} 个疾病")
         if not milvus_results:
             return {
                 "vector_results": [],
                 "graph_data": {},
+                "symptoms": symptoms,
                 "success": False,
                 "error": "未找到相关疾病信息，请咨询专业医生。"
             }
-        rerank_top_k = 5  
         if not silent_mode:
-            print(f"\n步骤2: 重排序并截断到top{rerank_top_k}...")
-        reranked_results = rerank_diseases_with_topk(user_input, milvus_results, top_k=rerank_top_k)
+            print("\n步骤2: 本地预筛 -> 重排序 -> 按分数分布截断...")
+        # 宽召回结果先经本地症状重合度预筛，只有幸存的候选才送入重排序模型和LLM
+        reranked_results, depths = cascade_rank(user_input, milvus_results, symptoms)
         if not silent_mode:
-            print(f"重排序完成，从{len(milvus_results)}个筛选到{len(reranked_results)}个结果")
+            print(f"级联筛选完成: 召回{depths['ann']} -> 预筛{depths['prefilter']} -> LLM{depths['llm']}")
+        if not analyze:
+            return {
+                "vector_results": reranked_results,
+                "graph_data": {},
+                "symptoms": symptoms,
+                "success": True
+            }
+        # 分析结果只用于决定是否补充图数据库信息；时间不足以完成分析、病因简化和诊断时整体跳过
+        if not planner.allow("graph_enrichment", "analyzer", "cause_rewrite", "doctor"):
+            if not silent_mode:
+                print(f"\n剩余时间 {planner.remaining():.1f}s 不足，跳过分析和图数据库补充")
+            return {
+                "vector_results": reranked_results,
+                "graph_data": {},
+                "symptoms": symptoms,
+                "success": True
+            }
         if not silent_mode:
             print("\n步骤3: 分析诊断...")
         analysis_result = analyze_diagnosis(user_input, reranked_results, model_name)
@@ -112,28 +249,11 @@ def get_initial_diagnosis_data(user_input: str, model_name: str = None, top_k: i
                 print(f"\n需要更多信息，目标疾病: {target_diseases}")
             if not silent_mode:
                 print("\n步骤4: 图数据库查询和病因简化...")
-            graph_data = {}
-            for disease_name in target_diseases:
-                if not silent_mode:
-                    print(f"查询疾病: {disease_name}")
-                disease_info = neo4j_diagnosis_search(disease_name)
-                if disease_info:
-                    processed_info = process_graph_data_with_simplified_cause(
-                        disease_name, disease_info, model_name
-                    )
-                    if processed_info:
-                        graph_data[disease_name] = processed_info
-                        if not silent_mode:
-                            print(f"✓ 疾病 {disease_name} 信息处理完成")
-                    else:
-                        if not silent_mode:
-                            print(f"✗ 疾病 {disease_name} 信息处理失败，跳过")
-                else:
-                    if not silent_mode:
-                        print(f"✗ 疾病 {disease_name} 未找到图数据库信息")
-            filtered_results = reranked_results
+            graph_data = fetch_graph_data(target_diseases, model_name, silent_mode, graph_cache, planner)
+            # 需要区分的疾病补充近邻表中的相似疾病，分析模块提到但不在候选中的疾病补全字段
+            filtered_results = expand_candidates(reranked_results, target_diseases, DISEASE_GRAPH_CONFIG["analyzer_expand"])
             if not silent_mode:
-                print(f"保留所有向量库结果: {len(filtered_results)} 个")
+                print(f"保留所有向量库结果: {len(reranked_results)} 个, 近邻补充: {len(filtered_results) - len(reranked_results)} 个")
                 print(f"获取图数据库信息的疾病: {len(graph_data)} 个") 
         else:
             if not silent_mode:
@@ -145,6 +265,7 @@ def get_initial_diagnosis_data(user_input: str, model_name: str = None, top_k: i
         return {
             "vector_results": filtered_results,
             "graph_data": graph_data,
+            "symptoms": symptoms,
             "success": True
         }
     except Exception as e:
@@ -158,10 +279,25 @@ def get_initial_diagnosis_data(user_input: str, model_name: str = None, top_k: i
             "error": error_msg
         }
         
-def medical_diagnosis_pipeline(user_input: str, model_name: str = None, disease_list_file: str = None, silent_mode: bool = False) -> str:
+def medical_diagnosis_pipeline(user_input: str, model_name: str = None, disease_list_file: str = None, silent_mode: bool = False, milvus_results: list = None, graph_cache: dict = None, extract_symptoms: bool = True, latency_budget: float = None, return_details: bool = False, mode: str = "two_call"):
+    # mode: two_call 为分析+诊断两次调用；fused 为分析与诊断合并的单次调用，需要补充资料时在同一对话中继续
+    # latency_budget: 本次请求剩余的时间预算(秒)，不足时跳过图数据库补充、减少重试或不做专家复核
+    # return_details: 为True时返回包含诊断结果和被跳过阶段的字典
     max_retries = 3
     rejection_count = 0  
+    local_rejections = 0
     previous_suggestions = None  
+    last_diagnosis = None
+    verifications = []
+    planner = ExecutionPlanner(latency_budget, model_name)
+
+    def finish(diagnosis, reviewed=False):
+        if planner.skipped and not silent_mode:
+            print(f"因时间预算跳过的阶段: {planner.skipped}")
+        if not return_details:
+            return diagnosis
+        return {"diagnosis": diagnosis, "reviewed": reviewed, "mode": mode, "verification": verifications, **planner.details()}
+
     if not silent_mode:
         print("=== 开始医疗诊断流程===")
     if not silent_mode:
@@ -171,24 +307,58 @@ def medical_diagnosis_pipeline(user_input: str, model_name: str = None, disease_
     initial_data = get_initial_diagnosis_data(
         user_input=user_input,
         model_name=model_name,
-        top_k=5,  
-        silent_mode=silent_mode
+        top_k=CASCADE_CONFIG["ann_depth"],
+        silent_mode=silent_mode,
+        milvus_results=milvus_results,
+        graph_cache=graph_cache,
+        extract_symptoms=extract_symptoms,
+        planner=planner,
+        analyze=mode != "fused"
     )
     if not initial_data["success"]:
-        return initial_data.get("error", "获取诊断数据失败")
-    vector_results_str = ""
-    for i, disease in enumerate(initial_data["vector_results"], 1):
-        vector_results_str += f"{i}. {disease.get('name', 'Unknown')}\n"
-        vector_results_str += f"   描述：{disease.get('desc', 'No description')}\n"
-        vector_results_str += f"   症状：{disease.get('symptom', 'No symptoms')}\n"
-        vector_results_str += f"   相似度：{disease.get('similarity_score', 0):.3f}\n\n"
-    graph_data_str = ""
-    for disease_name, disease_info in initial_data["graph_data"].items():
-        graph_data_str += f"{disease_info}\n\n"
+        return finish(initial_data.get("error", "获取诊断数据失败"))
+    graph_data = dict(initial_data["graph_data"])
+
+    def review_context(start=0):
+        # 专家复核看到的候选和图数据；合并模式下包含首轮诊断时补充的资料。start>0 时只取新增的候选
+        vector_results_str = ""
+        for i, disease in enumerate(candidate_results[start:], start + 1):
+            vector_results_str += f"{i}. {disease.get('name', 'Unknown')}\n"
+            vector_results_str += f"   描述：{disease.get('desc', 'No description')}\n"
+            vector_results_str += f"   症状：{disease.get('symptom', 'No symptoms')}\n"
+            vector_results_str += f"   相似度：{disease.get('similarity_score', 0):.3f}\n\n"
+        graph_data_str = ""
+        for disease_name, disease_info in graph_data.items():
+            graph_data_str += f"{disease_info}\n\n"
+        return vector_results_str, graph_data_str
+
+    def enrich(disease_names):
+        # 合并模式下模型请求补充资料：与两次调用模式相同的预算检查和图数据库查询
+        if not planner.allow("graph_enrichment", "cause_rewrite", "doctor"):
+            if not silent_mode:
+                print(f"剩余时间 {planner.remaining():.1f}s 不足，不补充图数据库资料")
+            return {}, []
+        expanded = expand_candidates(candidate_results, disease_names, DISEASE_GRAPH_CONFIG["analyzer_expand"])
+        return fetch_graph_data(disease_names, model_name, silent_mode, graph_cache, planner), expanded[len(candidate_results):]
+
     symptoms_str = user_input  
+    if initial_data.get("symptoms"):
+        symptoms_str += f"\n提取症状：{', '.join(initial_data['symptoms'])}"
+    candidate_results = initial_data["vector_results"]
+    disease_names = read_disease_list(disease_list_file)
+    # 医生和专家各自保留一份对话，重试时只追加复核意见和新增候选；*_sent 为对话中已发送的候选数
+    doctor_messages = None
+    doctor_sent = 0
+    expert_messages = None
+    expert_sent = 0
     if not silent_mode:
         print("基础数据获取完成，开始迭代诊断...")
     for attempt in range(max_retries):
+        # 重试需要再做一次诊断和专家复核，时间不够时直接进入最终诊断
+        if attempt > 0 and not planner.allow("retries", "doctor", "expert"):
+            if not silent_mode:
+                print(f"剩余时间 {planner.remaining():.1f}s 不足，停止重试")
+            break
         if not silent_mode:
             print(f"\n{'='*60}")
             print(f"第 {attempt + 1} 次诊断尝试")
@@ -200,29 +370,88 @@ def medical_diagnosis_pipeline(user_input: str, model_name: str = None, disease_
             if not silent_mode:
                 print("调用doctor模块进行诊断...")
             
-            diagnosis_result = diagnose(
-                user_input, 
-                initial_data["vector_results"], 
-                initial_data["graph_data"], 
-                model_name, 
-                disease_list_file, 
-                previous_suggestions  
-            )
+            if attempt == 0 and mode == "fused":
+                fused = fused_diagnose(
+                    user_input,
+                    candidate_results,
+                    model_name,
+                    disease_list_file,
+                    previous_suggestions,
+                    enrich=enrich
+                )
+                diagnosis_result = fused["diagnosis"]
+                if fused["requested"] and not silent_mode:
+                    print(f"合并模式请求补充资料: {fused['requested']}")
+                graph_data.update(fused["graph_data"])
+                candidate_results = candidate_results + fused["extra_results"]
+                doctor_messages = fused["messages"]
+            elif doctor_messages is None:
+                started = start_diagnosis(
+                    user_input, 
+                    candidate_results, 
+                    graph_data, 
+                    model_name, 
+                    disease_list_file, 
+                    previous_suggestions  
+                )
+                diagnosis_result = started["diagnosis"]
+                doctor_messages = started["messages"]
+            else:
+                diagnosis_result = continue_diagnosis(doctor_messages, previous_suggestions, candidate_results[doctor_sent:], model_name)
+            doctor_sent = len(candidate_results)
+            last_diagnosis = diagnosis_result
             
             if not silent_mode:
                 print(f"诊断完成: {diagnosis_result[:100]}...")
+
+            # 本地预检：明显正确或明显错误的诊断不调用专家模型
+            verification = verify_diagnosis(
+                diagnosis_result,
+                candidate_results,
+                disease_names,
+                expert_rejected=rejection_count > local_rejections,
+                allow_reject=local_rejections < VERIFIER_CONFIG["max_local_rejects"]
+            )
+            verifications.append(verification["decision"])
+            if not silent_mode:
+                print(f"本地预检: {verification['decision']} ({verification['reason']})")
+            if verification["decision"] == ACCEPT:
+                return finish(diagnosis_result)
+            if verification["decision"] == REJECT:
+                local_rejections += 1
+                rejection_count += 1
+                previous_suggestions = verification["diagnostic_suggestions"]
+                candidate_results = add_recommended_candidates(candidate_results, previous_suggestions)
+                continue
+
+            if not planner.allow("expert_review", "expert"):
+                if not silent_mode:
+                    print(f"剩余时间 {planner.remaining():.1f}s 不足，返回未经专家复核的诊断")
+                return finish(diagnosis_result)
+
             if not silent_mode:
                 print(f"\n{'='*40}")
                 print("R1专家评估诊断质量...")
                 print(f"{'='*40}")
             
-            expert_review = iterative_diagnose(
-                symptoms=symptoms_str,
-                vector_results=vector_results_str,
-                graph_data=graph_data_str,
-                doctor_diagnosis=diagnosis_result,
-                disease_list_file=disease_list_file
-            )
+            vector_results_str, graph_data_str = review_context(expert_sent if expert_messages else 0)
+            try:
+                expert_review = iterative_diagnose(
+                    symptoms=symptoms_str,
+                    vector_results=vector_results_str,
+                    graph_data=graph_data_str,
+                    doctor_diagnosis=diagnosis_result,
+                    disease_list_file=disease_list_file,
+                    messages=expert_messages
+                )
+                expert_messages = expert_review["messages"]
+                expert_sent = len(candidate_results)
+            except BackendError as e:
+                # 专家模型不可用时不再重复调用doctor，直接返回未经复核的诊断
+                if not silent_mode:
+                    print(f"专家评估不可用，返回未经复核的诊断: {str(e)}")
+                planner.skip("expert_review")
+                return finish(diagnosis_result)
             
             if not silent_mode:
                 print(f"评估结果: {'通过' if expert_review['is_correct'] else '驳回'}")
@@ -232,11 +461,12 @@ def medical_diagnosis_pipeline(user_input: str, model_name: str = None, disease_
                     print(f"\n{'='*60}")
                     print("诊断正确，流程结束")
                     print(f"{'='*60}")
-                return diagnosis_result
+                return finish(diagnosis_result, reviewed=True)
             else:
                 rejection_count += 1
                
                 previous_suggestions = expert_review.get("diagnostic_suggestions")
+                candidate_results = add_recommended_candidates(candidate_results, previous_suggestions)
                 if not silent_mode and previous_suggestions:
                     print(f"建议：{previous_suggestions.get('recommended_diseases', [])}")
                 
@@ -253,10 +483,13 @@ def medical_diagnosis_pipeline(user_input: str, model_name: str = None, disease_
                 print(f"第 {attempt + 1} 次诊断过程出错: {str(e)}")
             continue
     
-    
+    # 连最终诊断的时间都不够时，返回最近一次的诊断结果
+    if last_diagnosis is not None and not planner.allow("final_doctor", "doctor"):
+        return finish(last_diagnosis)
+
     if not silent_mode:
         print(f"\n{'='*60}")
-        print(f"迭代诊断已达到最大重试次数 (共被驳回{rejection_count}次)，使用doctor模块进行最终诊断")
+        print(f"迭代诊断结束 (共被驳回{rejection_count}次)，使用doctor模块进行最终诊断")
         print(f"{'='*60}")
     
     try:
@@ -264,22 +497,26 @@ def medical_diagnosis_pipeline(user_input: str, model_name: str = None, disease_
         if not silent_mode:
             print("调用doctor模块进行最终诊断...")
         
-        final_diagnosis = diagnose(
-            user_input, 
-            initial_data["vector_results"], 
-            initial_data["graph_data"], 
-            model_name, 
-            disease_list_file, 
-            previous_suggestions  
-        )
+        if doctor_messages is not None:
+            # 最后一轮的复核意见尚未发送给医生，在同一对话中追加
+            final_diagnosis = continue_diagnosis(doctor_messages, previous_suggestions, candidate_results[doctor_sent:], model_name)
+        else:
+            final_diagnosis = diagnose(
+                user_input, 
+                candidate_results, 
+                graph_data, 
+                model_name, 
+                disease_list_file, 
+                previous_suggestions  
+            )
         
         if not silent_mode:
             print("doctor模块最终诊断完成")
         
-        return final_diagnosis
+        return finish(final_diagnosis)
         
     except Exception as e:
-        return f"doctor模块最终诊断失败: {str(e)}"
+        return finish(f"doctor模块最终诊断失败: {str(e)}")
 
 if __name__ == "__main__":
     # 示例调用
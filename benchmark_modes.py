@@ -0,0 +1,132 @@
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+
+from agentic_rag_pipeline import medical_diagnosis_pipeline
+from src.model.config import CASCADE_CONFIG, MODELS, STAGE_MODELS
+from src.model.prompt import CRITICAL_DOCTOR_EVALUATION_PROMPT
+from src.model.router import router
+from src.search.milvus_search import search_similar_diseases
+from src.utils.clients import get_openai_client
+from src.utils.resilience import resilient_call
+
+MODES = ["two_call", "fused"]
+
+
+def load_cases(path):
+    # 每行一条JSON：{"input": "医患对话", "disease": "原始标签"}
+    cases = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                cases.append({"input": item.get("input") or item.get("dialog", ""), "disease": item.get("disease", "")})
+    return cases
+
+
+def llm_calls():
+    return sum(endpoint["calls"] for endpoint in router.status().values())
+
+
+def judge(dialog, ground_truth, diagnosis, model_name=None):
+    # 用评估提示词判断诊断是否与原始标签一致；评估失败时返回 None，不计入准确率
+    # 评估直接调用模型、不经过router：不占用诊断阶段的并发和速率配额，也不计入expert阶段的延迟统计和LLM调用次数
+    model_config = MODELS[model_name or STAGE_MODELS["expert"][0]]
+    prompt = CRITICAL_DOCTOR_EVALUATION_PROMPT.format(
+        input_dialog=dialog,
+        ground_truth_disease=ground_truth,
+        predicted_diseases=diagnosis
+    )
+
+    def request_judge(timeout):
+        client = get_openai_client(model_config)
+        return client.chat.completions.create(
+            model=model_config["model_name"],
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0,
+            stream=False,
+            timeout=timeout
+        )
+
+    try:
+        response = resilient_call("expert", request_judge, endpoint="judge")
+        match = re.search(r'<r>\s*([01])\s*</r>', response.choices[0].message.content)
+        return match.group(1) == "1" if match else None
+    except Exception as e:
+        print(f"评估失败: {e}")
+        return None
+
+
+def run_case(case, mode, milvus_results, model_name, disease_list_file):
+    # 逐条顺序执行，LLM调用次数按router计数的差值统计
+    calls_before = llm_calls()
+    start = time.monotonic()
+    result = medical_diagnosis_pipeline(
+        case["input"],
+        model_name=model_name,
+        disease_list_file=disease_list_file,
+        silent_mode=True,
+        milvus_results=milvus_results,
+        return_details=True,
+        mode=mode
+    )
+    return {
+        "mode": mode,
+        "diagnosis": result["diagnosis"],
+        "reviewed": result["reviewed"],
+        "elapsed": time.monotonic() - start,
+        "llm_calls": llm_calls() - calls_before,
+    }
+
+
+def summarize(rows):
+    elapsed = [row["elapsed"] for row in rows]
+    judged = [row["correct"] for row in rows if row.get("correct") is not None]
+    return {
+        "cases": len(rows),
+        "accuracy": round(sum(judged) / len(judged), 4) if judged else None,
+        "judged": len(judged),
+        "reviewed_rate": round(sum(1 for row in rows if row["reviewed"]) / len(rows), 4) if rows else 0.0,
+        "avg_llm_calls": round(float(np.mean([row["llm_calls"] for row in rows])), 2) if rows else 0.0,
+        "p50_s": round(float(np.percentile(elapsed, 50)), 2) if elapsed else 0.0,
+        "p95_s": round(float(np.percentile(elapsed, 95)), 2) if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在同一批病例上对比两次调用模式和合并调用模式的准确率、延迟和LLM调用次数")
+    parser.add_argument('--cases', type=str, required=True, help='病例JSONL，每行 {"input": ..., "disease": ...}')
+    parser.add_argument('--modes', type=str, nargs='+', choices=MODES, default=MODES, help='参与对比的模式')
+    parser.add_argument('--model-name', type=str, default=None, help='固定使用的模型，默认按阶段路由')
+    parser.add_argument('--judge-model', type=str, default=None, choices=list(MODELS), help='评估使用的模型，默认为expert阶段的首选模型')
+    parser.add_argument('--disease-list-file', type=str, default=None, help='可选疾病列表文件')
+    parser.add_argument('--limit', type=int, default=None, help='只评估前N条病例')
+    parser.add_argument('--output', type=str, default=None, help='逐条结果输出路径(JSONL)')
+    args = parser.parse_args()
+
+    cases = load_cases(args.cases)[:args.limit]
+    results = {mode: [] for mode in args.modes}
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    for index, case in enumerate(cases, 1):
+        # 同一病例的检索结果只取一次，两种模式从相同的候选开始
+        milvus_results = search_similar_diseases(case["input"], top_k=CASCADE_CONFIG["ann_depth"], with_desc=False)
+        for mode in args.modes:
+            row = run_case(case, mode, [dict(result) for result in milvus_results], args.model_name, args.disease_list_file)
+            row["correct"] = judge(case["input"], case["disease"], row["diagnosis"], args.judge_model) if case["disease"] else None
+            results[mode].append(row)
+            if output:
+                output.write(json.dumps({"case": index, **row}, ensure_ascii=False) + "\n")
+        print(f"[{index}/{len(cases)}] " + "  ".join(
+            f"{mode}: {results[mode][-1]['elapsed']:.1f}s/{results[mode][-1]['llm_calls']}次/{results[mode][-1]['correct']}"
+            for mode in args.modes
+        ))
+    if output:
+        output.close()
+
+    print()
+    for mode in args.modes:
+        print(f"{mode:<9} {summarize(results[mode])}")
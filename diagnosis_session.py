@@ -0,0 +1,110 @@
+import numpy as np
+
+from agentic_rag_pipeline import medical_diagnosis_pipeline
+from src.search.milvus_search import embed_queries, search_similar_diseases_batch
+from src.search.graph_candidates import get_symptom_graph_index
+from src.utils.resilience import BackendError
+
+# 级联筛选各级写入候选的分数，只对当轮有效
+STAGE_SCORES = ('prefilter_score', 'relevance_score')
+
+
+class DiagnosisSession:
+    # 多轮对话诊断会话：每轮只向量化新增消息，候选池和症状集合未变化时不重新调用LLM
+
+    def __init__(self, model_name: str = None, disease_list_file: str = None, top_k: int = 5, max_pool: int = 20, silent_mode: bool = True):
+        self.model_name = model_name
+        self.disease_list_file = disease_list_file
+        self.top_k = top_k
+        self.max_pool = max_pool
+        self.silent_mode = silent_mode
+
+        self.turns = []
+        self.turn_vectors = []
+        self.candidates = {}
+        self.symptoms = set()
+        self.graph_cache = {}
+
+        self.last_pool = None
+        self.last_symptoms = None
+        self.last_diagnosis = None
+
+    @property
+    def dialog(self) -> str:
+        return "\n".join(self.turns)
+
+    def extract_symptoms(self, message: str) -> set:
+        graph_index = get_symptom_graph_index()
+        if graph_index is None:
+            return set()
+        return {graph_index.symptoms[i] for i in graph_index.match_text(message)}
+
+    def embed_message(self, message: str):
+        try:
+            vector = embed_queries([message])[0]
+        except BackendError as e:
+            print(f"新消息向量化失败，本轮仅使用本地召回: {str(e)}")
+            return None
+        if vector is not None:
+            self.turn_vectors.append(vector)
+        return vector
+
+    def retrieve_delta(self, message: str):
+        vector = self.embed_message(message)
+        queries = [message]
+        vectors = [vector]
+        if len(self.turn_vectors) > 1:
+            # 用各轮向量的均值代表整段对话，避免重新向量化全部历史
+            queries.append(self.dialog)
+            vectors.append(np.mean(self.turn_vectors, axis=0, dtype=np.float32))
+
+        symptoms = sorted(self.symptoms)
+        results = search_similar_diseases_batch(
+            queries,
+            top_k=self.top_k,
+            symptom_lists=[symptoms] * len(queries),
+            vectors=vectors,
+            with_desc=False
+        )
+        for candidates in results:
+            for candidate in candidates:
+                existing = self.candidates.get(candidate['name'])
+                if existing is None or candidate.get('similarity_score', 0) > existing.get('similarity_score', 0):
+                    self.candidates[candidate['name']] = candidate
+
+        if len(self.candidates) > self.max_pool:
+            ranked = sorted(self.candidates.values(), key=lambda c: c.get('similarity_score', 0), reverse=True)
+            self.candidates = {c['name']: c for c in ranked[:self.max_pool]}
+
+    def add_message(self, message: str) -> str:
+        message = (message or "").strip()
+        if not message:
+            return self.last_diagnosis or ""
+
+        self.turns.append(message)
+        self.symptoms |= self.extract_symptoms(message)
+        self.retrieve_delta(message)
+
+        pool = frozenset(self.candidates)
+        symptoms = frozenset(self.symptoms)
+        if self.last_diagnosis is not None and pool == self.last_pool and symptoms == self.last_symptoms:
+            if not self.silent_mode:
+                print("候选疾病和症状均未变化，沿用上一轮诊断")
+            return self.last_diagnosis
+
+        # 候选池跨轮复用：每轮传入副本并去掉上一轮的重排分数，重排序和级联筛选写入的分数不会留在池中
+        ranked = sorted(self.candidates.values(), key=lambda c: c.get('similarity_score', 0), reverse=True)
+        candidates = [{key: value for key, value in c.items() if key not in STAGE_SCORES} for c in ranked]
+        diagnosis = medical_diagnosis_pipeline(
+            self.dialog,
+            model_name=self.model_name,
+            disease_list_file=self.disease_list_file,
+            silent_mode=self.silent_mode,
+            milvus_results=candidates,
+            graph_cache=self.graph_cache,
+            extract_symptoms=False
+        )
+        self.last_pool = pool
+        self.last_symptoms = symptoms
+        self.last_diagnosis = diagnosis
+        return diagnosis
@@ -1,60 +1,88 @@
-import requests
+import base64
 import json
 
-def get_embedding(text: str, api_token: str) -> list:
+import numpy as np
+
+from src.utils.clients import get_http_session
+from src.utils.resilience import resilient_call, BackendError, BackendResponseError
+from src.utils.scheduler import admission, estimate_tokens
+from src.utils.singleflight import get_flight
+
+_embedding_flight = get_flight("embedding")
+
+def request_embeddings(inputs, api_token: str, timeout: float) -> list:
 
     url = "https://api.siliconflow.cn/v1/embeddings"
-    
-    
+
+
+    # base64 返回原始 float32 字节，比JSON浮点数组小得多，也省去逐个解析浮点数
     payload = {
-        "model": "Qwen/Qwen3-Embedding-8B", 
-        "input": text
+        "model": "Qwen/Qwen3-Embedding-8B",
+        "input": inputs,
+        "encoding_format": "base64"
     }
-    
+
     headers = {
         "Authorization": f"Bearer {api_token}",
         "Content-Type": "application/json"
     }
 
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()  
+    response = get_http_session().post(url, json=payload, headers=headers, timeout=timeout)
+    response.raise_for_status()
 
+    try:
         result = response.json()
-        if "data" in result and len(result["data"]) > 0 and "embedding" in result["data"][0]:
-            return result["data"][0]["embedding"]
-        else:
-            print(f"警告: API响应中未找到嵌入数据或数据格式不正确: {result}")
-            return []
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP错误发生: {http_err} - 响应内容: {response.text}")
-        return []
-    except requests.exceptions.ConnectionError as conn_err:
-        print(f"连接错误发生: {conn_err}")
-        return []
-    except requests.exceptions.Timeout as timeout_err:
-        print(f"请求超时: {timeout_err}")
-        return []
-    except requests.exceptions.RequestException as req_err:
-        print(f"请求过程中发生错误: {req_err}")
-        return []
     except json.JSONDecodeError as json_err:
-        print(f"JSON解码错误: {json_err} - 响应内容: {response.text}")
+        raise BackendResponseError("embedding", f"JSON解码错误: {json_err} - 响应内容: {response.text[:200]}")
+    if not result.get("data"):
+        raise BackendResponseError("embedding", f"API响应中未找到嵌入数据或数据格式不正确: {result}")
+    return result["data"]
+
+def decode_embedding(value) -> np.ndarray:
+    # base64 直接解码为 float32 数组；不支持 base64 的服务仍返回浮点列表
+    if isinstance(value, str):
+        return np.frombuffer(base64.b64decode(value), dtype="<f4")
+    return np.asarray(value, dtype=np.float32)
+
+def call_embeddings(inputs, api_token: str) -> list:
+
+    texts = [inputs] if isinstance(inputs, str) else inputs
+    with admission("embedding", estimate_tokens(*texts)):
+        return resilient_call("embedding", lambda timeout: request_embeddings(inputs, api_token, timeout))
+
+def get_embedding(text: str, api_token: str) -> np.ndarray:
+    # 返回 float32 向量；失败时抛出 BackendError
+
+    data = _embedding_flight.do((text, api_token), lambda: call_embeddings(text, api_token))
+    if "embedding" not in data[0]:
+        raise BackendResponseError("embedding", f"API响应中未找到嵌入数据: {data[0]}")
+    return decode_embedding(data[0]["embedding"])
+
+def get_embeddings(texts: list, api_token: str) -> list:
+    # 批量向量化：一次请求返回多个文本的 float32 向量，响应中缺失的位置为 None
+
+    if not texts:
         return []
 
+    # 相同文本批次的并发请求只向量化一次；响应只读共享，下面按下标重新组装
+    data = _embedding_flight.do((tuple(texts), api_token), lambda: call_embeddings(list(texts), api_token))
+    embeddings = [None] * len(texts)
+    for item in data:
+        index = item.get("index")
+        if index is not None and 0 <= index < len(texts) and "embedding" in item:
+            embeddings[index] = decode_embedding(item["embedding"])
+    return embeddings
+
 if __name__ == "__main__":
-    
-    my_api_token = "" 
 
-    
-    text_to_embed = "Silicon flow embedding online: fast, affordable, and high-quality embedding services. come try it out!"
-    embedding = get_embedding(text_to_embed, my_api_token)
+    my_api_token = ""
+
 
-    if embedding:
+    text_to_embed = "Silicon flow embedding online: fast, affordable, and high-quality embedding services. come try it out!"
+    try:
+        embedding = get_embedding(text_to_embed, my_api_token)
         print(f"文本: \"{text_to_embed}\"")
         print(f"嵌入向量维度: {len(embedding)}")
         print(f"嵌入向量（前5个元素）: {embedding[:5]}...")
-    else:
-        print("未能获取嵌入向量。")
-
-
+    except BackendError as e:
+        print(f"未能获取嵌入向量: {e}")
@@ -0,0 +1,287 @@
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+from src.model.config import MILVUS_CONFIG, CASCADE_CONFIG
+from src.search.milvus_search import embed_queries
+from src.search.search_params import DEFAULT_PARAMS_PATH, build_ranker, describe_config
+from src.search.partition_router import searchable_partitions
+from src.utils.clients import get_milvus_client
+
+VECTOR_FIELDS = ["symptom_vector", "desc_vector"]
+
+# IVF每个聚类至少需要约39个训练向量，nlist超过 语料数/39 的配置不参与扫描
+MIN_POINTS_PER_LIST = 39
+
+# 每个配置正式计时前先执行的查询数，排除冷缓存的影响
+WARMUP_QUERIES = 3
+
+
+def load_query_set(path):
+    # 每行一条JSON：{"query": "患者描述", "diseases": ["标注的正确疾病", ...]}，diseases可省略
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            queries.append({"query": item["query"], "diseases": item.get("diseases", [])})
+    return queries
+
+
+def copy_to_scratch(client, scratch_name, dimension, batch_size=500):
+    # 向量复制到临时collection，调参时反复重建索引不影响线上collection
+    from pymilvus import DataType
+
+    if client.has_collection(scratch_name):
+        client.drop_collection(scratch_name)
+    schema = client.create_schema(auto_id=False)
+    schema.add_field("oid", DataType.VARCHAR, max_length=50, is_primary=True)
+    schema.add_field("name", DataType.VARCHAR, max_length=500)
+    for field in VECTOR_FIELDS:
+        schema.add_field(field, DataType.FLOAT_VECTOR, dim=dimension)
+    client.create_collection(scratch_name, schema=schema)
+
+    iterator = client.query_iterator(
+        MILVUS_CONFIG["collection"],
+        batch_size=batch_size,
+        filter='oid != ""',
+        output_fields=["oid", "name"] + VECTOR_FIELDS,
+        partition_names=searchable_partitions()
+    )
+    count = 0
+    while True:
+        rows = iterator.next()
+        if not rows:
+            break
+        client.insert(scratch_name, [{key: row[key] for key in ["oid", "name"] + VECTOR_FIELDS} for row in rows])
+        count += len(rows)
+    iterator.close()
+    client.flush(scratch_name)
+    return count
+
+
+def apply_index(client, collection_name, index_config):
+    # 删除旧的向量索引后按新参数重建并重新加载
+    client.release_collection(collection_name)
+    existing = client.list_indexes(collection_name)
+    for field in VECTOR_FIELDS:
+        if field in existing:
+            client.drop_index(collection_name, field)
+    index_params = client.prepare_index_params()
+    for field in VECTOR_FIELDS:
+        index_params.add_index(
+            field_name=field,
+            index_name=field,
+            index_type=index_config["index_type"],
+            metric_type=index_config["metric_type"],
+            params=index_config["params"]
+        )
+    client.create_index(collection_name, index_params)
+    client.load_collection(collection_name)
+
+
+def index_candidates(args, corpus_size):
+    candidates = [{"index_type": "FLAT", "metric_type": "COSINE", "params": {}}]
+    nlists = [nlist for nlist in args.nlist if nlist * MIN_POINTS_PER_LIST <= corpus_size] or [min(args.nlist)]
+    for nlist in nlists:
+        candidates.append({"index_type": "IVF_FLAT", "metric_type": "COSINE", "params": {"nlist": nlist}})
+    for m in args.hnsw_m:
+        candidates.append({"index_type": "HNSW", "metric_type": "COSINE", "params": {"M": m, "efConstruction": args.ef_construction}})
+    return candidates
+
+
+def search_candidates(args, index_config):
+    if index_config["index_type"] == "FLAT":
+        return [{}]
+    if index_config["index_type"] == "HNSW":
+        return [{"ef": ef} for ef in args.ef]
+    return [{"nprobe": nprobe} for nprobe in args.nprobe if nprobe <= index_config["params"]["nlist"]]
+
+
+def ranker_candidates(args):
+    rankers = [{"type": "weighted", "weights": [float(w) for w in weights.split(",")]} for weights in args.weights]
+    rankers.extend({"type": "rrf", "k": k} for k in args.rrf_k)
+    return rankers
+
+
+def run_queries(client, collection_name, vectors, search_params, limit_factor, ranker_config, top_k):
+    # 逐条查询并计时，返回每个查询的 [(oid, name)] 和延迟（秒）
+    from pymilvus import AnnSearchRequest
+
+    field_limit = top_k * limit_factor
+    param = dict(search_params)
+    if "ef" in param:
+        param["ef"] = max(param["ef"], field_limit)
+    ranker = build_ranker(ranker_config)
+
+    def search(vector):
+        requests = [AnnSearchRequest(data=[vector], anns_field=field, param=param, limit=field_limit) for field in VECTOR_FIELDS]
+        hits = client.hybrid_search(
+            collection_name=collection_name,
+            reqs=requests,
+            ranker=ranker,
+            limit=top_k,
+            output_fields=["name"]
+        )[0]
+        return [(hit.id, hit.entity.get("name")) for hit in hits]
+
+    for vector in vectors[:WARMUP_QUERIES]:
+        search(vector)
+
+    results = []
+    latencies = []
+    for vector in vectors:
+        start = time.perf_counter()
+        results.append(search(vector))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def measure(results, latencies, exact_results, labels):
+    # recall: 与同一融合方式的精确检索(FLAT)结果的重合比例；label_recall: 标注疾病出现在top_k中的比例
+    recalls = []
+    for approx, exact in zip(results, exact_results):
+        exact_ids = {oid for oid, _ in exact}
+        if exact_ids:
+            recalls.append(len(exact_ids & {oid for oid, _ in approx}) / len(exact_ids))
+
+    label_recalls = []
+    for approx, diseases in zip(results, labels):
+        if diseases:
+            names = {name for _, name in approx}
+            label_recalls.append(sum(1 for disease in diseases if disease in names) / len(diseases))
+
+    return {
+        "recall": round(float(np.mean(recalls)), 4) if recalls else 0.0,
+        "label_recall": round(float(np.mean(label_recalls)), 4) if label_recalls else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+    }
+
+
+def dominates(a, b):
+    # a 的召回率和标注召回率都不低于b、p99不高于b，且至少一项更优
+    a_label = a["label_recall"] if a["label_recall"] is not None else 0.0
+    b_label = b["label_recall"] if b["label_recall"] is not None else 0.0
+    not_worse = a["recall"] >= b["recall"] and a_label >= b_label and a["p99_ms"] <= b["p99_ms"]
+    better = a["recall"] > b["recall"] or a_label > b_label or a["p99_ms"] < b["p99_ms"]
+    return not_worse and better
+
+
+def pareto_front(points):
+    return [point for point in points if not any(dominates(other["metrics"], point["metrics"]) for other in points)]
+
+
+def select_config(front, min_recall, label_tolerance):
+    # 在达到最低召回率的Pareto配置中，取标注召回率接近最优（容差内）且p99最低的一个
+    candidates = [point for point in front if point["metrics"]["recall"] >= min_recall] or front
+    labeled = [point for point in candidates if point["metrics"]["label_recall"] is not None]
+    if labeled:
+        best_label = max(point["metrics"]["label_recall"] for point in labeled)
+        candidates = [point for point in labeled if point["metrics"]["label_recall"] >= best_label - label_tolerance]
+    return min(candidates, key=lambda point: point["metrics"]["p99_ms"])
+
+
+def autotune(args):
+    client = get_milvus_client()
+    scratch_name = MILVUS_CONFIG["collection"] + "_autotune"
+
+    query_set = load_query_set(args.queries)
+    query_vectors = embed_queries([item["query"] for item in query_set])
+    valid = [i for i, vector in enumerate(query_vectors) if vector is not None]
+    if not valid:
+        raise RuntimeError("查询向量化全部失败，无法调参")
+    vectors = [query_vectors[i] for i in valid]
+    labels = [query_set[i]["diseases"] for i in valid]
+    print(f"查询集: {len(vectors)} 条可用, 其中 {sum(1 for diseases in labels if diseases)} 条有标注")
+
+    print(f"正在复制向量到临时collection {scratch_name}...")
+    corpus_size = copy_to_scratch(client, scratch_name, MILVUS_CONFIG["dimension"])
+    print(f"语料规模: {corpus_size}")
+
+    limit_factors = args.limit_factor
+    rankers = ranker_candidates(args)
+    points = []
+    exact = {}
+    try:
+        for index_config in index_candidates(args, corpus_size):
+            start = time.monotonic()
+            apply_index(client, scratch_name, index_config)
+            print(f"\n索引 {index_config['index_type']}{index_config['params']} 构建加载耗时 {time.monotonic() - start:.1f}s")
+
+            for search_params, limit_factor, (ranker_index, ranker_config) in itertools.product(
+                    search_candidates(args, index_config), limit_factors, enumerate(rankers)):
+                results, latencies = run_queries(client, scratch_name, vectors, search_params, limit_factor, ranker_config, args.top_k)
+                if index_config["index_type"] == "FLAT":
+                    # FLAT为精确检索，作为同一单字段召回数和融合方式下的基准结果
+                    exact[(limit_factor, ranker_index)] = results
+                config = {
+                    "index": index_config,
+                    "search": {"params": search_params, "limit_factor": limit_factor},
+                    "ranker": ranker_config,
+                }
+                metrics = measure(results, latencies, exact[(limit_factor, ranker_index)], labels)
+                points.append({**config, "metrics": metrics})
+                print(f"  {describe_config(config)}: recall={metrics['recall']:.4f} "
+                      f"label_recall={metrics['label_recall']} p50={metrics['p50_ms']}ms p99={metrics['p99_ms']}ms")
+    finally:
+        if not args.keep_scratch:
+            client.drop_collection(scratch_name)
+
+    front = pareto_front(points)
+    chosen = select_config(front, args.min_recall, args.label_tolerance)
+    output = {
+        "index": chosen["index"],
+        "search": chosen["search"],
+        "ranker": chosen["ranker"],
+        "metrics": chosen["metrics"],
+        "top_k": args.top_k,
+        "corpus_size": corpus_size,
+        "queries": len(vectors),
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "pareto": sorted(front, key=lambda point: point["metrics"]["p99_ms"]),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    # 先写临时文件再替换，运行中的服务不会读到写了一半的参数
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, args.output)
+
+    print(f"\nPareto前沿 {len(front)}/{len(points)} 个配置，选定: {describe_config(chosen)}")
+    print(f"指标: {chosen['metrics']} -> {args.output}")
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在标注查询集上扫描Milvus索引和检索参数，输出Pareto最优配置")
+    parser.add_argument('--queries', type=str, required=True, help='查询集JSONL，每行 {"query": ..., "diseases": [...]}')
+    parser.add_argument('--output', type=str, default=DEFAULT_PARAMS_PATH, help='检索参数输出路径，运行中的检索服务会自动加载')
+    parser.add_argument('--top-k', type=int, default=CASCADE_CONFIG["ann_depth"], help='评估的召回深度')
+    parser.add_argument('--nlist', type=int, nargs='+', default=[128, 256, 512, 1024], help='IVF_FLAT的nlist候选')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32, 64], help='IVF_FLAT的nprobe候选')
+    parser.add_argument('--hnsw-m', type=int, nargs='*', default=[16], help='HNSW的M候选，为空时不测试HNSW')
+    parser.add_argument('--ef-construction', type=int, default=200, help='HNSW的efConstruction')
+    parser.add_argument('--ef', type=int, nargs='+', default=[64, 128, 256], help='HNSW的ef候选（自动不小于单字段召回数）')
+    parser.add_argument('--limit-factor', type=int, nargs='+', default=[1, 2, 4], help='单字段召回数 = top_k × limit_factor')
+    parser.add_argument('--weights', type=str, nargs='*', default=["0.6,0.4", "0.5,0.5", "0.7,0.3"], help='WeightedRanker权重候选（symptom,desc）')
+    parser.add_argument('--rrf-k', type=int, nargs='*', default=[60], help='RRFRanker的k候选，为空时不测试RRF')
+    parser.add_argument('--min-recall', type=float, default=0.95, help='选定配置需达到的最低召回率')
+    parser.add_argument('--label-tolerance', type=float, default=0.01, help='标注召回率与最优值的允许差距')
+    parser.add_argument('--keep-scratch', action='store_true', help='保留临时collection')
+    parser.add_argument('--apply-index', action='store_true', help='调参完成后按选定索引参数重建线上collection的索引')
+    args = parser.parse_args()
+
+    result = autotune(args)
+    if args.apply_index:
+        print(f"正在重建 {MILVUS_CONFIG['collection']} 的向量索引...")
+        apply_index(get_milvus_client(), MILVUS_CONFIG["collection"], result["index"])
+        print("索引重建完成")
+    else:
+        print("索引参数将在下次 insert.py 全量写入或重建索引时生效，可用 --apply-index 立即重建")
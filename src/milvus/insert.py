@@ -1,26 +1,44 @@
+import argparse
 import json
-import sys
+import hashlib
 import os
+import numpy as np
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pymilvus import connections, db, Collection, FieldSchema, CollectionSchema, DataType, utility
 import time
 
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'embedding'))
-from embedding import get_embedding
+from src.embedding.embedding import get_embedding
+from src.utils.resilience import BackendError
+from src.search.lexical_index import build_lexical_index
+from src.search.record_store import build_record_store
+from src.neo4j.source_parser import GraphColumns, MilvusRecords, iter_batches
+from src.search.search_params import get_search_params
+from src.search.partition_router import department_of, partition_name, write_partition_map
+from src.search.graph_snapshot import get_graph_snapshot
+from src.model.config import MILVUS_CONFIG, PARTITION_CONFIG
 
 class MilvusInserter:
     def __init__(self, host="localhost", port="19530"):
         self.host = host
         self.port = port
         self.api_token = "" # embedding model api token
-        self.database_name = "llm_medication"
-        self.collection_name = "medication"  
-        self.partition_name = "knowledge_base"
-        self.dimension = 4096
+        # 与检索模块使用同一个collection，同步后的数据对线上查询立即可见
+        self.database_name = MILVUS_CONFIG["database"]
+        self.collection_name = MILVUS_CONFIG["collection"]
+        self.partition_name = MILVUS_CONFIG["partition"]
+        # 按科室分区写入时，分区名 -> 科室名
+        self.partition_by_department = PARTITION_CONFIG["enabled"]
+        self.partition_departments = {}
+        self.snapshot = None
+        self.dimension = MILVUS_CONFIG["dimension"]
+        self.zero_vector = np.zeros(self.dimension, dtype=np.float32)
         self.batch_size = 20
         self.failed_oids = []  
+        self.vector_fields = ["symptom_vector", "desc_vector"]
+        # 索引类型和参数使用 src/milvus/autotune.py 的调参结果，未调参时为 IVF_FLAT/nlist=128
+        self.index_params = dict(get_search_params()["index"])
         
     def connect_milvus(self):
 
@@ -47,7 +65,8 @@ class MilvusInserter:
             FieldSchema(name="desc", dtype=DataType.VARCHAR, max_length=30000),  # 原始desc数据
             FieldSchema(name="symptom", dtype=DataType.VARCHAR, max_length=5000),  # 原始症状数组的JSON字符串
             FieldSchema(name="symptom_vector", dtype=DataType.FLOAT_VECTOR, dim=self.dimension),  # symptom向量
-            FieldSchema(name="desc_vector", dtype=DataType.FLOAT_VECTOR, dim=self.dimension)  # desc向量
+            FieldSchema(name="desc_vector", dtype=DataType.FLOAT_VECTOR, dim=self.dimension),  # desc向量
+            FieldSchema(name="content_hash", dtype=DataType.VARCHAR, max_length=64)  # name/desc/symptom的内容哈希，增量同步用
         ]
         
         schema = CollectionSchema(fields, "医疗知识库 - 支持symptom和desc双向量检索")
@@ -75,26 +94,36 @@ class MilvusInserter:
     def vectorize_symptoms(self, symptoms_list):
        
         if not symptoms_list:
-            return [0.0] * self.dimension
+            return self.zero_vector
             
         
         symptoms_text = " ".join(symptoms_list)
-        vector = get_embedding(symptoms_text, self.api_token)
+        try:
+            vector = get_embedding(symptoms_text, self.api_token)
+        except BackendError as e:
+            print(f"向量化失败: {e}")
+            return None
         
-        if not vector or len(vector) != self.dimension:
-            return [0.0] * self.dimension
+        if len(vector) != self.dimension:
+            print(f"向量维度错误: {len(vector)}")
+            return None
             
         return vector
 
     def vectorize_desc(self, desc_text):
         
         if not desc_text or not desc_text.strip():
-            return [0.0] * self.dimension
+            return self.zero_vector
             
-        vector = get_embedding(desc_text, self.api_token)
+        try:
+            vector = get_embedding(desc_text, self.api_token)
+        except BackendError as e:
+            print(f"向量化失败: {e}")
+            return None
         
-        if not vector or len(vector) != self.dimension:
-            return [0.0] * self.dimension
+        if len(vector) != self.dimension:
+            print(f"向量维度错误: {len(vector)}")
+            return None
             
         return vector
         
@@ -104,6 +133,22 @@ class MilvusInserter:
             return ""
         return text[:max_length] if len(text) > max_length else text
 
+    def content_hash(self, name, desc, symptom):
+        # 只对向量化的内容求哈希；科室变化只移动分区，不需要重新向量化
+        content = json.dumps([name, desc, symptom], ensure_ascii=False)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def record_partition(self, record):
+        # 未启用科室分区时所有记录写入 knowledge_base
+        if not self.partition_by_department:
+            return None
+        if self.snapshot is None:
+            self.snapshot = get_graph_snapshot()
+        department = department_of(record, self.snapshot)
+        name = partition_name(department)
+        self.partition_departments[name] = department
+        return name
+
     def process_record(self, record):
         
         try:
@@ -120,8 +165,13 @@ class MilvusInserter:
             desc_vector = self.vectorize_desc(desc_text)
             
             
-            symptom_failed = (symptom_vector == [0.0] * self.dimension and symptoms)
-            desc_failed = (desc_vector == [0.0] * self.dimension and desc_text.strip())
+            # 向量化失败时显式返回 None，入库时以零向量占位
+            symptom_failed = symptom_vector is None
+            desc_failed = desc_vector is None
+            if symptom_failed:
+                symptom_vector = self.zero_vector
+            if desc_failed:
+                desc_vector = self.zero_vector
             
             
             if symptom_failed or desc_failed:
@@ -132,14 +182,20 @@ class MilvusInserter:
                 })
                 
           
+            partition = self.record_partition(record)
             processed_record = {
                 "oid": oid,
+                "partition": partition or self.partition_name,
                 "name": self.truncate_text(record.get("name", ""), 500),
                 "desc": self.truncate_text(desc_text, 30000),  
                 "symptom": self.truncate_text(json.dumps(symptoms, ensure_ascii=False), 5000),  
                 "symptom_vector": symptom_vector,  
                 "desc_vector": desc_vector  
             }
+            # 向量化失败的记录不写入哈希，下次同步时会被重新处理
+            processed_record["content_hash"] = "" if (symptom_failed or desc_failed) else self.content_hash(
+                processed_record["name"], processed_record["desc"], processed_record["symptom"]
+            )
             
             return processed_record
             
@@ -150,8 +206,12 @@ class MilvusInserter:
     def load_data(self, file_path):
         
         print(f"正在加载数据文件: {file_path}")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if os.path.isdir(file_path):
+            # 与图谱构建共用source_parser输出的列存目录；记录按需从文件流式读取，不整体载入内存
+            data = MilvusRecords(GraphColumns(file_path))
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
         print(f"数据加载完成，共 {len(data)} 条记录")
         return data
         
@@ -161,11 +221,183 @@ class MilvusInserter:
             return
             
         
-        insert_data = []
-        for field in ["oid", "name", "desc", "symptom", "symptom_vector", "desc_vector"]:
-            insert_data.append([record[field] for record in batch_data])
-            
-        collection.insert(insert_data, partition_name=self.partition_name)
+        fields = ["oid", "name", "desc", "symptom", "symptom_vector", "desc_vector", "content_hash"]
+        if not self.partition_by_department:
+            insert_data = []
+            for field in fields:
+                insert_data.append([record[field] for record in batch_data])
+
+            # 以oid为主键upsert，重复运行不会产生重复记录
+            collection.upsert(insert_data, partition_name=self.partition_name)
+            return
+
+        # upsert只作用于单个分区；先在整个collection中删除这些oid，记录换科室或从knowledge_base迁移时不会留下旧副本
+        collection.delete(expr=f"oid in {json.dumps([record['oid'] for record in batch_data])}")
+        by_partition = {}
+        for record in batch_data:
+            by_partition.setdefault(record["partition"], []).append(record)
+        for partition, records in by_partition.items():
+            if not collection.has_partition(partition):
+                collection.create_partition(partition)
+            collection.insert([[record[field] for record in records] for field in fields], partition_name=partition)
+
+    def build_partition_map(self, collection):
+        # 每个科室分区的症状向量均值作为路由质心，写入分区映射文件供检索模块加载
+        partitions = []
+        centroids = []
+        for partition in collection.partitions:
+            if not partition.name.startswith("dept_"):
+                continue
+            total = np.zeros(self.dimension, dtype=np.float64)
+            count = 0
+            iterator = collection.query_iterator(
+                batch_size=1000,
+                expr='oid != ""',
+                output_fields=["symptom_vector"],
+                partition_names=[partition.name]
+            )
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                for row in rows:
+                    vector = np.asarray(row["symptom_vector"], dtype=np.float32)
+                    norm = np.linalg.norm(vector)
+                    # 空症状和向量化失败的记录是零向量，不参与质心计算
+                    if norm > 0:
+                        total += vector / norm
+                    count += 1
+            iterator.close()
+            if count == 0:
+                continue
+            partitions.append({
+                "name": partition.name,
+                "department": self.partition_departments.get(partition.name, partition.name),
+                "count": count
+            })
+            centroids.append(total / count)
+        if partitions:
+            write_partition_map(partitions, np.vstack(centroids))
+
+    def ensure_indexes(self, collection):
+        
+        for field in self.vector_fields:
+            if collection.has_index(index_name=field):
+                continue
+            print(f"正在为{field}创建向量索引...")
+            collection.create_index(field, self.index_params, index_name=field)
+
+    def fetch_existing_hashes(self, collection):
+        # 返回 oid -> (content_hash, 所在分区)；逐个分区查询，查询结果本身不带分区名
+        
+        hashes = {}
+        for partition in collection.partitions:
+            iterator = collection.query_iterator(
+                batch_size=1000,
+                expr='oid != ""',
+                output_fields=["oid", "content_hash"],
+                partition_names=[partition.name]
+            )
+            while True:
+                rows = iterator.next()
+                if not rows:
+                    break
+                for row in rows:
+                    hashes[row["oid"]] = (row["content_hash"], partition.name)
+            iterator.close()
+        return hashes
+
+    def move_records(self, collection, moves):
+        # moves: oid -> 目标分区；内容未变只换分区的记录取出已有向量，删除旧副本后写入新分区，不重新向量化
+        fields = ["oid", "name", "desc", "symptom", "symptom_vector", "desc_vector", "content_hash"]
+        oids = sorted(moves)
+        for i in range(0, len(oids), 1000):
+            expr = f"oid in {json.dumps(oids[i:i + 1000])}"
+            rows = collection.query(expr=expr, output_fields=fields)
+            collection.delete(expr=expr)
+            by_partition = {}
+            for row in rows:
+                by_partition.setdefault(moves[row["oid"]], []).append(row)
+            for partition, records in by_partition.items():
+                if not collection.has_partition(partition):
+                    collection.create_partition(partition)
+                collection.insert([[record[field] for record in records] for field in fields], partition_name=partition)
+
+    def sync(self, file_path, compact_threshold=0.2):
+        # 增量同步：只重新向量化内容变化的记录，删除源文件中已不存在的OID
+        
+        self.connect_milvus()
+        self.create_database()
+        collection = self.create_collection()
+        if "content_hash" not in {field.name for field in collection.schema.fields}:
+            raise RuntimeError(f"Collection '{self.collection_name}' 缺少content_hash字段，请先用run()全量重建")
+        collection.load()
+
+        raw_data = self.load_data(file_path)
+        existing_hashes = self.fetch_existing_hashes(collection)
+        print(f"Collection中已有 {len(existing_hashes)} 条记录")
+
+        changed_records = []
+        moves = {}
+        stale_oids = []
+        source_oids = set()
+        for record in raw_data:
+            oid = record.get("_id", {}).get("$oid", "")
+            if not oid:
+                continue
+            source_oids.add(oid)
+            symptom_json = self.truncate_text(json.dumps(record.get("symptom", []), ensure_ascii=False), 5000)
+            record_hash = self.content_hash(
+                self.truncate_text(record.get("name", ""), 500),
+                self.truncate_text(record.get("desc", ""), 30000),
+                symptom_json
+            )
+            existing_hash, existing_partition = existing_hashes.get(oid, (None, None))
+            partition = self.record_partition(record) or self.partition_name
+            if existing_hash != record_hash:
+                changed_records.append(record)
+                if existing_partition not in (None, partition):
+                    # 内容和分区都变化：upsert只作用于目标分区，旧分区中的副本需先删除
+                    stale_oids.append(oid)
+            elif existing_partition != partition:
+                moves[oid] = partition
+        removed_oids = sorted(set(existing_hashes) - source_oids)
+        print(f"需要更新 {len(changed_records)} 条，移动分区 {len(moves)} 条，删除 {len(removed_oids)} 条")
+
+        for i in range(0, len(stale_oids), 1000):
+            collection.delete(expr=f"oid in {json.dumps(stale_oids[i:i + 1000])}")
+
+        processed_count = 0
+        for i in tqdm(range(0, len(changed_records), self.batch_size), desc="同步批次"):
+            processed_batch = []
+            for record in changed_records[i:i + self.batch_size]:
+                processed_record = self.process_record(record)
+                if processed_record:
+                    processed_batch.append(processed_record)
+                    processed_count += 1
+            self.insert_data_batch(collection, processed_batch)
+        self.move_records(collection, moves)
+
+        for i in range(0, len(removed_oids), 1000):
+            collection.delete(expr=f"oid in {json.dumps(removed_oids[i:i + 1000])}")
+        collection.flush()
+
+        # 新segment和压缩后的segment都由Milvus在后台建索引，collection全程保持加载，同步期间检索不中断
+        # 变化比例超过阈值时压缩，清理删除留下的碎片segment
+        changed_fraction = (len(changed_records) + len(moves) + len(removed_oids)) / max(1, len(existing_hashes))
+        if changed_fraction > compact_threshold:
+            print(f"变化比例 {changed_fraction:.1%} 超过阈值 {compact_threshold:.0%}，压缩segment")
+            collection.compact()
+            collection.wait_for_compaction_completed()
+        self.ensure_indexes(collection)
+        collection.load()
+        if self.partition_by_department:
+            self.build_partition_map(collection)
+
+        build_lexical_index(raw_data)
+        build_record_store(raw_data)
+
+        print(f"\n✅ 增量同步完成! 更新: {processed_count}, 移动分区: {len(moves)}, 删除: {len(removed_oids)}, 向量化失败: {len(self.failed_oids)}")
         
     def run(self, file_path):
         
@@ -185,14 +417,14 @@ class MilvusInserter:
             
             print(f"开始处理数据，批量大小: {self.batch_size}")
             print("将同时向量化symptom和desc字段...")
-            batches = [raw_data[i:i+self.batch_size] for i in range(0, len(raw_data), self.batch_size)]
+            batch_count = (len(raw_data) + self.batch_size - 1) // self.batch_size
             
             processed_count = 0
-            for batch_idx, batch in enumerate(tqdm(batches, desc="处理批次")):
+            for batch_idx, batch in enumerate(tqdm(iter_batches(raw_data, self.batch_size), total=batch_count, desc="处理批次")):
                 processed_batch = []
                 
                 # 处理当前批次
-                for record in tqdm(batch, desc=f"批次 {batch_idx+1}/{len(batches)}", leave=False):
+                for record in tqdm(batch, desc=f"批次 {batch_idx+1}/{batch_count}", leave=False):
                     processed_record = self.process_record(record)
                     if processed_record:
                         processed_batch.append(processed_record)
@@ -206,19 +438,17 @@ class MilvusInserter:
                 time.sleep(0.5)
                 
             
-            print("正在为symptom_vector创建向量索引...")
-            index_params = {
-                "metric_type": "COSINE",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 128}
-            }
-            collection.create_index("symptom_vector", index_params)
-            
-            print("正在为desc_vector创建向量索引...")
-            collection.create_index("desc_vector", index_params)
+            self.ensure_indexes(collection)
             
             # 加载Collection
             collection.load()
+            if self.partition_by_department:
+                self.build_partition_map(collection)
+
+            # 同步构建本地关键词索引，供混合检索的BM25召回使用
+            build_lexical_index(raw_data)
+            # 本地疾病记录库：检索只从Milvus取主键，字段在本地补全
+            build_record_store(raw_data)
             
             print(f"\n✅ 数据插入完成!")
             print(f"总记录数: {len(raw_data)}")
@@ -244,7 +474,14 @@ class MilvusInserter:
             raise
 
 if __name__ == "__main__":
-    file_path = ""
+    parser = argparse.ArgumentParser(description="将疾病数据写入Milvus")
+    parser.add_argument('--file', type=str, default="", help='JSON数据文件路径')
+    parser.add_argument('--sync', action='store_true', help='增量同步：只处理内容变化的记录')
+    parser.add_argument('--compact-threshold', type=float, default=0.2, help='变化比例超过该值时压缩segment')
+    args = parser.parse_args()
     
     inserter = MilvusInserter()
-    inserter.run(file_path)
+    if args.sync:
+        inserter.sync(args.file, compact_threshold=args.compact_threshold)
+    else:
+        inserter.run(args.file)
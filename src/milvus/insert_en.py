@@ -1,14 +1,13 @@
 import json
-import sys
-import os
+import numpy as np
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pymilvus import connections, db, Collection, FieldSchema, CollectionSchema, DataType, utility
 import time
 
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'embedding'))
-from embedding import get_embedding
+from src.embedding.embedding import get_embedding
+from src.utils.resilience import BackendError
 
 class MilvusInserter:
     def __init__(self, host="localhost", port="19530"):
@@ -19,6 +18,7 @@ class MilvusInserter:
         self.collection_name = "medication2_en"  
         self.partition_name = "knowledge_base_en"
         self.dimension = 4096
+        self.zero_vector = np.zeros(self.dimension, dtype=np.float32)
         self.batch_size = 20
         self.failed_oids = []  
         
@@ -75,26 +75,36 @@ class MilvusInserter:
     def vectorize_symptoms(self, symptoms_list):
        
         if not symptoms_list:
-            return [0.0] * self.dimension
+            return self.zero_vector
             
         
         symptoms_text = " ".join(symptoms_list)
-        vector = get_embedding(symptoms_text, self.api_token)
+        try:
+            vector = get_embedding(symptoms_text, self.api_token)
+        except BackendError as e:
+            print(f"向量化失败: {e}")
+            return None
         
-        if not vector or len(vector) != self.dimension:
-            return [0.0] * self.dimension
+        if len(vector) != self.dimension:
+            print(f"向量维度错误: {len(vector)}")
+            return None
             
         return vector
 
     def vectorize_desc(self, desc_text):
         
         if not desc_text or not desc_text.strip():
-            return [0.0] * self.dimension
+            return self.zero_vector
             
-        vector = get_embedding(desc_text, self.api_token)
+        try:
+            vector = get_embedding(desc_text, self.api_token)
+        except BackendError as e:
+            print(f"向量化失败: {e}")
+            return None
         
-        if not vector or len(vector) != self.dimension:
-            return [0.0] * self.dimension
+        if len(vector) != self.dimension:
+            print(f"向量维度错误: {len(vector)}")
+            return None
             
         return vector
         
@@ -123,8 +133,13 @@ class MilvusInserter:
             desc_vector = self.vectorize_desc(desc_text)
             
             
-            symptom_failed = (symptom_vector == [0.0] * self.dimension and symptoms)
-            desc_failed = (desc_vector == [0.0] * self.dimension and desc_text.strip())
+            # 向量化失败时显式返回 None，入库时以零向量占位
+            symptom_failed = symptom_vector is None
+            desc_failed = desc_vector is None
+            if symptom_failed:
+                symptom_vector = self.zero_vector
+            if desc_failed:
+                desc_vector = self.zero_vector
             
            
             if symptom_failed or desc_failed:
@@ -0,0 +1,279 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from pymilvus import Collection, utility
+from tqdm import tqdm
+
+from src.milvus.insert import MilvusInserter
+from src.model.config import MILVUS_CONFIG
+from src.search.lexical_index import build_lexical_index
+from src.search.record_store import build_record_store
+from src.search.partition_router import DEFAULT_PARTITION_MAP_PATH, DEFAULT_CENTROIDS_PATH
+
+# 目录格式：manifest.json + 每个分区一个子目录，子目录中每个字段一个 .npy 文件
+# 向量字段为 (N, dim) float32，标量字段为定长unicode数组，与Milvus bulk insert的NumPy格式一致，可直接上传后导入
+FORMAT_VERSION = 1
+SCALAR_FIELDS = ["oid", "name", "desc", "symptom", "content_hash"]
+VECTOR_FIELDS = ["symptom_vector", "desc_vector"]
+FIELDS = SCALAR_FIELDS + VECTOR_FIELDS
+
+# 分区路由文件随快照一起复制，导入环境无需重新计算质心
+ROUTING_FILES = {
+    "partition_map.json": DEFAULT_PARTITION_MAP_PATH,
+    "partition_centroids.npy": DEFAULT_CENTROIDS_PATH,
+}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count_rows(collection, partition):
+    return collection.query(expr="", output_fields=["count(*)"], partition_names=[partition])[0]["count(*)"]
+
+
+def export_partition(collection, partition, directory, dimension, batch_size=1000):
+    # 向量边读边写入内存映射的npy文件，不在内存中保留整个分区的向量
+    rows = count_rows(collection, partition)
+    os.makedirs(directory, exist_ok=True)
+    vectors = {
+        field: np.lib.format.open_memmap(os.path.join(directory, f"{field}.npy"), mode='w+', dtype=np.float32, shape=(rows, dimension))
+        for field in VECTOR_FIELDS
+    }
+    scalars = {field: [] for field in SCALAR_FIELDS}
+
+    iterator = collection.query_iterator(
+        batch_size=batch_size,
+        expr='oid != ""',
+        output_fields=FIELDS,
+        partition_names=[partition]
+    )
+    written = 0
+    while True:
+        batch = iterator.next()
+        if not batch:
+            break
+        # 导出期间有写入时行数可能超过统计值，多出的行不导出
+        batch = batch[:rows - written]
+        for field in VECTOR_FIELDS:
+            vectors[field][written:written + len(batch)] = [row[field] for row in batch]
+        for field in SCALAR_FIELDS:
+            scalars[field].extend(row.get(field) or "" for row in batch)
+        written += len(batch)
+        if written >= rows:
+            break
+    iterator.close()
+
+    for field in VECTOR_FIELDS:
+        vectors[field].flush()
+        del vectors[field]
+    if written < rows:
+        # 导出期间有删除，截断到实际行数
+        for field in VECTOR_FIELDS:
+            path = os.path.join(directory, f"{field}.npy")
+            np.save(path + ".tmp.npy", np.load(path, mmap_mode='r')[:written])
+            os.replace(path + ".tmp.npy", path)
+    for field in SCALAR_FIELDS:
+        np.save(os.path.join(directory, f"{field}.npy"), np.array(scalars[field], dtype=str))
+
+    return written
+
+
+def export_snapshot(output_dir, version=None, collection_name=None):
+    # 导出collection的全部字段（含两个向量字段），生成带校验和的manifest；默认为检索使用的collection
+
+    inserter = MilvusInserter()
+    inserter.collection_name = collection_name or inserter.collection_name
+    inserter.connect_milvus()
+    inserter.create_database()
+    if not utility.has_collection(inserter.collection_name):
+        raise RuntimeError(f"Collection '{inserter.collection_name}' 不存在")
+    collection = Collection(inserter.collection_name)
+    collection.load()
+
+    version = version or time.strftime("%Y%m%d%H%M%S")
+    os.makedirs(output_dir, exist_ok=True)
+    partitions = {}
+    for partition in tqdm([p.name for p in collection.partitions if p.name != "_default"], desc="导出分区"):
+        directory = os.path.join(output_dir, partition)
+        rows = export_partition(collection, partition, directory, inserter.dimension)
+        if rows == 0:
+            shutil.rmtree(directory)
+            continue
+        partitions[partition] = {
+            "rows": rows,
+            "files": {
+                field: {"path": f"{partition}/{field}.npy", "sha256": file_sha256(os.path.join(directory, f"{field}.npy"))}
+                for field in FIELDS
+            }
+        }
+
+    routing = {}
+    for name, source in ROUTING_FILES.items():
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(output_dir, name))
+            routing[name] = file_sha256(os.path.join(output_dir, name))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "snapshot_version": version,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "database": inserter.database_name,
+        "collection": inserter.collection_name,
+        "dimension": inserter.dimension,
+        "fields": FIELDS,
+        "index_params": inserter.index_params,
+        "rows": sum(partition["rows"] for partition in partitions.values()),
+        "partitions": partitions,
+        "routing": routing,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 快照导出完成: 版本 {version}, {manifest['rows']} 条记录, {len(partitions)} 个分区 -> {output_dir}")
+    return manifest
+
+
+def load_manifest(snapshot_dir, verify=True):
+    # 校验格式版本和每个文件的sha256，任何不一致都拒绝导入
+    with open(os.path.join(snapshot_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"不支持的快照格式版本: {manifest.get('format_version')}")
+    if not verify:
+        return manifest
+
+    checks = [(entry["path"], entry["sha256"]) for partition in manifest["partitions"].values() for entry in partition["files"].values()]
+    checks.extend(manifest["routing"].items())
+    for path, expected in tqdm(checks, desc="校验文件"):
+        actual = file_sha256(os.path.join(snapshot_dir, path))
+        if actual != expected:
+            raise ValueError(f"快照文件校验失败: {path} (期望 {expected[:12]}, 实际 {actual[:12]})")
+    return manifest
+
+
+def wait_for_bulk_insert(task_ids, poll_interval=2.0):
+    from pymilvus import BulkInsertState
+
+    pending = dict(task_ids)
+    while pending:
+        for task_id, partition in list(pending.items()):
+            state = utility.get_bulk_insert_state(task_id)
+            if state.state == BulkInsertState.ImportFailed:
+                raise RuntimeError(f"分区 {partition} 批量导入失败: {state.failed_reason}")
+            if state.state == BulkInsertState.ImportCompleted:
+                print(f"分区 {partition} 导入完成: {state.row_count} 行")
+                del pending[task_id]
+        if pending:
+            time.sleep(poll_interval)
+
+
+def import_partition_batched(collection, partition, directory, batch_size):
+    # 向量以mmap方式读取，按批写入，不一次性载入整个分区
+    # 列式写入时pymilvus按位置对应schema字段，列的顺序必须取自collection的schema，而不是快照的 FIELDS 顺序
+    schema_fields = [field.name for field in collection.schema.fields]
+    if set(schema_fields) != set(FIELDS):
+        raise ValueError(f"collection字段 {schema_fields} 与快照字段 {FIELDS} 不一致")
+    columns = {field: np.load(os.path.join(directory, f"{field}.npy"), mmap_mode='r') for field in FIELDS}
+    rows = len(columns["oid"])
+    for start in range(0, rows, batch_size):
+        end = min(start + batch_size, rows)
+        collection.insert([
+            columns[field][start:end].tolist() if field in SCALAR_FIELDS else list(np.asarray(columns[field][start:end]))
+            for field in schema_fields
+        ], partition_name=partition)
+    return rows
+
+
+def rebuild_local_indexes(snapshot_dir, manifest):
+    # 记录库和关键词索引只依赖标量字段，直接由快照生成
+    records = []
+    for partition in manifest["partitions"]:
+        directory = os.path.join(snapshot_dir, partition)
+        columns = {field: np.load(os.path.join(directory, f"{field}.npy")) for field in ["oid", "name", "desc", "symptom"]}
+        for oid, name, desc, symptom in zip(columns["oid"], columns["name"], columns["desc"], columns["symptom"]):
+            records.append({"_id": {"$oid": str(oid)}, "name": str(name), "desc": str(desc), "symptom": json.loads(str(symptom) or "[]")})
+    build_lexical_index(records)
+    build_record_store(records)
+
+
+def import_snapshot(snapshot_dir, mode="insert", remote_prefix=None, drop=False, batch_size=500, verify=True, collection_name=None):
+    # mode=insert: 从本地文件分批写入；mode=bulk: 快照目录已上传到Milvus的对象存储，remote_prefix为其路径
+    # 默认导入检索使用的collection（MILVUS_CONFIG["collection"]），与快照导出时的collection名无关
+
+    manifest = load_manifest(snapshot_dir, verify)
+    inserter = MilvusInserter()
+    inserter.collection_name = collection_name or inserter.collection_name
+    if manifest["dimension"] != inserter.dimension:
+        raise ValueError(f"快照向量维度 {manifest['dimension']} 与配置 {inserter.dimension} 不一致")
+    if mode == "bulk" and not remote_prefix:
+        raise ValueError("bulk 模式需要指定 --remote-prefix")
+
+    inserter.connect_milvus()
+    inserter.create_database()
+    if drop and utility.has_collection(inserter.collection_name):
+        print(f"删除已有Collection '{inserter.collection_name}'")
+        utility.drop_collection(inserter.collection_name)
+    collection = inserter.create_collection()
+    if collection.num_entities > 0:
+        raise RuntimeError(f"Collection '{inserter.collection_name}' 非空，使用 --drop 后重新导入")
+
+    print(f"正在导入快照 {manifest['snapshot_version']}: {manifest['rows']} 条记录, {len(manifest['partitions'])} 个分区")
+    task_ids = {}
+    for partition in tqdm(manifest["partitions"], desc="导入分区"):
+        if not collection.has_partition(partition):
+            collection.create_partition(partition)
+        if mode == "bulk":
+            files = [f"{remote_prefix.rstrip('/')}/{partition}/{field}.npy" for field in FIELDS]
+            task_ids[utility.do_bulk_insert(inserter.collection_name, files, partition_name=partition)] = partition
+        else:
+            import_partition_batched(collection, partition, os.path.join(snapshot_dir, partition), batch_size)
+    if task_ids:
+        wait_for_bulk_insert(task_ids)
+    collection.flush()
+
+    if collection.num_entities != manifest["rows"]:
+        raise RuntimeError(f"导入行数 {collection.num_entities} 与快照记录数 {manifest['rows']} 不一致")
+
+    inserter.ensure_indexes(collection)
+    collection.load()
+
+    for name, target in ROUTING_FILES.items():
+        if name in manifest["routing"]:
+            shutil.copyfile(os.path.join(snapshot_dir, name), target)
+    rebuild_local_indexes(snapshot_dir, manifest)
+    print(f"\n✅ 快照导入完成: 版本 {manifest['snapshot_version']}, {manifest['rows']} 条记录")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出/导入Milvus向量快照，新环境无需重新向量化")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help='导出collection到快照目录')
+    export_parser.add_argument('--output', type=str, required=True, help='快照输出目录')
+    export_parser.add_argument('--version', type=str, default=None, help='快照版本号，默认使用导出时间')
+    export_parser.add_argument('--collection', type=str, default=MILVUS_CONFIG["collection"], help='导出的collection，默认为检索使用的collection')
+
+    import_parser = subparsers.add_parser("import", help='从快照目录导入collection')
+    import_parser.add_argument('--snapshot', type=str, required=True, help='快照目录')
+    import_parser.add_argument('--mode', type=str, choices=["insert", "bulk"], default="insert", help='insert: 本地分批写入; bulk: Milvus批量导入')
+    import_parser.add_argument('--remote-prefix', type=str, default=None, help='bulk模式下快照目录在Milvus对象存储中的路径')
+    import_parser.add_argument('--drop', action='store_true', help='导入前删除已有collection')
+    import_parser.add_argument('--batch-size', type=int, default=500, help='insert模式每批写入的记录数')
+    import_parser.add_argument('--skip-verify', action='store_true', help='跳过sha256校验')
+    import_parser.add_argument('--collection', type=str, default=MILVUS_CONFIG["collection"], help='导入的collection，默认为检索使用的collection')
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_snapshot(args.output, args.version, args.collection)
+    else:
+        import_snapshot(args.snapshot, args.mode, args.remote_prefix, args.drop, args.batch_size, not args.skip_verify, args.collection)
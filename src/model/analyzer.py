@@ -1,22 +1,14 @@
-from openai import OpenAI
-from src.model.config import MODELS, DEFAULT_MODEL
 from src.model.prompt import SYSTEM_PROMPT
+from src.model.router import router
+from src.utils.clients import get_openai_client
+from src.utils.scheduler import estimate_tokens
 from src.utils.extract_diagnosis import extract_diagnosis_result
+from src.utils.structured import structured_enabled, structured_prompt, completion_options, max_tokens, parse_structured
 
 def analyze_diagnosis(user_input, disease_results, model_name=None):
+    # model_name 为空时由router按 "analyzer" 阶段配置选择模型
 
-    if model_name is None:
-        model_name = DEFAULT_MODEL
-    
     try:
-      
-        model_config = MODELS[model_name]
-        
-       
-        client = OpenAI(
-            api_key=model_config["api_key"],
-            base_url=model_config["base_url"]
-        )
        
         disease_info = ""
         for i, disease in enumerate(disease_results, 1):
@@ -26,19 +18,29 @@ def analyze_diagnosis(user_input, disease_results, model_name=None):
             disease_info += f"   相似度：{disease['similarity_score']:.3f}\n\n"
         
        
-        system_prompt = SYSTEM_PROMPT.replace("{disease_results}", disease_info)
+        system_prompt = structured_prompt("analyzer", SYSTEM_PROMPT.replace("{disease_results}", disease_info))
+        structured = structured_enabled()
         
-        response = client.chat.completions.create(
-            model=model_config["model_name"],
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_input}
-            ],
-            stream=False
-        )
+        def request_analysis(model_config, timeout):
+            client = get_openai_client(model_config)
+            return client.chat.completions.create(
+                model=model_config["model_name"],
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_input}
+                ],
+                stream=False,
+                timeout=timeout,
+                **(completion_options("analyzer", model_config) if structured else {})
+            )
+
+        output_tokens = (max_tokens("analyzer") or 0) if structured else 0
+        response = router.call("analyzer", request_analysis, model_name, tokens=estimate_tokens(system_prompt, user_input, max_tokens=output_tokens))
         
        
         content = response.choices[0].message.content
+        if structured:
+            return parse_structured("analyzer", content, model_name)
         return extract_diagnosis_result(content)
         
     except Exception as e:
@@ -1,17 +1,183 @@
 
+# max_concurrency: 单个端点同时进行的请求数上限；rate_limit: 每分钟请求数上限(可选)
+# response_format: 端点支持的结构化输出方式，json_schema / json_object，不支持时为 None
 MODELS = {
     "deepseek": {
         "api_key": "",
         "base_url": "",
-        "model_name": ""
+        "model_name": "",
+        "max_concurrency": 8,
+        "rate_limit": 60,
+        "response_format": "json_object"
     },
     "qwen": {
-        "api_key": ", 
+        "api_key": "",
         "base_url": "",
-        "model_name": ""
+        "model_name": "",
+        "max_concurrency": 16,
+        "rate_limit": 300,
+        "response_format": "json_object"
     },
 
 }
 
 
 DEFAULT_MODEL = "deepseek"
+
+
+# 各阶段可路由的模型端点，router会在其中选择延迟最低的健康端点
+# 分析和病因改写只需要轻量模型，专家评估使用推理模型
+STAGE_MODELS = {
+    "analyzer": ["qwen", "deepseek"],
+    "symptom": ["qwen", "deepseek"],
+    "cause_rewrite": ["qwen", "deepseek"],
+    "doctor": ["deepseek", "qwen"],
+    "expert": ["deepseek"],
+    "repair": ["qwen", "deepseek"],
+}
+
+
+# 远程调用策略：超时(秒)、重试、对冲请求与熔断
+BACKEND_POLICIES = {
+    "default": {
+        "timeout": 30,
+        "max_retries": 2,
+        "backoff_base": 0.5,
+        "backoff_max": 4.0,
+        "hedge": False,
+        "hedge_min_samples": 20,
+        "hedge_min_delay": 0.2,
+        "failure_threshold": 5,
+        "reset_timeout": 30,
+        # 单个后端同时占用共享线程池的调用数上限，超时后仍在运行的调用也计入，直到真正结束
+        "max_inflight": 16,
+    },
+    "embedding": {
+        "timeout": 10,
+        "backoff_base": 0.2,
+        "hedge": True,
+    },
+    "rerank": {
+        "timeout": 10,
+        "max_retries": 1,
+        "backoff_base": 0.2,
+        "hedge": True,
+    },
+    "llm": {
+        "timeout": 60,
+    },
+    "expert": {
+        "timeout": 120,
+        "max_retries": 1,
+    },
+}
+
+
+# 各阶段的预估耗时(秒)：尚无实时延迟统计时供截止时间规划器使用
+STAGE_LATENCY_DEFAULTS = {
+    "analyzer": 5.0,
+    "cause_rewrite": 3.0,
+    "doctor": 15.0,
+    "expert": 40.0,
+}
+# 预估耗时乘以该系数后再与剩余预算比较，留出波动余量
+PLANNER_SAFETY_FACTOR = 1.2
+# 某阶段的实时样本数达到该值后才使用实时延迟，否则使用上面的默认值
+PLANNER_MIN_SAMPLES = 5
+# 等待症状提取结果的上限(秒)；超时后只用原始对话的检索结果，提取不再阻塞后续阶段
+SYMPTOM_WAIT_MAX = 8.0
+
+
+# 外部模型调用的准入控制与多租户公平调度
+SCHEDULER_CONFIG = {
+    "enabled": True,
+    "max_wait": 30.0,  # 排队超过该时间(秒)的请求被拒绝
+    # 优先级类别：weight 为加权公平队列的权重，max_queue 为排队深度上限
+    "classes": {
+        "interactive": {"weight": 8, "max_queue": 128},
+        "batch": {"weight": 1, "max_queue": 512, "reserve_for_interactive": 4},
+    },
+    # 每类后端同时进行的调用数上限
+    "backends": {
+        "default": {"concurrency": 16},
+        "llm": {"concurrency": 24},
+        "expert": {"concurrency": 8},
+        "embedding": {"concurrency": 16},
+        "rerank": {"concurrency": 8},
+    },
+    # 租户默认配额（每分钟），可在 tenants 中按租户覆盖
+    "tenant_defaults": {"requests_per_minute": 600, "tokens_per_minute": 1000000, "weight": 1.0},
+    "tenants": {},
+}
+
+
+# 检索和图数据库连接配置
+MILVUS_CONFIG = {
+    "uri": "http://localhost:19530",
+    "database": "llm_medication",
+    "collection": "medication2",
+    "partition": "knowledge_base",
+    "dimension": 4096,
+}
+
+NEO4J_CONFIG = {
+    "uri": "bolt://localhost:7687",
+    "user": "neo4j",
+    "password": "neo4j123",
+    "name": "neo4j",
+}
+
+
+# 级联检索：宽召回 -> 本地预筛 -> 远程重排 -> LLM，每级保留的数量按分数分布在[min, max]之间自适应
+CASCADE_CONFIG = {
+    "ann_depth": 100,          # 第一级向量/关键词/图召回的候选数
+    "prefilter_min": 10,
+    "prefilter_max": 20,       # 送入重排序模型的候选上限
+    "prefilter_ratio": 0.35,   # 预筛分数低于最高分该比例的候选被截断
+    "overlap_weight": 0.4,     # 预筛分数中症状重合度的权重，其余为融合召回分数
+    "llm_min": 3,
+    "llm_max": 5,              # 送入LLM的候选上限
+    "llm_ratio": 0.5,
+}
+
+# 按科室分区：写入时每个科室一个分区，检索时按查询向量与各分区质心的相似度只检索最相关的几个分区
+PARTITION_CONFIG = {
+    "enabled": True,               # 写入时按科室分区；检索在分区映射文件存在时才路由
+    "default_department": "其他",  # 源数据和图谱中都没有科室的疾病
+    "top_n": 3,                    # 每个查询检索的分区数
+    "min_score": 0.2,              # 与最近质心的相似度低于该值时做全量检索
+    "idle_release_seconds": 1800,  # 超过该时间未被检索的分区从内存中释放
+    "release_check_interval": 60,
+}
+
+# 离线疾病近邻图：每个疾病按向量相似度取k个近邻，并合并图谱中的并发疾病
+DISEASE_GRAPH_CONFIG = {
+    "k": 10,                      # 每个疾病保留的向量近邻数
+    "max_complications": 5,       # 每个疾病最多合并的并发疾病数
+    "complication_bonus": 0.1,    # 并发疾病在近邻排序中的加分
+    "retry_expand": 2,            # 专家驳回后，每个推荐疾病额外补充的近邻数
+    "analyzer_expand": 1,         # 分析模块判定需要区分的疾病，每个额外补充的近邻数
+}
+
+# 专家复核前的本地预检：明显正确的诊断直接通过，格式错误或疾病名称不在目录中的诊断直接驳回，其余交给专家模型
+VERIFIER_CONFIG = {
+    "enabled": True,
+    "accept_min_score": 0.5,      # 首选疾病为重排第一名，且重排分数不低于该值
+    "accept_margin": 0.2,         # 且与第二名的重排分数差不低于该值时直接通过
+    "max_local_rejects": 1,       # 每个请求本地驳回的次数上限，超过后交给专家模型
+    "suggestions": 3,             # 本地驳回时推荐的疾病数
+}
+
+# 结构化输出：分析、症状提取、病因简化和专家评估直接输出JSON对象，按阶段限制输出长度，不再从自由文本中提取标签
+STRUCTURED_OUTPUT_CONFIG = {
+    "enabled": True,
+    # json_mode: 是否使用端点的JSON模式；max_tokens 为 None 时不限制
+    "stages": {
+        "analyzer": {"max_tokens": 150, "json_mode": True},
+        "symptom": {"max_tokens": 300, "json_mode": True},
+        "cause_rewrite": {"max_tokens": 120, "json_mode": True},
+        # 推理模型不支持JSON模式，且max_tokens包含推理过程，不做限制
+        "expert": {"max_tokens": None, "json_mode": False},
+    },
+    "repair_max_tokens": 300,      # 输出不合格时修复调用的输出上限
+}
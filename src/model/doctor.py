@@ -1,43 +1,47 @@
-import requests
 import json
 import os
-from src.model.config import MODELS, DEFAULT_MODEL
-from src.model.prompt import DOCTOR_SYSTEM_PROMPT
+from src.model.prompt import DOCTOR_SYSTEM_PROMPT, DOCTOR_RETRY_PROMPT, FUSED_DOCTOR_SYSTEM_PROMPT, FUSED_ENRICHMENT_PROMPT
+from src.model.router import router
+from src.utils.resilience import BackendResponseError
+from src.utils.scheduler import estimate_tokens
+from src.utils.clients import get_http_session
+from src.utils.extract_diagnosis import extract_tagged_json
 
-def load_disease_list(file_path: str = None) -> str:
+def read_disease_list(file_path: str = None) -> list:
+    # 疾病列表文件为Python列表字面量或每行一个疾病名称；文件不存在或读取失败时返回空列表
 
     if not file_path or not os.path.exists(file_path):
-        return ""
+        return []
     
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read().strip()
             if not content:
-                return ""
+                return []
             
 
             try:
                 import ast
                 disease_list = ast.literal_eval(content)
-                if isinstance(disease_list, list):
-                    formatted_list = ", ".join(disease_list)
-                    return f"可选疾病列表：{formatted_list}\n\n"
-                else:
-                    return ""
+                return disease_list if isinstance(disease_list, list) else []
             except:
           
                 lines = content.split('\n')
-                diseases = [line.strip() for line in lines if line.strip()]
-                if diseases:
-                    formatted_list = ", ".join(diseases)
-                    return f"可选疾病列表：{formatted_list}\n\n"
-                return ""
+                return [line.strip() for line in lines if line.strip()]
                 
     except Exception as e:
         print(f"读取疾病列表文件出错: {str(e)}")
+        return []
+
+def load_disease_list(file_path: str = None) -> str:
+
+    diseases = read_disease_list(file_path)
+    if not diseases:
         return ""
+    formatted_list = ", ".join(diseases)
+    return f"可选疾病列表：{formatted_list}\n\n"
 
-def diagnose(user_input: str, vector_results: list, graph_data: dict, model_name: str = DEFAULT_MODEL, disease_list_file: str = None, diagnostic_suggestions: dict = None) -> str:
+def format_vector_results(vector_results: list) -> str:
 
     vector_info = ""
     for i, result in enumerate(vector_results, 1):
@@ -45,15 +49,18 @@ def diagnose(user_input: str, vector_results: list, graph_data: dict, model_name
         vector_info += f"   描述：{result.get('desc', '')}\n"
         vector_info += f"   症状：{result.get('symptom', '')}\n"
         vector_info += f"   相似度：{result.get('similarity_score', 0):.4f}\n\n"
+    return vector_info
+
+def format_graph_data(graph_data: dict) -> str:
 
     graph_info = ""
     if graph_data:
         for key, value in graph_data.items():
             graph_info += f"{key}：{value}\n\n"
+    return graph_info
 
-    disease_list_info = load_disease_list(disease_list_file)
+def format_suggestions(diagnostic_suggestions: dict = None) -> str:
 
-    suggestions_info = ""
     if diagnostic_suggestions:
         recommended_diseases = diagnostic_suggestions.get("recommended_diseases", [])
         reason = diagnostic_suggestions.get("reason", "")
@@ -62,49 +69,112 @@ def diagnose(user_input: str, vector_results: list, graph_data: dict, model_name
             if reason:
                 suggestions_info += f"建议原因：{reason}\n"
             suggestions_info += "请参考以上建议进行诊断。"
-        else:
-            suggestions_info = "暂无特殊建议"
-    else:
-        suggestions_info = "暂无特殊建议"
-    
-    # 手动替换占位符来避免与JSON格式冲突
-    system_prompt = DOCTOR_SYSTEM_PROMPT.replace("{vector_results}", vector_info)
-    system_prompt = system_prompt.replace("{disease_list}", disease_list_info)
-    system_prompt = system_prompt.replace("{graph_data}", graph_info)
-    system_prompt = system_prompt.replace("{diagnostic_suggestions}", suggestions_info)
-    
-    # 获取模型配置
-    model_config = MODELS.get(model_name, MODELS[DEFAULT_MODEL])
-    
-    # 构建请求
-    headers = {
-        "Authorization": f"Bearer {model_config['api_key']}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": model_config["model_name"],
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_input}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 500
-    }
+            return suggestions_info
+    return "暂无特殊建议"
 
-    try:
-        response = requests.post(
+def request_chat(messages: list, model_name: str = None, max_tokens: int = 500) -> str:
+    # 按 "doctor" 阶段路由的一次对话请求；失败时抛出 BackendError，由调用方决定重试或终止
+
+    def request_diagnosis(model_config, timeout):
+        headers = {
+            "Authorization": f"Bearer {model_config['api_key']}",
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "model": model_config["model_name"],
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": max_tokens
+        }
+
+        response = get_http_session().post(
             f"{model_config['base_url']}/chat/completions",
             headers=headers,
             json=data,
-            timeout=30
+            timeout=timeout
         )
         response.raise_for_status()
-        
-        result = response.json()
-        diagnosis_text = result["choices"][0]["message"]["content"]
-        
-        return diagnosis_text
-        
-    except Exception as e:
-        return f"诊断过程中发生错误: {str(e)}"
+
+        try:
+            result = response.json()
+            return result["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise BackendResponseError("llm", f"诊断响应格式错误: {str(e)}")
+
+    tokens = estimate_tokens(*(message["content"] for message in messages), max_tokens=max_tokens)
+    return router.call("doctor", request_diagnosis, model_name, tokens=tokens)
+
+def start_diagnosis(user_input: str, vector_results: list, graph_data: dict, model_name: str = None, disease_list_file: str = None, diagnostic_suggestions: dict = None) -> dict:
+    # 首轮诊断；返回 {"diagnosis", "messages"}，重试时由 continue_diagnosis 在 messages 上追加新的一轮
+
+    # 手动替换占位符来避免与JSON格式冲突
+    system_prompt = DOCTOR_SYSTEM_PROMPT.replace("{vector_results}", format_vector_results(vector_results))
+    system_prompt = system_prompt.replace("{disease_list}", load_disease_list(disease_list_file))
+    system_prompt = system_prompt.replace("{graph_data}", format_graph_data(graph_data))
+    system_prompt = system_prompt.replace("{diagnostic_suggestions}", format_suggestions(diagnostic_suggestions))
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_input}
+    ]
+
+    content = request_chat(messages, model_name)
+    messages.append({"role": "assistant", "content": content})
+    return {"diagnosis": content, "messages": messages}
+
+def continue_diagnosis(messages: list, diagnostic_suggestions: dict = None, extra_results: list = None, model_name: str = None) -> str:
+    # 在已有对话后追加复核意见和新增候选，前缀保持不变以命中服务端的提示词缓存；
+    # 请求成功后才把这一轮写入 messages，失败时对话保持原样
+
+    retry_prompt = DOCTOR_RETRY_PROMPT.replace("{diagnostic_suggestions}", format_suggestions(diagnostic_suggestions))
+    extra_info = f"补充候选疾病信息：\n{format_vector_results(extra_results)}" if extra_results else ""
+    retry_prompt = retry_prompt.replace("{vector_results}", extra_info)
+    turn = {"role": "user", "content": retry_prompt}
+
+    content = request_chat(messages + [turn], model_name)
+    messages.extend([turn, {"role": "assistant", "content": content}])
+    return content
+
+def diagnose(user_input: str, vector_results: list, graph_data: dict, model_name: str = None, disease_list_file: str = None, diagnostic_suggestions: dict = None) -> str:
+
+    return start_diagnosis(user_input, vector_results, graph_data, model_name, disease_list_file, diagnostic_suggestions)["diagnosis"]
+
+def fused_diagnose(user_input: str, vector_results: list, model_name: str = None, disease_list_file: str = None, diagnostic_suggestions: dict = None, enrich=None) -> dict:
+    # 分析与诊断合并为一次调用；模型请求补充资料时，enrich(疾病名称列表) 返回 (图数据, 新增候选)，
+    # 补充资料作为同一对话的下一轮发送，候选疾病信息不再重复发送
+    # 返回 {"diagnosis", "requested", "graph_data", "extra_results", "messages", "calls"}
+
+    system_prompt = FUSED_DOCTOR_SYSTEM_PROMPT.replace("{vector_results}", format_vector_results(vector_results))
+    system_prompt = system_prompt.replace("{disease_list}", load_disease_list(disease_list_file))
+    system_prompt = system_prompt.replace("{diagnostic_suggestions}", format_suggestions(diagnostic_suggestions))
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_input}
+    ]
+
+    content = request_chat(messages, model_name)
+    messages.append({"role": "assistant", "content": content})
+    result = {"diagnosis": content, "requested": [], "graph_data": {}, "extra_results": [], "messages": messages, "calls": 1}
+
+    if "<final_diagnosis>" in content:
+        return result
+    requested = extract_tagged_json(content, "need_more_info")
+    if requested is None:
+        # 两种标签都没有时按原样返回，由调用方按诊断结果处理
+        return result
+    result["requested"] = requested.get("diseases", [])
+
+    graph_data, extra_results = enrich(result["requested"]) if enrich is not None else ({}, [])
+    result["graph_data"] = graph_data
+    result["extra_results"] = extra_results
+    enrichment = format_graph_data(graph_data)
+    if extra_results:
+        # 请求区分的疾病不在候选列表中时，补充其描述和症状
+        enrichment = format_vector_results(extra_results) + enrichment
+    messages.append({"role": "user", "content": FUSED_ENRICHMENT_PROMPT.replace("{graph_data}", enrichment or "暂无可补充的资料")})
+
+    content = request_chat(messages, model_name)
+    messages.append({"role": "assistant", "content": content})
+    result["diagnosis"] = content
+    result["calls"] = 2
+    return result
@@ -1,9 +1,11 @@
 import re
 import os
 import json
-from openai import OpenAI
-from src.model.config import MODELS
-from src.model.prompt import R1_EXPERT_EVALUATION_PROMPT
+from src.model.prompt import R1_EXPERT_EVALUATION_PROMPT, R1_EXPERT_FOLLOWUP_PROMPT
+from src.model.router import router
+from src.utils.clients import get_openai_client
+from src.utils.scheduler import estimate_tokens
+from src.utils.structured import structured_enabled, structured_prompt, completion_options, max_tokens, parse_structured
 
 def extract_diagnostic_suggestions(content: str) -> dict:
 
@@ -22,85 +24,116 @@ def extract_diagnostic_suggestions(content: str) -> dict:
         print(f"提取诊断建议时出错: {str(e)}")
         return None
 
-def iterative_diagnose(symptoms, vector_results, graph_data, doctor_diagnosis, disease_list_file=None):
-   
-    try:
-       
-        disease_list_str = ""
-        if disease_list_file and os.path.exists(disease_list_file):
-            try:
-                with open(disease_list_file, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                    if content:
-                      
-                        try:
-                            import ast
-                            disease_list = ast.literal_eval(content)
-                            if isinstance(disease_list, list):
-                                disease_list_str = f"可选疾病列表：{', '.join(disease_list)}"
-                        except:
-                           
-                            lines = content.split('\n')
-                            diseases = [line.strip() for line in lines if line.strip()]
-                            if diseases:
-                                disease_list_str = f"可选疾病列表：{', '.join(diseases)}"
-            except Exception as e:
-                print(f"读取疾病列表文件出错: {str(e)}")
-
-        prompt = R1_EXPERT_EVALUATION_PROMPT.format(
-            symptoms=symptoms,
-            vector_results=vector_results,
-            graph_data=graph_data,
-            doctor_diagnosis=doctor_diagnosis,
-            disease_list=disease_list_str
-        )
-        
-        model_config = MODELS["deepseek"]
-        
-        client = OpenAI(
-            api_key=model_config["api_key"],
-            base_url=model_config["base_url"]
-        )
+def iterative_diagnose(symptoms, vector_results, graph_data, doctor_diagnosis, disease_list_file=None, model_name=None, messages=None):
+    # 专家模型由router按 "expert" 阶段配置选择；调用失败时抛出 BackendError，不再默认判定为正确
+    # messages 为上一轮评估的对话时，只追加重新诊断和 vector_results 中的新增候选，不再重复发送完整上下文；
+    # 返回结果中的 "messages" 为本轮之后的对话
+
+    if messages:
+        return continue_review(messages, vector_results, doctor_diagnosis, model_name)
+
+    disease_list_str = ""
+    if disease_list_file and os.path.exists(disease_list_file):
+        try:
+            with open(disease_list_file, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+                if content:
+                  
+                    try:
+                        import ast
+                        disease_list = ast.literal_eval(content)
+                        if isinstance(disease_list, list):
+                            disease_list_str = f"可选疾病列表：{', '.join(disease_list)}"
+                    except:
+                       
+                        lines = content.split('\n')
+                        diseases = [line.strip() for line in lines if line.strip()]
+                        if diseases:
+                            disease_list_str = f"可选疾病列表：{', '.join(diseases)}"
+        except Exception as e:
+            print(f"读取疾病列表文件出错: {str(e)}")
+
+    prompt = structured_prompt("expert", R1_EXPERT_EVALUATION_PROMPT.format(
+        symptoms=symptoms,
+        vector_results=vector_results,
+        graph_data=graph_data,
+        doctor_diagnosis=doctor_diagnosis,
+        disease_list=disease_list_str
+    ))
+    
+    messages = [
+        {"role": "system", "content": "你是一位资深医疗专家，需要进行推理分析诊断是否正确。"},
+        {"role": "user", "content": prompt}
+    ]
+    content = request_review(messages, model_name)
+    messages.append({"role": "assistant", "content": content})
+    return {**review_result(content, model_name), "messages": messages}
+
+def continue_review(messages, vector_results, doctor_diagnosis, model_name=None):
+    # 请求成功后才把这一轮写入 messages；只保留回复正文，推理过程不回传
+
+    extra_info = f"新增候选疾病信息：\n{vector_results}" if vector_results else ""
+    turn = {"role": "user", "content": R1_EXPERT_FOLLOWUP_PROMPT.format(vector_results=extra_info, doctor_diagnosis=doctor_diagnosis)}
+    content = request_review(messages + [turn], model_name)
+    messages.extend([turn, {"role": "assistant", "content": content}])
+    return {**review_result(content, model_name), "messages": messages}
+
+def request_review(messages, model_name=None):
+
+    structured = structured_enabled()
 
-        response = client.chat.completions.create(
+    def request(model_config, timeout):
+        client = get_openai_client(model_config)
+        return client.chat.completions.create(
             model=model_config["model_name"],
-            messages=[
-                {"role": "system", "content": "你是一位资深医疗专家，需要进行推理分析诊断是否正确。"},
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             temperature=0.5,  
-            stream=False
+            stream=False,
+            timeout=timeout,
+            **(completion_options("expert", model_config) if structured else {})
         )
-        
-        content = response.choices[0].message.content
-        
-        expert_review_match = re.search(r'<expert_review>(.*?)</expert_review>', content, re.DOTALL)
-        if expert_review_match:
-            review_content = expert_review_match.group(1).strip()
-
-            if '1' in review_content:
-                return {"is_correct": True}
-            elif '0' in review_content:
-             
-                diagnostic_suggestions = extract_diagnostic_suggestions(content)
-                result = {"is_correct": False}
-                if diagnostic_suggestions:
-                    result["diagnostic_suggestions"] = diagnostic_suggestions
-                else:
+
+    output_tokens = (max_tokens("expert") or 0) if structured else 0
+    response = router.call("expert", request, model_name, tokens=estimate_tokens(*(message["content"] for message in messages), max_tokens=output_tokens))
+    return response.choices[0].message.content
+
+def review_result(content, model_name=None):
+    # 结构化输出修复后仍不合格时抛出 BackendResponseError，由调用方按专家不可用处理，不再默认判定为正确
+
+    if not structured_enabled():
+        return parse_review(content)
+    review = parse_structured("expert", content, model_name)
+    if review["is_correct"]:
+        return {"is_correct": True}
+    return {
+        "is_correct": False,
+        "diagnostic_suggestions": {"recommended_diseases": review["recommended_diseases"], "reason": review["reason"]}
+    }
+
+def parse_review(content):
+    
+    expert_review_match = re.search(r'<expert_review>(.*?)</expert_review>', content, re.DOTALL)
+    if expert_review_match:
+        review_content = expert_review_match.group(1).strip()
+
+        if '1' in review_content:
+            return {"is_correct": True}
+        elif '0' in review_content:
          
-                    result["diagnostic_suggestions"] = {
-                        "recommended_diseases": ["建议重新评估症状"],
-                        "reason": "现有诊断不够准确，需要重新分析"
-                    }
-                return result
+            diagnostic_suggestions = extract_diagnostic_suggestions(content)
+            result = {"is_correct": False}
+            if diagnostic_suggestions:
+                result["diagnostic_suggestions"] = diagnostic_suggestions
             else:
-  
-                return {"is_correct": True}
+     
+                result["diagnostic_suggestions"] = {
+                    "recommended_diseases": ["建议重新评估症状"],
+                    "reason": "现有诊断不够准确，需要重新分析"
+                }
+            return result
         else:
-        
+
             return {"is_correct": True}
-            
-    except Exception as e:
-        print(f"专家评估出错: {e}")
-        # 出错时默认认为正确，避免阻塞诊断流程
+    else:
+    
         return {"is_correct": True}
@@ -75,6 +75,80 @@ DOCTOR_SYSTEM_PROMPT = """
 
 
 
+# 分析与诊断合并为一次调用：能确诊时直接给出诊断，否则请求补充图数据库资料，补充资料在同一对话中追加
+FUSED_DOCTOR_SYSTEM_PROMPT = """
+<身份>
+作为医疗助手，请根据以下患者对话和相关信息，预测可能的疾病。
+参考提供的疾病列表，选择合适的疾病
+主要基于症状匹配度进行判断
+</身份>
+
+<相关疾病信息>
+候选疾病基本信息：
+{vector_results}
+
+疾病列表：
+{disease_list}
+
+诊断建议：
+{diagnostic_suggestions}
+</相关疾病信息>
+
+<决策规则>
+- 如果有1个疾病明显优于其他候选（症状匹配度显著更高），直接给出最终诊断
+- 仅当有2个或更多疾病的症状匹配度相近且都较好，需要病因、科室和并发症资料才能区分时，请求补充资料
+- 不要为症状匹配度低的疾病请求补充资料
+- 收到补充资料后，必须给出最终诊断，不能再次请求
+</决策规则>
+
+<约束条件>
+只输出以下两种结果之一，不需要解释理由。
+
+直接诊断时，将最终诊断结果放在<final_diagnosis>标签中：
+<final_diagnosis>
+{"diseases": ["疾病名称"]}
+</final_diagnosis>
+
+需要补充资料时，将需要区分的疾病放在<need_more_info>标签中：
+<need_more_info>
+{"diseases": ["疾病名称1", "疾病名称2"]}
+</need_more_info>
+</约束条件>
+"""
+
+# 合并模式下补充资料的追加消息
+FUSED_ENRICHMENT_PROMPT = """补充的详细医学资料：
+{graph_data}
+请结合以上资料，将最终诊断结果放在<final_diagnosis>标签中。"""
+
+# 被驳回后在同一对话中追加的重新诊断消息，只包含复核意见和新增的候选疾病
+DOCTOR_RETRY_PROMPT = """上述诊断未通过复核，复核意见：
+{diagnostic_suggestions}
+{vector_results}
+请参考复核意见重新诊断，只需列出疾病名称，将最终诊断结果放在<final_diagnosis>标签中：
+<final_diagnosis>
+{"diseases": ["疾病名称"]}
+</final_diagnosis>"""
+
+# 结构化输出模式下追加在提示词末尾的输出格式，覆盖原提示词中的标签格式
+STRUCTURED_OUTPUT_INSTRUCTION = """
+
+输出格式（以此为准，忽略上文的标签格式要求）：
+不要输出分析过程或其他任何文字，只输出一个JSON对象：
+{example}"""
+
+STRUCTURED_OUTPUT_EXAMPLES = {
+    "analyzer": '{"need_more_info": false, "diseases": []}\nneed_more_info为true时，diseases为需要进一步区分的疾病名称',
+    "symptom": '{"symptom": ["症状1", "症状2", "症状3"]}',
+    "cause_rewrite": '{"simplified_cause": "简化的病因描述"}',
+    "expert": '{"is_correct": true, "recommended_diseases": [], "reason": ""}\n诊断错误时is_correct为false，recommended_diseases为推荐的1~3个疾病，reason为简要原因',
+}
+
+# 结构化输出不合格时的修复提示词，只发送原输出，不重复发送上下文
+STRUCTURED_REPAIR_PROMPT = """下面是一段模型输出，应为JSON对象，但{error}。
+请保留其中的内容，修正为符合以下JSON Schema的对象，只输出JSON：
+{schema}"""
+
 # 症状提取和改写提示词模板
 SYMPTOM_REWRITE_PROMPT = """你是一位专业的医疗助手，专门负责从医患对话中提取症状并将其改写为标准的医学术语。
 
@@ -197,6 +271,13 @@ R1_EXPERT_EVALUATION_PROMPT = """
 </约束条件>
 """
 
+# 医生重新诊断后在同一评估对话中追加的消息
+R1_EXPERT_FOLLOWUP_PROMPT = """医生参考你的建议重新给出了诊断。
+{vector_results}
+重新诊断：{doctor_diagnosis}
+
+请按照同样的标准和输出要求重新评估。"""
+
 
 
 
@@ -1,50 +1,67 @@
-import requests
 import json
 import re
-from .config import MODELS, DEFAULT_MODEL
 from .prompt import DISEASE_CAUSE_REWRITE_PROMPT
+from .router import router
+from ..utils.scheduler import estimate_tokens
+from ..utils.clients import get_http_session
+from ..utils.singleflight import get_flight
+from ..utils.structured import structured_enabled, structured_prompt, completion_options, max_tokens, parse_structured
 
-def rewrite_disease_cause(raw_cause: str, disease_name: str = "", model_name: str = DEFAULT_MODEL) -> str:
+_rewrite_flight = get_flight("cause_rewrite")
+
+def rewrite_disease_cause(raw_cause: str, disease_name: str = "", model_name: str = None) -> str:
 
     if not raw_cause or not raw_cause.strip():
         return ""
     
     try:
     
-        model_config = MODELS.get(model_name, MODELS[DEFAULT_MODEL])
-
-        prompt = DISEASE_CAUSE_REWRITE_PROMPT.format(
+        prompt = structured_prompt("cause_rewrite", DISEASE_CAUSE_REWRITE_PROMPT.format(
             disease_name=disease_name,
             raw_cause=raw_cause
-        )
+        ))
+        structured = structured_enabled()
+        output_tokens = (max_tokens("cause_rewrite") or 200) if structured else 200
 
-        headers = {
-            "Authorization": f"Bearer {model_config['api_key']}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model_config["model_name"],
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.1,
-            "max_tokens": 200
-        }
+        def request_rewrite(model_config, timeout):
+            headers = {
+                "Authorization": f"Bearer {model_config['api_key']}",
+                "Content-Type": "application/json"
+            }
 
-        response = requests.post(
-            f"{model_config['base_url']}/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30
+            data = {
+                "model": model_config["model_name"],
+                "messages": [
+                    {"role": "user", "content": prompt}
+                ],
+                "temperature": 0.1,
+                "max_tokens": 200
+            }
+            if structured:
+                data.update(completion_options("cause_rewrite", model_config))
+
+            response = get_http_session().post(
+                f"{model_config['base_url']}/chat/completions",
+                headers=headers,
+                json=data,
+                timeout=timeout
+            )
+            response.raise_for_status()
+            return response.json()
+
+        # 低温度改写结果基本确定，相同疾病的并发改写共享一次模型调用
+        result = _rewrite_flight.do(
+            (prompt, model_name),
+            lambda: router.call("cause_rewrite", request_rewrite, model_name, tokens=estimate_tokens(prompt, max_tokens=output_tokens))
         )
-        response.raise_for_status()
-        
-        result = response.json()
         response_text = result["choices"][0]["message"]["content"]
         
 
-        simplified_cause = extract_simplified_cause(response_text)
+        if structured:
+            # 修复后仍不合格时抛出异常，按原有方式截断原始病因
+            simplified_cause = parse_structured("cause_rewrite", response_text, model_name)["simplified_cause"].strip()
+        else:
+            simplified_cause = extract_simplified_cause(response_text)
         
         return simplified_cause if simplified_cause else raw_cause[:50] 
         
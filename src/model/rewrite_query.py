@@ -0,0 +1,27 @@
+from src.utils.rewrite import call_symptom_api, extract_symptoms_from_response
+from src.utils.resilience import BackendError
+from src.utils.structured import structured_enabled, parse_structured
+
+def process_dialog_symptoms(dialog_text: str, model_name: str = None) -> list:
+    # 从医患对话中提取标准化症状列表；调用失败时返回空列表，检索退化为只用原始对话
+
+    if not dialog_text or not dialog_text.strip():
+        return []
+
+    try:
+        response_text = call_symptom_api(dialog_text, model_name)
+        if structured_enabled():
+            symptoms = parse_structured("symptom", response_text, model_name)["symptom"]
+        else:
+            symptoms = extract_symptoms_from_response(response_text)
+    except (BackendError, ValueError) as e:
+        print(f"症状提取失败: {str(e)}")
+        return []
+
+    seen = set()
+    normalized = []
+    for symptom in symptoms:
+        if isinstance(symptom, str) and symptom.strip() and symptom.strip() not in seen:
+            seen.add(symptom.strip())
+            normalized.append(symptom.strip())
+    return normalized
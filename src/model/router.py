@@ -0,0 +1,168 @@
+import threading
+import time
+
+from src.model.config import MODELS, DEFAULT_MODEL, STAGE_MODELS
+from src.utils.rate_limit import TokenBucket
+from src.utils.resilience import resilient_call, breaker_state, BackendError, BackendUnavailableError
+from src.utils.scheduler import admission
+
+
+# 阶段对应的重试/超时策略，未列出的阶段使用 "llm"
+STAGE_BACKENDS = {
+    "expert": "expert",
+}
+
+
+class StageStats:
+    # 单个端点在某一阶段的滚动延迟/错误率；不同阶段的提示词和输出长度差别很大，统计不能混用
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+
+    def update(self, latency, success):
+        self.calls += 1
+        if success:
+            self.latency = latency if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * latency
+        self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha * (0.0 if success else 1.0)
+
+
+class ModelEndpoint:
+    # 单个模型端点的并发和速率限制；延迟/错误率按 (阶段, 端点) 分别统计，并发数按端点统计
+
+    def __init__(self, name, config, alpha=0.2):
+        self.name = name
+        self.config = config
+        self.alpha = alpha
+        self.stages = {}
+        self.inflight = 0
+        self.calls = 0
+        self.max_concurrency = config.get("max_concurrency", 8)
+        rate_limit = config.get("rate_limit")  # 每分钟请求数
+        self.bucket = TokenBucket(rate_limit / 60.0, capacity=max(1.0, rate_limit / 10.0)) if rate_limit else None
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            if self.inflight >= self.max_concurrency:
+                return False
+            if self.bucket is not None and not self.bucket.try_acquire():
+                return False
+            self.inflight += 1
+            return True
+
+    def stage_stats(self, stage):
+        with self.lock:
+            return self.stages.setdefault(stage, StageStats(self.alpha))
+
+    def release(self, stage, latency, success):
+        with self.lock:
+            self.inflight -= 1
+            self.calls += 1
+            self.stages.setdefault(stage, StageStats(self.alpha)).update(latency, success)
+
+    def latency(self, stage):
+        return self.stage_stats(stage).latency
+
+    def error_rate(self, stage):
+        return self.stage_stats(stage).error_rate
+
+    def samples(self, stage):
+        return self.stage_stats(stage).calls
+
+    def score(self, stage):
+        # 该阶段未调用过的端点优先探测；错误率和当前并发都会抬高预估延迟
+        stats = self.stage_stats(stage)
+        latency = stats.latency if stats.latency is not None else 0.0
+        return latency * (1 + 4 * stats.error_rate) * (1 + self.inflight / self.max_concurrency)
+
+
+class ModelRouter:
+
+    def __init__(self, models=None, stage_models=None, acquire_timeout=30.0):
+        self.models = models if models is not None else MODELS
+        self.stage_models = stage_models if stage_models is not None else STAGE_MODELS
+        self.acquire_timeout = acquire_timeout
+        self.endpoints = {name: ModelEndpoint(name, config) for name, config in self.models.items()}
+
+    def candidates(self, stage, model_name=None):
+        # 显式指定 model_name 时固定使用该模型，否则按阶段配置路由
+        if model_name:
+            if model_name in self.endpoints:
+                return [model_name]
+            print(f"未知模型 {model_name}，按阶段 {stage} 的配置路由")
+        names = [name for name in self.stage_models.get(stage, []) if name in self.endpoints]
+        return names or [DEFAULT_MODEL]
+
+    def healthy(self, stage, endpoint):
+        backend = STAGE_BACKENDS.get(stage, "llm")
+        return breaker_state(f"{backend}:{endpoint.name}") != "open" and endpoint.error_rate(stage) < 0.5
+
+    def acquire(self, stage, model_name=None, exclude=()):
+        names = [name for name in self.candidates(stage, model_name) if name not in exclude]
+        if not names:
+            raise BackendUnavailableError(stage, "没有可用的模型端点")
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            endpoints = [self.endpoints[name] for name in names]
+            healthy = [endpoint for endpoint in endpoints if self.healthy(stage, endpoint)]
+            for endpoint in sorted(healthy or endpoints, key=lambda e: e.score(stage)):
+                if endpoint.try_acquire():
+                    return endpoint
+            if time.monotonic() >= deadline:
+                raise BackendUnavailableError(stage, "所有模型端点均已达到并发或速率上限")
+            time.sleep(0.05)
+
+    def call(self, stage, fn, model_name=None, tokens=1):
+        # fn(model_config, timeout) 执行一次模型调用；端点失败时切换到下一个候选端点
+        # tokens 为预估token数，用于租户配额和公平调度
+        backend = STAGE_BACKENDS.get(stage, "llm")
+        with admission(backend, tokens):
+            return self._call(stage, backend, fn, model_name)
+
+    def _call(self, stage, backend, fn, model_name):
+        tried = []
+        last_error = None
+        for _ in self.candidates(stage, model_name):
+            endpoint = self.acquire(stage, model_name, exclude=tried)
+            tried.append(endpoint.name)
+            start = time.monotonic()
+            try:
+                result = resilient_call(
+                    backend,
+                    lambda timeout: fn(endpoint.config, timeout),
+                    endpoint=endpoint.name
+                )
+            except BackendError as e:
+                endpoint.release(stage, time.monotonic() - start, False)
+                last_error = e
+                print(f"模型端点 {endpoint.name} 调用失败({stage}): {str(e)}")
+                continue
+            endpoint.release(stage, time.monotonic() - start, True)
+            return result
+        raise last_error
+
+    def estimate(self, stage, model_name=None, min_samples=1):
+        # 按候选端点在该阶段的实时延迟和负载估算一次调用的耗时；该阶段样本数不足 min_samples 时返回 None
+        scores = [
+            self.endpoints[name].score(stage)
+            for name in self.candidates(stage, model_name)
+            if self.endpoints[name].latency(stage) is not None and self.endpoints[name].samples(stage) >= min_samples
+        ]
+        return min(scores) if scores else None
+
+    def status(self):
+        status = {}
+        for name, endpoint in self.endpoints.items():
+            with endpoint.lock:
+                stages = {
+                    stage: {"latency": stats.latency, "error_rate": round(stats.error_rate, 3), "calls": stats.calls}
+                    for stage, stats in endpoint.stages.items()
+                }
+                status[name] = {"inflight": endpoint.inflight, "calls": endpoint.calls, "stages": stages}
+        return status
+
+
+router = ModelRouter()
@@ -0,0 +1,133 @@
+import threading
+
+from src.model.config import VERIFIER_CONFIG
+from src.search.disease_graph import get_disease_graph
+from src.search.record_store import get_record_store
+from src.utils.extract_diagnosis import extract_tagged_json
+
+ACCEPT = "accept"
+REJECT = "reject"
+ESCALATE = "escalate"
+
+_stats = {ACCEPT: 0, REJECT: 0, ESCALATE: 0}
+_stats_lock = threading.Lock()
+
+
+def parse_diseases(diagnosis):
+    # 从 <final_diagnosis> 中取出疾病名称列表；格式不符合要求时返回 None
+    if not isinstance(diagnosis, str):
+        return None
+    result = extract_tagged_json(diagnosis, "final_diagnosis")
+    if result is None:
+        return None
+    diseases = result.get("diseases")
+    if not isinstance(diseases, list) or not diseases:
+        return None
+    if not all(isinstance(name, str) and name.strip() for name in diseases):
+        return None
+    return [name.strip() for name in diseases]
+
+
+def rerank_margin(candidates):
+    # 返回 (第一名重排分数, 与第二名的分差)；重排序未执行时没有分数，返回 (None, None)
+    scores = [candidate.get('relevance_score') for candidate in candidates[:2]]
+    if not scores or scores[0] is None:
+        return None, None
+    if len(scores) < 2 or scores[1] is None:
+        return scores[0], scores[0]
+    return scores[0], scores[0] - scores[1]
+
+
+def in_catalog(name, candidate_names, disease_names):
+    # 有疾病列表时以列表为准，否则以候选和本地记录库为准；无法判断时返回 None
+    if disease_names:
+        return name in disease_names
+    if name in candidate_names:
+        return True
+    record_store = get_record_store()
+    if record_store is None:
+        return None
+    return record_store.get_by_name(name) is not None
+
+
+def suggest(seeds, candidate_names, disease_names, exclude, limit):
+    # 推荐疾病：候选中的疾病及其近邻，按顺序去重；有疾病列表时只推荐列表内的疾病
+    suggestions = []
+    disease_graph = get_disease_graph()
+    for seed in seeds:
+        names = [seed]
+        if disease_graph is not None:
+            names.extend(neighbor for neighbor, _, _ in disease_graph.lookup(seed))
+        for name in names:
+            if len(suggestions) >= limit:
+                return suggestions
+            if name in exclude or name in suggestions:
+                continue
+            if disease_names and name not in disease_names:
+                continue
+            if not disease_names and name not in candidate_names and (disease_graph is None or name not in disease_graph):
+                continue
+            suggestions.append(name)
+    return suggestions
+
+
+def record(decision):
+    with _stats_lock:
+        _stats[decision] += 1
+
+
+def verify_diagnosis(diagnosis, candidates, disease_names=None, expert_rejected=False, allow_reject=True, config=None):
+    # 专家复核前的本地检查，返回 {"decision", "reason", "diagnostic_suggestions"}
+    # accept: 不调用专家直接通过；reject: 不调用专家直接驳回并给出推荐疾病；escalate: 交给专家模型
+
+    config = config or VERIFIER_CONFIG
+    disease_names = set(disease_names or [])
+    candidate_names = [candidate.get('name') for candidate in candidates]
+
+    def verdict(decision, reason, suggestions=None):
+        record(decision)
+        result = {"decision": decision, "reason": reason, "diagnostic_suggestions": None}
+        if suggestions:
+            result["diagnostic_suggestions"] = {"recommended_diseases": suggestions, "reason": reason}
+        return result
+
+    if not config["enabled"]:
+        return verdict(ESCALATE, "本地预检未启用")
+
+    diseases = parse_diseases(diagnosis)
+    if diseases is None:
+        if not allow_reject:
+            return verdict(ESCALATE, "诊断输出格式不正确，本地驳回次数已用完")
+        suggestions = suggest(candidate_names, candidate_names, disease_names, set(), config["suggestions"])
+        return verdict(REJECT, "诊断输出格式不正确，请从候选疾病中选择并按<final_diagnosis>格式输出", suggestions)
+
+    unknown = [name for name in diseases if in_catalog(name, candidate_names, disease_names) is False]
+    if unknown:
+        if not allow_reject:
+            return verdict(ESCALATE, f"疾病不在目录中: {', '.join(unknown)}，本地驳回次数已用完")
+        # 目录外的名称没有近邻，从已诊断的其余疾病和候选出发推荐
+        seeds = [name for name in diseases if name not in unknown] + candidate_names
+        suggestions = suggest(seeds, candidate_names, disease_names, set(unknown), config["suggestions"])
+        return verdict(REJECT, f"疾病不在疾病目录中: {', '.join(unknown)}", suggestions)
+
+    if expert_rejected:
+        # 专家驳回过的请求不在本地放行
+        return verdict(ESCALATE, "已被专家驳回过，需要专家复核")
+    if not candidate_names or diseases[0] != candidate_names[0]:
+        return verdict(ESCALATE, "首选疾病不是重排第一名")
+    top_score, margin = rerank_margin(candidates)
+    if top_score is None:
+        return verdict(ESCALATE, "没有重排分数")
+    if top_score < config["accept_min_score"] or margin < config["accept_margin"]:
+        return verdict(ESCALATE, f"重排分数 {top_score:.3f}，领先 {margin:.3f}，不足以直接通过")
+    return verdict(ACCEPT, f"首选疾病为重排第一名，分数 {top_score:.3f}，领先 {margin:.3f}")
+
+
+def verifier_status():
+    # expert_calls_saved: 本地直接通过或驳回、未调用专家模型的比例
+    with _stats_lock:
+        stats = dict(_stats)
+    total = sum(stats.values())
+    stats["total"] = total
+    stats["expert_calls_saved"] = round((stats[ACCEPT] + stats[REJECT]) / total, 4) if total else 0.0
+    return stats
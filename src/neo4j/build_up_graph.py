@@ -3,40 +3,42 @@ import re
 import py2neo
 from tqdm import tqdm
 import argparse
+from src.neo4j.source_parser import parse_source, iter_batches, GraphColumns, DEFAULT_SOURCE_PATH, DEFAULT_COLUMNS_DIR
+
+
+DISEASE_PROPERTIES = ["名称", "疾病简介", "疾病病因", "预防措施", "治疗周期", "治愈概率", "疾病易感人群"]
+# 每次提交到neo4j的节点/关系数，生成器按批消费，内存占用与源文件大小无关
+BATCH_SIZE = 1000
+
+
+def batch_count(total):
+    return (total + BATCH_SIZE - 1) // BATCH_SIZE if total else None
 
 
 #导入普通实体
 def import_entity(client,type,entity):
-    def create_node(client,type,name):
-        order = """create (n:%s{名称:"%s"})"""%(type,name)
-        client.run(order)
-
     print(f'正在导入{type}类数据')
-    for en in tqdm(entity):
-        create_node(client,type,en)
+    order = """unwind $names as name create (n:%s{名称:name})"""%(type)
+    for batch in tqdm(iter_batches(entity, BATCH_SIZE), total=batch_count(len(entity))):
+        client.run(order, names=batch)
 #导入疾病类实体
-def import_disease_data(client,type,entity):
+def import_disease_data(client,type,entity,total=None):
     print(f'正在导入{type}类数据')
-    for disease in tqdm(entity):
-        node = py2neo.Node(type,
-                           名称=disease["名称"],
-                           疾病简介=disease["疾病简介"],
-                           疾病病因=disease["疾病病因"],
-                           预防措施=disease["预防措施"],
-                           治疗周期=disease["治疗周期"],
-                           治愈概率=disease["治愈概率"],
-                           疾病易感人群=disease["疾病易感人群"],
-
-                           )
-        client.create(node)
+    order = """unwind $rows as row create (n:%s) set n = row"""%(type)
+    for batch in tqdm(iter_batches(entity, BATCH_SIZE), total=batch_count(total)):
+        rows = [{key: disease[key] for key in DISEASE_PROPERTIES} for disease in batch]
+        client.run(order, rows=rows)
 
-def create_all_relationship(client,all_relationship):
-    def create_relationship(client,type1, name1,relation, type2,name2):
-        order = """match (a:%s{名称:"%s"}),(b:%s{名称:"%s"}) create (a)-[r:%s]->(b)"""%(type1,name1,type2,name2,relation)
-        client.run(order)
+def create_all_relationship(client,all_relationship,total=None):
     print("正在导入关系.....")
-    for type1, name1,relation, type2,name2  in tqdm(all_relationship):
-        create_relationship(client,type1, name1,relation, type2,name2)
+    for batch in tqdm(iter_batches(all_relationship, BATCH_SIZE), total=batch_count(total)):
+        # 同一批内按 (头类型, 关系, 尾类型) 分组，每组一条unwind语句
+        groups = {}
+        for type1, name1, relation, type2, name2 in batch:
+            groups.setdefault((type1, relation, type2), []).append({"head": name1, "tail": name2})
+        for (type1, relation, type2), rows in groups.items():
+            order = """unwind $rows as row match (a:%s{名称:row.head}),(b:%s{名称:row.tail}) create (a)-[r:%s]->(b)"""%(type1,type2,relation)
+            client.run(order, rows=rows)
 
 if __name__ == "__main__":
     #连接数据库的一些参数
@@ -45,6 +47,9 @@ if __name__ == "__main__":
     parser.add_argument('--user', type=str, default='neo4j', help='neo4j的用户名')
     parser.add_argument('--password', type=str, default='neo4j123', help='neo4j的密码')
     parser.add_argument('--dbname', type=str, default='neo4j', help='数据库名称')
+    parser.add_argument('--source', type=str, default=DEFAULT_SOURCE_PATH, help='源数据文件，每行一条疾病记录')
+    parser.add_argument('--columns-dir', type=str, default=DEFAULT_COLUMNS_DIR, help='列存中间格式输出目录')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认为CPU核数')
     args = parser.parse_args()
 
     #连接...
@@ -55,127 +60,31 @@ if __name__ == "__main__":
     if is_delete=='y':
         client.run("match (n) detach delete (n)")
 
-    with open('./src/data/medical_new_2.json','r',encoding='utf-8') as f:
-        all_data = f.read().split('\n')
-    
-    #所有实体
-    all_entity = {
-        "疾病": [],
-        "药品": [],
-        "食物": [],
-        "检查项目":[],
-        "科目":[],
-        "疾病症状":[],
-        "治疗方法":[],
-        "药品商":[],
-    }
-    
-    # 实体间的关系
-    relationship = []
-    for i,data in enumerate(all_data):
-        if (len(data) < 3):
-            continue
-        data = eval(data[:-1])
-
-        disease_name = data.get("name","")
-        all_entity["疾病"].append({
-            "名称":disease_name,
-            "疾病简介": data.get("desc", ""),
-            "疾病病因": data.get("cause", ""),
-            "预防措施": data.get("prevent", ""),
-            "治疗周期":data.get("cure_lasttime",""),
-            "治愈概率": data.get("cured_prob", ""),
-            "疾病易感人群": data.get("easy_get", ""),
-        })
-
-        drugs = data.get("common_drug", []) + data.get("recommand_drug", [])
-        all_entity["药品"].extend(drugs)  # 添加药品实体
-        if drugs:
-            relationship.extend([("疾病", disease_name, "疾病使用药品", "药品",durg)for durg in drugs])
+    # 多进程流式解析源文件，生成列存中间格式（Milvus入库也可直接读取该目录）
+    parse_source(args.source, args.columns_dir, args.workers)
+    columns = GraphColumns(args.columns_dir)
 
-        do_eat = data.get("do_eat",[])+data.get("recommand_eat",[])
-        no_eat = data.get("not_eat",[])
-        all_entity["食物"].extend(do_eat+no_eat)
-        if do_eat:
-            relationship.extend([("疾病", disease_name,"疾病宜吃食物","食物",f) for f in do_eat])
-        if no_eat:
-            relationship.extend([("疾病", disease_name, "疾病忌吃食物", "食物", f) for f in no_eat])
+    # 疾病属性和关系都从列存文件流式读取，只有各类普通实体的名称表完整载入内存
+    all_entity = columns.entities()
+    disease_count = columns.manifest["diseases"]
+    relation_count = columns.manifest["relations"]
 
-        check = data.get("check", [])
-        all_entity["检查项目"].extend(check)
-        if check:
-            relationship.extend([("疾病", disease_name, "疾病所需检查", "检查项目",ch) for ch in check])
-
-        cure_department=data.get("cure_department", [])
-        all_entity["科目"].extend(cure_department)
-        if cure_department:
-            relationship.append(("疾病", disease_name, "疾病所属科目", "科目",cure_department[-1]))
-
-        symptom = data.get("symptom",[])
-        for i,sy in enumerate(symptom):
-            if symptom[i].endswith('...'):
-                symptom[i] = symptom[i][:-3]
-        all_entity["疾病症状"].extend(symptom)
-        if symptom:
-            relationship.extend([("疾病", disease_name, "疾病的症状", "疾病症状",sy )for sy in symptom])
-
-        cure_way = data.get("cure_way", [])
-        if cure_way:
-            for i,cure_w in enumerate(cure_way):
-                if(isinstance(cure_way[i], list)):
-                    cure_way[i] = cure_way[i][0] #glm处理数据集偶尔有格式错误
-            cure_way = [s for s in cure_way if len(s) >= 2]
-            all_entity["治疗方法"].extend(cure_way)
-            relationship.extend([("疾病", disease_name, "治疗的方法", "治疗方法", cure_w) for cure_w in cure_way])
-            
-
-        acompany_with = data.get("acompany", [])
-        if acompany_with:
-            relationship.extend([("疾病", disease_name, "疾病并发疾病", "疾病", disease) for disease in acompany_with])
-
-        drug_detail = data.get("drug_detail",[])
-        for detail in drug_detail:
-            lis = detail.split(',')
-            if(len(lis)!=2):
-                continue
-            p,d = lis[0],lis[1]
-            all_entity["药品商"].append(d)
-            all_entity["药品"].append(p)
-            relationship.append(('药品商',d,"生产","药品",p))
-    for i in range(len(relationship)):
-        if len(relationship[i])!=5:
-            print(relationship[i])
-    relationship = list(set(relationship))
-    all_entity = {k:(list(set(v)) if k!="疾病" else v)for k,v in all_entity.items()}
-    
     # 保存关系 放到data下
     with open("./data/rel_aug.txt",'w',encoding='utf-8') as f:
-        for rel in relationship:
+        for rel in columns.relations():
             f.write(" ".join(rel))
             f.write('\n')
 
     if not os.path.exists('data/ent_aug'):
         os.mkdir('data/ent_aug')
+    with open('data/ent_aug/疾病.txt','w',encoding='utf8') as f:
+        f.write('\n'.join(disease['名称'] for disease in columns.diseases()))
     for k,v in all_entity.items():
         with open(f'data/ent_aug/{k}.txt','w',encoding='utf8') as f:
-            if(k!='疾病'):
-                for i,ent in enumerate(v):
-                    f.write(ent+('\n' if i != len(v)-1 else ''))
-            else:
-                for i,ent in enumerate(v):
-                    f.write(ent['名称']+('\n' if i != len(v)-1 else ''))
+            f.write('\n'.join(v))
 
     #将属性和实体导入到neo4j上,注:只有疾病有属性，特判
+    import_disease_data(client,"疾病",columns.diseases(),disease_count)
     for k in all_entity:
-        if k!="疾病":
-            import_entity(client,k,all_entity[k])
-        else:
-            
-            import_disease_data(client,k,all_entity[k])
-    create_all_relationship(client,relationship)
-
-    
-
-    
-
-    
\ No newline at end of file
+        import_entity(client,k,all_entity[k])
+    create_all_relationship(client,columns.relations(),relation_count)
@@ -0,0 +1,345 @@
+import argparse
+import ast
+from array import array
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import jiter
+import numpy as np
+
+
+DEFAULT_SOURCE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'medical_new_2.json')
+DEFAULT_COLUMNS_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'graph_columns')
+
+# 实体类型和关系类型在列存中以下标表示
+ENTITY_TYPES = ["疾病", "药品", "食物", "检查项目", "科目", "疾病症状", "治疗方法", "药品商"]
+RELATION_TYPES = {
+    "疾病使用药品": ("疾病", "药品"),
+    "疾病宜吃食物": ("疾病", "食物"),
+    "疾病忌吃食物": ("疾病", "食物"),
+    "疾病所需检查": ("疾病", "检查项目"),
+    "疾病所属科目": ("疾病", "科目"),
+    "疾病的症状": ("疾病", "疾病症状"),
+    "治疗的方法": ("疾病", "治疗方法"),
+    "疾病并发疾病": ("疾病", "疾病"),
+    "生产": ("药品商", "药品"),
+}
+RELATION_NAMES = list(RELATION_TYPES)
+ENTITY_IDS = {name: i for i, name in enumerate(ENTITY_TYPES)}
+RELATION_IDS = {name: i for i, name in enumerate(RELATION_NAMES)}
+
+
+def parse_line(line):
+    # 源文件每行一条记录，行尾可能带逗号；先用jiter解析，非标准JSON（单引号等）退化为literal_eval
+    line = line.strip()
+    if line.endswith(b','):
+        line = line[:-1]
+    if len(line) < 3:
+        return None
+    try:
+        data = jiter.from_json(line)
+        return data if isinstance(data, dict) else None
+    except ValueError:
+        pass
+    try:
+        data = ast.literal_eval(line.decode('utf-8'))
+    except (ValueError, SyntaxError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def extract_record(data):
+    # 从一条疾病记录中抽取 (疾病属性, [(关系, 头实体, 尾实体)], [(实体类型, 名称)])，规则与原build_up_graph一致
+    disease_name = data.get("name", "")
+    properties = {
+        "oid": (data.get("_id") or {}).get("$oid", "") if isinstance(data.get("_id"), dict) else "",
+        "名称": disease_name,
+        "疾病简介": data.get("desc", ""),
+        "疾病病因": data.get("cause", ""),
+        "预防措施": data.get("prevent", ""),
+        "治疗周期": data.get("cure_lasttime", ""),
+        "治愈概率": data.get("cured_prob", ""),
+        "疾病易感人群": data.get("easy_get", ""),
+    }
+    relations = []
+    entities = []
+
+    drugs = data.get("common_drug", []) + data.get("recommand_drug", [])
+    entities.extend(("药品", drug) for drug in drugs)
+    relations.extend(("疾病使用药品", disease_name, drug) for drug in drugs)
+
+    do_eat = data.get("do_eat", []) + data.get("recommand_eat", [])
+    no_eat = data.get("not_eat", [])
+    entities.extend(("食物", food) for food in do_eat + no_eat)
+    relations.extend(("疾病宜吃食物", disease_name, food) for food in do_eat)
+    relations.extend(("疾病忌吃食物", disease_name, food) for food in no_eat)
+
+    check = data.get("check", [])
+    entities.extend(("检查项目", ch) for ch in check)
+    relations.extend(("疾病所需检查", disease_name, ch) for ch in check)
+
+    cure_department = data.get("cure_department", [])
+    entities.extend(("科目", department) for department in cure_department)
+    if cure_department:
+        relations.append(("疾病所属科目", disease_name, cure_department[-1]))
+
+    symptom = [sy[:-3] if sy.endswith('...') else sy for sy in data.get("symptom", [])]
+    properties["symptom"] = symptom
+    entities.extend(("疾病症状", sy) for sy in symptom)
+    relations.extend(("疾病的症状", disease_name, sy) for sy in symptom)
+
+    cure_way = [cure_w[0] if isinstance(cure_w, list) else cure_w for cure_w in data.get("cure_way", [])]  # glm处理数据集偶尔有格式错误
+    cure_way = [cure_w for cure_w in cure_way if isinstance(cure_w, str) and len(cure_w) >= 2]
+    entities.extend(("治疗方法", cure_w) for cure_w in cure_way)
+    relations.extend(("治疗的方法", disease_name, cure_w) for cure_w in cure_way)
+
+    relations.extend(("疾病并发疾病", disease_name, disease) for disease in data.get("acompany", []))
+
+    for detail in data.get("drug_detail", []):
+        lis = detail.split(',')
+        if len(lis) != 2:
+            continue
+        p, d = lis[0], lis[1]
+        entities.append(("药品商", d))
+        entities.append(("药品", p))
+        relations.append(("生产", d, p))
+    return properties, relations, entities
+
+
+def split_ranges(path, workers):
+    # 按字节切分文件，每个分片起点对齐到下一行开头
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    step = max(1, size // max(1, workers))
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, workers):
+            f.seek(i * step)
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_shard(path, start, end, shard_path):
+    # 子进程：解析一个字节区间，字符串在分片内驻留为整数ID，只返回紧凑数组；疾病属性直接写入分片文件
+    strings = {}
+
+    def intern(value):
+        value_id = strings.get(value)
+        if value_id is None:
+            value_id = strings[value] = len(strings)
+        return value_id
+
+    # 用定长整数数组累积，避免为每条关系创建Python元组
+    relation_rows = array('i')
+    entity_rows = array('i')
+    disease_count = 0
+    skipped = 0
+    with open(path, 'rb') as f, open(shard_path, 'w', encoding='utf-8') as out:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            data = parse_line(line)
+            if data is None:
+                if len(line.strip()) >= 3:
+                    skipped += 1
+                continue
+            try:
+                properties, relations, entities = extract_record(data)
+            except (AttributeError, TypeError) as e:
+                print(f"记录格式错误，已跳过: {e}")
+                skipped += 1
+                continue
+            out.write(json.dumps(properties, ensure_ascii=False))
+            out.write('\n')
+            disease_count += 1
+            for relation, head, tail in relations:
+                relation_rows.extend((RELATION_IDS[relation], intern(head), intern(tail)))
+            for entity_type, name in entities:
+                entity_rows.extend((ENTITY_IDS[entity_type], intern(name)))
+
+    relations = np.frombuffer(relation_rows, dtype=np.int32).reshape(-1, 3)
+    entities = np.frombuffer(entity_rows, dtype=np.int32).reshape(-1, 2)
+    # 分片内先去重，减少传回主进程的数据量
+    if len(relations):
+        relations = np.unique(relations, axis=0)
+    if len(entities):
+        entities = np.unique(entities, axis=0)
+    return list(strings), relations, entities, disease_count, skipped
+
+
+def parse_source(source_path=DEFAULT_SOURCE_PATH, output_dir=DEFAULT_COLUMNS_DIR, workers=None):
+    # 多进程流式解析源文件，输出列存中间格式，供Neo4j和Milvus入库共同使用
+
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    ranges = split_ranges(source_path, workers)
+    shard_paths = [os.path.join(output_dir, f"diseases.{i}.jsonl") for i in range(len(ranges))]
+    print(f"正在解析 {source_path}，共 {len(ranges)} 个分片")
+
+    with ProcessPoolExecutor(max_workers=max(1, len(ranges))) as executor:
+        futures = [
+            executor.submit(parse_shard, source_path, start, end, shard_path)
+            for (start, end), shard_path in zip(ranges, shard_paths)
+        ]
+        shard_results = [future.result() for future in futures]
+
+    # 合并各分片的字符串表，把局部ID映射为全局ID
+    strings = {}
+    all_relations = []
+    all_entities = []
+    disease_count = 0
+    skipped = 0
+    for shard_strings, relations, entities, shard_diseases, shard_skipped in shard_results:
+        remap = np.fromiter((strings.setdefault(s, len(strings)) for s in shard_strings), dtype=np.int32, count=len(shard_strings))
+        if len(relations):
+            relations[:, 1:] = remap[relations[:, 1:]]
+            all_relations.append(relations)
+        if len(entities):
+            entities[:, 1] = remap[entities[:, 1]]
+            all_entities.append(entities)
+        disease_count += shard_diseases
+        skipped += shard_skipped
+
+    relations = np.unique(np.concatenate(all_relations), axis=0) if all_relations else np.zeros((0, 3), dtype=np.int32)
+    entities = np.unique(np.concatenate(all_entities), axis=0) if all_entities else np.zeros((0, 2), dtype=np.int32)
+
+    # 分片文件按源文件顺序拼接，保持疾病记录的原始顺序
+    with open(os.path.join(output_dir, "diseases.jsonl"), 'wb') as out:
+        for shard_path in shard_paths:
+            with open(shard_path, 'rb') as f:
+                shutil.copyfileobj(f, out)
+            os.remove(shard_path)
+
+    np.savez(
+        os.path.join(output_dir, "columns.npz"),
+        relation_type=relations[:, 0],
+        relation_head=relations[:, 1],
+        relation_tail=relations[:, 2],
+        entity_type=entities[:, 0],
+        entity_name=entities[:, 1],
+    )
+    with open(os.path.join(output_dir, "strings.json"), 'w', encoding='utf-8') as f:
+        json.dump(list(strings), f, ensure_ascii=False)
+    manifest = {
+        "version": 1,
+        "source": os.path.abspath(source_path),
+        "entity_types": ENTITY_TYPES,
+        "relation_types": [[name, *RELATION_TYPES[name]] for name in RELATION_NAMES],
+        "diseases": disease_count,
+        "entities": int(len(entities)),
+        "relations": int(len(relations)),
+        "strings": len(strings),
+        "skipped": skipped,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"解析完成: {disease_count} 个疾病, {len(entities)} 个实体, {len(relations)} 条关系, 跳过 {skipped} 行 -> {output_dir}")
+    return manifest
+
+
+def iter_batches(items, size):
+    # 从任意可迭代对象中按批取出，消费生成器时不需要先转成列表
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class GraphColumns:
+    # 列存中间格式的读取端：实体/关系为整数数组，名称通过共享字符串表解析
+
+    def __init__(self, directory=DEFAULT_COLUMNS_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json"), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(directory, "strings.json"), 'r', encoding='utf-8') as f:
+            self.strings = json.load(f)
+        with np.load(os.path.join(directory, "columns.npz")) as columns:
+            self.columns = {key: columns[key] for key in columns.files}
+        self.entity_types = self.manifest["entity_types"]
+        self.relation_types = [tuple(item) for item in self.manifest["relation_types"]]
+
+    def entities(self):
+        # 按类型分组返回非疾病实体名称；疾病实体带属性，由 diseases() 提供
+        grouped = {entity_type: [] for entity_type in self.entity_types if entity_type != "疾病"}
+        for type_id, name_id in zip(self.columns["entity_type"], self.columns["entity_name"]):
+            entity_type = self.entity_types[type_id]
+            if entity_type in grouped:
+                grouped[entity_type].append(self.strings[name_id])
+        return grouped
+
+    def relations(self):
+        # 逐条产出 (头类型, 头名称, 关系, 尾类型, 尾名称)，与原关系元组格式一致
+        for type_id, head, tail in zip(self.columns["relation_type"], self.columns["relation_head"], self.columns["relation_tail"]):
+            relation, head_type, tail_type = self.relation_types[type_id]
+            yield head_type, self.strings[head], relation, tail_type, self.strings[tail]
+
+    def diseases(self):
+        # 流式读取疾病属性，不一次性载入内存
+        with open(os.path.join(self.directory, "diseases.jsonl"), 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield jiter.from_json(line.rstrip(b'\n'))
+
+    def departments(self):
+        # 疾病名称 -> 所属科目，来自 疾病所属科目 关系列
+        relation_id = [name for name, _, _ in self.relation_types].index("疾病所属科目")
+        mask = self.columns["relation_type"] == relation_id
+        return {
+            self.strings[head]: self.strings[tail]
+            for head, tail in zip(self.columns["relation_head"][mask], self.columns["relation_tail"][mask])
+        }
+
+    def milvus_records(self):
+        # 转换为 MilvusInserter.load_data 的记录格式
+        departments = self.departments()
+        for disease in self.diseases():
+            department = departments.get(disease.get("名称", ""))
+            yield {
+                "_id": {"$oid": disease.get("oid", "")},
+                "name": disease.get("名称", ""),
+                "desc": disease.get("疾病简介", ""),
+                "symptom": disease.get("symptom", []),
+                "cure_department": [department] if department else [],
+            }
+
+
+
+class MilvusRecords:
+    # GraphColumns.milvus_records() 的可重复遍历包装：每次遍历都重新流式读取列存文件，
+    # 入库、关键词索引和记录库依次消费时不在内存中保留全部记录
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return self.columns.manifest["diseases"]
+
+    def __iter__(self):
+        return self.columns.milvus_records()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多进程解析疾病源数据，输出列存中间格式")
+    parser.add_argument('--source', type=str, default=DEFAULT_SOURCE_PATH, help='源数据文件，每行一条疾病记录')
+    parser.add_argument('--output', type=str, default=DEFAULT_COLUMNS_DIR, help='列存输出目录')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认为CPU核数')
+    args = parser.parse_args()
+
+    parse_source(args.source, args.output, args.workers)
@@ -1,11 +1,40 @@
-import requests
 import json
+from src.utils.clients import get_http_session
+from src.utils.resilience import resilient_call, BackendError, BackendResponseError
+from src.utils.scheduler import admission, estimate_tokens
+from src.utils.singleflight import get_flight
+
+_rerank_flight = get_flight("rerank")
+
+def request_rerank(query_symptom, documents, timeout):
+
+    url = "https://api.siliconflow.cn/v1/rerank"
+    payload = {
+        "model": "Qwen/Qwen3-Reranker-8B",
+        "query": query_symptom,
+        "documents": documents
+    }
+    headers = {
+        "Authorization": "Bearer <>",
+        "Content-Type": "application/json"
+    }
+
+    response = get_http_session().post(url, json=payload, headers=headers, timeout=timeout)
+    response.raise_for_status()
+
+    try:
+        rerank_result = response.json()
+    except json.JSONDecodeError:
+        raise BackendResponseError("rerank", f"JSON解码错误 - 响应内容: {response.text[:200]}")
+    if "results" not in rerank_result:
+        raise BackendResponseError("rerank", f"API响应中未找到results: {rerank_result}")
+    return rerank_result["results"]
 
 def rerank_diseases(query_symptom, milvus_results):
 
     if not milvus_results:
         return []
-    
+
 
     documents = []
     for result in milvus_results:
@@ -17,39 +46,37 @@ def rerank_diseases(query_symptom, milvus_results):
             symptom_text = ','.join(symptom_list)
         except:
             symptom_text = symptom
-        
+
         document = f"症状：{symptom_text} 描述：{desc}"
         documents.append(document)
 
-    url = "https://api.siliconflow.cn/v1/rerank"
-    payload = {
-        "model": "Qwen/Qwen3-Reranker-8B",
-        "query": query_symptom,
-        "documents": documents
-    }
-    headers = {
-        "Authorization": "Bearer <>",
-        "Content-Type": "application/json"
-    }
-    
+    # 重排序失败、熔断或被调度器拒绝时降级为原始向量检索顺序
+    def call_rerank():
+        with admission("rerank", estimate_tokens(query_symptom, *documents)):
+            return resilient_call(
+                "rerank",
+                lambda timeout: request_rerank(query_symptom, documents, timeout),
+                fallback=lambda: None
+            )
+
+    # 只合并远程打分请求；分数写回各调用方自己的结果字典
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        
-        rerank_result = response.json()
+        items = _rerank_flight.do((query_symptom, tuple(documents)), call_rerank)
+    except BackendError as e:
+        print(f"重排序未执行: {str(e)}")
+        items = None
+    if items is None:
+        return milvus_results
 
-        reranked_diseases = []
-        for item in rerank_result['results']:
-            original_index = item['index']
-            disease_data = milvus_results[original_index].copy()
-            disease_data['relevance_score'] = item['relevance_score']
-            reranked_diseases.append(disease_data)
-        
-        return reranked_diseases
-        
-    except Exception as e:
-        print(f"Rerank API调用失败: {e}")
-        return milvus_results 
+    reranked_diseases = []
+    for item in items:
+        original_index = item['index']
+        # 检索结果每次请求新建，直接在原字典上补充分数，不再复制
+        disease_data = milvus_results[original_index]
+        disease_data['relevance_score'] = item['relevance_score']
+        reranked_diseases.append(disease_data)
+
+    return reranked_diseases
 
 def rerank_diseases_with_topk(query_symptom, milvus_results, top_k=None):
 
@@ -57,5 +84,5 @@ def rerank_diseases_with_topk(query_symptom, milvus_results, top_k=None):
 
     if top_k is not None and len(reranked_results) > top_k:
         return reranked_results[:top_k]
-    
+
     return reranked_results
@@ -0,0 +1,75 @@
+import math
+
+from src.model.config import CASCADE_CONFIG
+from src.rerank.reranker import rerank_diseases
+from src.search.lexical_index import char_bigrams, normalize_symptoms
+from src.search.record_store import get_record_store
+
+
+def adaptive_cut(results, score_field, min_k, max_k, ratio):
+    # 按分数分布截断：保留分数不低于最高分 ratio 倍的结果，数量限制在 [min_k, max_k]
+    ranked = sorted(results, key=lambda r: r.get(score_field) or 0.0, reverse=True)
+    if len(ranked) <= min_k:
+        return ranked
+    top_score = ranked[0].get(score_field) or 0.0
+    if top_score <= 0:
+        return ranked[:min_k]
+    keep = min_k
+    while keep < min(max_k, len(ranked)) and (ranked[keep].get(score_field) or 0.0) >= top_score * ratio:
+        keep += 1
+    return ranked[:keep]
+
+
+def query_terms(query, symptoms=None):
+    if symptoms:
+        terms = set(symptoms)
+        for symptom in symptoms:
+            terms.update(char_bigrams(symptom))
+        return terms
+    return set(char_bigrams(query))
+
+
+def symptom_overlap(terms, candidate):
+    # 查询词项与候选疾病症状词项的集合余弦相似度
+    if not terms:
+        return 0.0
+    candidate_symptoms = normalize_symptoms(candidate.get('symptom'))
+    candidate_terms = set(candidate_symptoms)
+    for symptom in candidate_symptoms:
+        candidate_terms.update(char_bigrams(symptom))
+    if not candidate_terms:
+        return 0.0
+    return len(terms & candidate_terms) / math.sqrt(len(terms) * len(candidate_terms))
+
+
+def prefilter(query, candidates, symptoms=None, config=CASCADE_CONFIG):
+    # 本地预筛：融合召回分数与症状重合度加权，不调用任何远程服务
+    if not candidates:
+        return []
+    terms = query_terms(query, symptoms)
+    max_score = max(c.get('similarity_score') or 0.0 for c in candidates) or 1.0
+    overlap_weight = config["overlap_weight"]
+    for candidate in candidates:
+        candidate['prefilter_score'] = (
+            (1 - overlap_weight) * (candidate.get('similarity_score') or 0.0) / max_score
+            + overlap_weight * symptom_overlap(terms, candidate)
+        )
+    return adaptive_cut(candidates, 'prefilter_score', config["prefilter_min"], config["prefilter_max"], config["prefilter_ratio"])
+
+
+def cascade_rank(query, candidates, symptoms=None, config=CASCADE_CONFIG):
+    # candidates 为第一级宽召回结果；返回送入LLM的候选和各级数量
+    prefiltered = prefilter(query, candidates, symptoms, config)
+    # 宽召回不带 desc，只为预筛幸存、要送入重排序和LLM的候选解码
+    record_store = get_record_store()
+    if record_store is not None:
+        record_store.hydrate(prefiltered)
+    reranked = rerank_diseases(query, prefiltered)
+    # 重排序失败时原样返回输入列表
+    if reranked and reranked is not prefiltered:
+        final = adaptive_cut(reranked, 'relevance_score', config["llm_min"], config["llm_max"], config["llm_ratio"])
+    else:
+        # 重排序不可用时按预筛顺序截断
+        final = prefiltered[:config["llm_max"]]
+    depths = {"ann": len(candidates), "prefilter": len(prefiltered), "llm": len(final)}
+    return final, depths
@@ -0,0 +1,245 @@
+import argparse
+import os
+
+import numpy as np
+
+from src.model.config import MILVUS_CONFIG, DISEASE_GRAPH_CONFIG
+from src.utils.file_loader import FileLoader
+
+
+DEFAULT_GRAPH_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'disease_knn.npz')
+
+# 近邻来源：向量相似、图谱并发疾病、两者都是
+KIND_VECTOR = 1
+KIND_COMPLICATION = 2
+KIND_NAMES = {KIND_VECTOR: "vector", KIND_COMPLICATION: "complication", KIND_VECTOR | KIND_COMPLICATION: "both"}
+
+# 分块计算相似度矩阵，每块的行数
+BLOCK_SIZE = 1024
+
+
+class DiseaseGraph:
+    # 疾病近邻邻接表：neighbors[i] 为第i个疾病的近邻下标（-1填充），按相似度降序
+
+    def __init__(self, names, neighbors, scores, kinds):
+        self.names = names
+        self.neighbors = neighbors
+        self.scores = scores
+        self.kinds = kinds
+        self.rows = {}
+        for row, name in enumerate(names):
+            # 同名疾病保留第一条
+            self.rows.setdefault(name, row)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, disease_name):
+        return disease_name in self.rows
+
+    def lookup(self, disease_name, limit=None):
+        # 返回 [(近邻名称, 相似度, 来源)]；疾病不在表中时返回空列表
+        row = self.rows.get(disease_name)
+        if row is None:
+            return []
+        result = []
+        for neighbor, score, kind in zip(self.neighbors[row], self.scores[row], self.kinds[row]):
+            if neighbor < 0:
+                break
+            result.append((self.names[neighbor], float(score), KIND_NAMES[int(kind)]))
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    def expand(self, disease_names, per_disease, exclude=()):
+        # 每个疾病补充最多 per_disease 个不在 exclude 中的近邻，结果去重并保持顺序
+        seen = set(exclude) | set(disease_names)
+        expanded = []
+        for disease_name in disease_names:
+            added = 0
+            for neighbor, _, _ in self.lookup(disease_name):
+                if added >= per_disease:
+                    break
+                if neighbor in seen:
+                    continue
+                seen.add(neighbor)
+                expanded.append(neighbor)
+                added += 1
+        return expanded
+
+    @classmethod
+    def load(cls, path=DEFAULT_GRAPH_PATH):
+        with np.load(path) as data:
+            return cls(data["names"].tolist(), data["neighbors"], data["scores"], data["kinds"])
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    # 零向量（空症状或向量化失败）归一化后仍为零，与任何疾病的相似度都是0
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def field_weights():
+    # 与线上融合方式一致：加权融合时沿用symptom/desc权重，RRF时两者等权
+    from src.search.search_params import get_search_params
+
+    ranker = get_search_params()["ranker"]
+    if ranker["type"] == "weighted":
+        return tuple(ranker["weights"])
+    return 0.5, 0.5
+
+
+def compute_neighbors(symptom_vectors, desc_vectors, k, weights):
+    # 分块计算加权余弦相似度，每行取前k个（不含自身）；返回 (下标, 相似度)
+    symptom_vectors = normalize_rows(symptom_vectors)
+    desc_vectors = normalize_rows(desc_vectors)
+    count = len(symptom_vectors)
+    k = min(k, count - 1)
+    indices = np.full((count, max(k, 0)), -1, dtype=np.int32)
+    scores = np.zeros((count, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+
+    for start in range(0, count, BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, count)
+        similarity = weights[0] * (symptom_vectors[start:end] @ symptom_vectors.T)
+        similarity += weights[1] * (desc_vectors[start:end] @ desc_vectors.T)
+        similarity[np.arange(end - start), np.arange(start, end)] = -np.inf
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+
+def build_disease_graph(names, symptom_vectors, desc_vectors, complications, output_path=DEFAULT_GRAPH_PATH, config=None):
+    # complications: {疾病名称: [并发疾病名称]}；并发疾病与向量近邻合并，按 相似度+加分 重新排序
+
+    config = config or DISEASE_GRAPH_CONFIG
+    weights = field_weights()
+    vector_indices, vector_scores = compute_neighbors(symptom_vectors, desc_vectors, config["k"], weights)
+    symptom_normed = normalize_rows(symptom_vectors)
+    desc_normed = normalize_rows(desc_vectors)
+
+    rows = {}
+    for row, name in enumerate(names):
+        rows.setdefault(name, row)
+
+    width = vector_indices.shape[1] + config["max_complications"]
+    neighbors = np.full((len(names), width), -1, dtype=np.int32)
+    scores = np.zeros((len(names), width), dtype=np.float32)
+    kinds = np.zeros((len(names), width), dtype=np.uint8)
+    merged_complications = 0
+
+    for row, name in enumerate(names):
+        entries = {}
+        for neighbor, score in zip(vector_indices[row], vector_scores[row]):
+            if neighbor >= 0:
+                entries[int(neighbor)] = [float(score), KIND_VECTOR]
+        for complication in complications.get(name, [])[:config["max_complications"]]:
+            neighbor = rows.get(complication)
+            if neighbor is None or neighbor == row:
+                continue
+            if neighbor not in entries:
+                score = weights[0] * float(symptom_normed[row] @ symptom_normed[neighbor])
+                score += weights[1] * float(desc_normed[row] @ desc_normed[neighbor])
+                entries[neighbor] = [score, 0]
+            entries[neighbor][1] |= KIND_COMPLICATION
+            merged_complications += 1
+
+        ranked = sorted(
+            entries.items(),
+            key=lambda item: item[1][0] + (config["complication_bonus"] if item[1][1] & KIND_COMPLICATION else 0.0),
+            reverse=True
+        )[:width]
+        for column, (neighbor, (score, kind)) in enumerate(ranked):
+            neighbors[row, column] = neighbor
+            scores[row, column] = score
+            kinds[row, column] = kind
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp.npz"
+    np.savez(tmp_path, names=np.array(names, dtype=str), neighbors=neighbors, scores=scores, kinds=kinds)
+    os.replace(tmp_path, output_path)
+    print(f"疾病近邻图构建完成: {len(names)} 个疾病, 每个最多 {width} 个近邻, 合并并发关系 {merged_complications} 条 -> {output_path}")
+    return DiseaseGraph(list(names), neighbors, scores, kinds)
+
+
+def load_vectors_from_milvus(batch_size=1000):
+    from src.search.partition_router import searchable_partitions
+    from src.utils.clients import get_milvus_client
+
+    names, symptom_vectors, desc_vectors = [], [], []
+    iterator = get_milvus_client().query_iterator(
+        MILVUS_CONFIG["collection"],
+        batch_size=batch_size,
+        filter='oid != ""',
+        output_fields=["name", "symptom_vector", "desc_vector"],
+        partition_names=searchable_partitions()
+    )
+    while True:
+        rows = iterator.next()
+        if not rows:
+            break
+        for row in rows:
+            names.append(row["name"])
+            symptom_vectors.append(np.asarray(row["symptom_vector"], dtype=np.float32))
+            desc_vectors.append(np.asarray(row["desc_vector"], dtype=np.float32))
+    iterator.close()
+    return names, np.vstack(symptom_vectors), np.vstack(desc_vectors)
+
+
+def load_vectors_from_snapshot(snapshot_dir):
+    # 读取 src/milvus/vector_snapshot.py 导出的快照，无需连接Milvus
+    from src.milvus.vector_snapshot import load_manifest
+
+    manifest = load_manifest(snapshot_dir)
+    names, symptom_vectors, desc_vectors = [], [], []
+    for partition in manifest["partitions"]:
+        directory = os.path.join(snapshot_dir, partition)
+        names.extend(np.load(os.path.join(directory, "name.npy")).tolist())
+        symptom_vectors.append(np.load(os.path.join(directory, "symptom_vector.npy")))
+        desc_vectors.append(np.load(os.path.join(directory, "desc_vector.npy")))
+    return names, np.vstack(symptom_vectors), np.vstack(desc_vectors)
+
+
+def load_complications():
+    # 优先使用本地图快照，没有快照时直接查询Neo4j
+    from src.search.graph_snapshot import get_graph_snapshot
+
+    snapshot = get_graph_snapshot()
+    if snapshot is not None:
+        return {name: snapshot.lookup(name)["complications"] for name in snapshot.entries}
+
+    from src.utils.clients import get_neo4j_client
+
+    records = get_neo4j_client().run("""
+    MATCH (d:疾病)-[:疾病并发疾病]->(c:疾病)
+    RETURN d.名称 AS name, collect(DISTINCT c.名称) AS complications
+    """).data()
+    return {record["name"]: record["complications"] for record in records}
+
+
+_loader = FileLoader("疾病近邻图", DiseaseGraph.load)
+
+
+def get_disease_graph(path=DEFAULT_GRAPH_PATH):
+    # 近邻表被重新构建后自动切换到新版本；不存在时返回 None，候选扩展只做名称补全
+    return _loader.get(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线计算疾病向量近邻并合并图谱并发疾病，生成近邻邻接表")
+    parser.add_argument('--snapshot', type=str, default=None, help='向量快照目录，不指定时从Milvus读取向量')
+    parser.add_argument('--output', type=str, default=DEFAULT_GRAPH_PATH, help='近邻表输出路径')
+    parser.add_argument('--k', type=int, default=DISEASE_GRAPH_CONFIG["k"], help='每个疾病的向量近邻数')
+    args = parser.parse_args()
+
+    if args.snapshot:
+        names, symptom_vectors, desc_vectors = load_vectors_from_snapshot(args.snapshot)
+    else:
+        names, symptom_vectors, desc_vectors = load_vectors_from_milvus()
+    print(f"已读取 {len(names)} 个疾病的向量")
+    build_disease_graph(names, symptom_vectors, desc_vectors, load_complications(), args.output, {**DISEASE_GRAPH_CONFIG, "k": args.k})
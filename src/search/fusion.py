@@ -0,0 +1,26 @@
+def fuse_results(legs, top_k, key="name"):
+    # legs: [(results, score_field, weight), ...]
+    # 各路召回的分数先除以本路最大值归一化，再按权重求和写入 similarity_score
+
+    fused = {}
+    for results, score_field, weight in legs:
+        if not results:
+            continue
+        max_score = max(result.get(score_field, 0.0) for result in results) or 1.0
+        for result in results:
+            result_key = result.get(key)
+            if result_key is None:
+                continue
+            entry = fused.get(result_key)
+            if entry is None:
+                entry = dict(result)
+                entry['similarity_score'] = 0.0
+                fused[result_key] = entry
+            else:
+                for field, value in result.items():
+                    if entry.get(field) is None:
+                        entry[field] = value
+            entry['similarity_score'] += weight * result.get(score_field, 0.0) / max_score
+
+    ranked = sorted(fused.values(), key=lambda r: r['similarity_score'], reverse=True)
+    return ranked[:top_k]
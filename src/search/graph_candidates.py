@@ -0,0 +1,177 @@
+import argparse
+import json
+import math
+import os
+import pickle
+
+import numpy as np
+
+from src.utils.file_loader import FileLoader
+
+
+DEFAULT_MATRIX_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'graph_symptom_matrix.pkl')
+
+
+class SymptomGraphIndex:
+    # 从图数据库导出的 疾病×症状 稀疏矩阵，按症状IDF加权重合度为疾病打分，不访问Neo4j
+
+    def __init__(self, diseases, symptoms, disease_indptr, disease_indices):
+        self.diseases = diseases
+        self.symptoms = symptoms
+        self.symptom_ids = {symptom: i for i, symptom in enumerate(symptoms)}
+        self.disease_indptr = disease_indptr
+        self.disease_indices = disease_indices
+
+        # 转置为 症状->疾病 的CSC结构，打分时只遍历命中症状的倒排列表
+        order = np.argsort(disease_indices, kind="stable")
+        row_of_entry = np.repeat(np.arange(len(diseases), dtype=np.int32), np.diff(disease_indptr))
+        self.symptom_indices = row_of_entry[order]
+        counts = np.bincount(disease_indices, minlength=len(symptoms))
+        self.symptom_indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        doc_count = max(1, len(diseases))
+        self.idf = np.log(doc_count / np.maximum(counts, 1)).astype(np.float32) + 1.0
+        disease_mass = np.zeros(len(diseases), dtype=np.float32)
+        np.add.at(disease_mass, row_of_entry, self.idf[disease_indices] ** 2)
+        self.disease_norm = np.sqrt(np.maximum(disease_mass, 1e-6))
+
+        self.terms_by_char = {}
+        for symptom in sorted(symptoms, key=len, reverse=True):
+            if symptom:
+                self.terms_by_char.setdefault(symptom[0], []).append(symptom)
+
+    def match_symptoms(self, patient_symptoms):
+        # 先精确匹配症状节点；未命中时退化为包含关系匹配
+        matched = set()
+        for symptom in patient_symptoms:
+            symptom = symptom.strip()
+            if not symptom:
+                continue
+            if symptom in self.symptom_ids:
+                matched.add(self.symptom_ids[symptom])
+                continue
+            for i, char in enumerate(symptom):
+                for term in self.terms_by_char.get(char, ()):
+                    if symptom.startswith(term, i) and len(term) >= 2:
+                        matched.add(self.symptom_ids[term])
+        return matched
+
+    def match_text(self, text):
+        # 未提取结构化症状时，直接在原始文本中查找症状词
+        matched = set()
+        for i, char in enumerate(text or ""):
+            for term in self.terms_by_char.get(char, ()):
+                if len(term) >= 2 and text.startswith(term, i):
+                    matched.add(self.symptom_ids[term])
+        return matched
+
+    def score(self, symptom_ids, top_k=10):
+        if not symptom_ids:
+            return []
+        scores = np.zeros(len(self.diseases), dtype=np.float32)
+        query_norm = 0.0
+        for symptom_id in symptom_ids:
+            start, end = self.symptom_indptr[symptom_id], self.symptom_indptr[symptom_id + 1]
+            weight = self.idf[symptom_id]
+            scores[self.symptom_indices[start:end]] += weight * weight
+            query_norm += weight * weight
+        scores /= self.disease_norm * math.sqrt(query_norm)
+
+        top_k = min(top_k, int(np.count_nonzero(scores)))
+        if top_k <= 0:
+            return []
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+
+        results = []
+        for disease_id in candidates:
+            start, end = self.disease_indptr[disease_id], self.disease_indptr[disease_id + 1]
+            disease_symptoms = [self.symptoms[i] for i in self.disease_indices[start:end]]
+            results.append({
+                'oid': None,
+                'name': self.diseases[disease_id],
+                'symptom': json.dumps(disease_symptoms, ensure_ascii=False),
+                'graph_score': float(scores[disease_id])
+            })
+        return results
+
+    def search(self, text, symptoms=None, top_k=10):
+        symptom_ids = self.match_symptoms(symptoms) if symptoms else self.match_text(text)
+        return self.score(symptom_ids, top_k)
+
+    def state(self):
+        return {
+            "diseases": self.diseases,
+            "symptoms": self.symptoms,
+            "disease_indptr": self.disease_indptr,
+            "disease_indices": self.disease_indices,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(**state)
+
+
+def export_symptom_matrix(client, output_path=DEFAULT_MATRIX_PATH):
+    # 离线任务：把 (疾病)-[:疾病的症状]->(疾病症状) 关系导出为CSR矩阵
+
+    records = client.run("""
+    MATCH (d:疾病)
+    OPTIONAL MATCH (d)-[:疾病的症状]->(s:疾病症状)
+    RETURN d.名称 AS disease, collect(DISTINCT s.名称) AS symptoms
+    """).data()
+
+    diseases, indptr, indices = [], [0], []
+    symptom_ids = {}
+    for record in records:
+        if not record["disease"]:
+            continue
+        diseases.append(record["disease"])
+        for symptom in record["symptoms"]:
+            if symptom not in symptom_ids:
+                symptom_ids[symptom] = len(symptom_ids)
+            indices.append(symptom_ids[symptom])
+        indptr.append(len(indices))
+
+    index = SymptomGraphIndex(
+        diseases,
+        list(symptom_ids),
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int32)
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    # 先写临时文件再替换，运行中的服务不会读到写了一半的矩阵
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(index.state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, output_path)
+    print(f"症状矩阵导出完成: {len(diseases)} 个疾病, {len(symptom_ids)} 个症状, {len(indices)} 条关系 -> {output_path}")
+    return index
+
+
+def load_symptom_graph_index(path):
+    with open(path, 'rb') as f:
+        return SymptomGraphIndex.from_state(pickle.load(f))
+
+
+_loader = FileLoader("症状矩阵", load_symptom_graph_index)
+
+
+def get_symptom_graph_index(path=DEFAULT_MATRIX_PATH):
+    # 矩阵文件被重新导出后自动切换到新版本；文件不存在时返回 None，跳过图召回
+    return _loader.get(path)
+
+
+if __name__ == "__main__":
+    import py2neo
+
+    parser = argparse.ArgumentParser(description="从neo4j导出疾病×症状稀疏矩阵")
+    parser.add_argument('--website', type=str, default='bolt://localhost:7687', help='neo4j的连接网站')
+    parser.add_argument('--user', type=str, default='neo4j', help='neo4j的用户名')
+    parser.add_argument('--password', type=str, default='neo4j123', help='neo4j的密码')
+    parser.add_argument('--dbname', type=str, default='neo4j', help='数据库名称')
+    parser.add_argument('--output', type=str, default=DEFAULT_MATRIX_PATH, help='矩阵输出路径')
+    args = parser.parse_args()
+
+    client = py2neo.Graph(args.website, user=args.user, password=args.password, name=args.dbname)
+    export_symptom_matrix(client, args.output)
@@ -0,0 +1,195 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'graph_snapshot.bin')
+
+# 文件格式：MAGIC | header长度(uint64) | header JSON | 病因 二进制拼接区
+# header 中每条记录为 [疾病名称, 病因offset, 病因length, [科室], [并发疾病]]
+MAGIC = b"GSNP0001"
+
+# 检查快照文件是否被替换的最小间隔（秒）
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+def format_disease_info(disease_name, cause, departments, complications):
+
+    result_text = f"疾病名称：{disease_name}\n\n"
+
+    if cause:
+        result_text += f"疾病病因：{cause}\n\n"
+
+    if departments:
+        result_text += f"治疗科室：{' '.join(departments)}\n\n"
+
+    if complications:
+        result_text += f"并发症：{' '.join(complications)}\n\n"
+
+    return result_text.strip()
+
+
+class GraphSnapshot:
+    # 图数据库中每个疾病邻域（病因/科室/并发症）的只读本地快照，请求路径不再访问Neo4j
+
+    def __init__(self, version, entries, mm, blob_offset):
+        self.version = version
+        self.entries = entries
+        self.mm = mm
+        self.blob_offset = blob_offset
+
+    def read_cause(self, offset, length):
+        start = self.blob_offset + offset
+        return self.mm[start:start + length].decode('utf-8')
+
+    def __contains__(self, disease_name):
+        return disease_name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, disease_name):
+        entry = self.entries.get(disease_name)
+        if entry is None:
+            return None
+        offset, length, departments, complications = entry
+        return {
+            "cause": self.read_cause(offset, length),
+            "departments": departments,
+            "complications": complications,
+        }
+
+    def describe(self, disease_name):
+        # 与 neo4j_diagnosis_search 的返回格式一致；疾病不在图中时返回空字符串
+        info = self.lookup(disease_name)
+        if info is None:
+            return ""
+        return format_disease_info(disease_name, info["cause"], info["departments"], info["complications"])
+
+    @classmethod
+    def load(cls, path=DEFAULT_SNAPSHOT_PATH):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是有效的图快照文件: {path}")
+            header_length = struct.unpack('<Q', f.read(8))[0]
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        entries = {}
+        for name, offset, length, departments, complications in header["records"]:
+            # 同名疾病保留第一条，与原查询取第一条结果一致
+            if name not in entries:
+                entries[sys.intern(name)] = (offset, length, departments, complications)
+        return cls(header["snapshot_version"], entries, mm, len(MAGIC) + 8 + header_length)
+
+
+def write_snapshot(records, output_path=DEFAULT_SNAPSHOT_PATH, version=None):
+    # records: [(疾病名称, 病因, [科室], [并发疾病])]；先写临时文件再原子替换，已打开的旧快照不受影响
+
+    version = version if version is not None else time.time_ns()
+    entries = []
+    blob = bytearray()
+    for name, cause, departments, complications in records:
+        cause_bytes = (cause or "").encode('utf-8')
+        entries.append([name, len(blob), len(cause_bytes), list(departments), list(complications)])
+        blob.extend(cause_bytes)
+
+    header = json.dumps({
+        "version": 1,
+        "snapshot_version": version,
+        "count": len(entries),
+        "records": entries
+    }, ensure_ascii=False).encode('utf-8')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(blob)
+    os.replace(tmp_path, output_path)
+    print(f"图快照导出完成: {len(entries)} 个疾病, 版本 {version} -> {output_path}")
+    return version
+
+
+def export_graph_snapshot(client, output_path=DEFAULT_SNAPSHOT_PATH):
+    # 离线任务：一次查询导出所有疾病的病因、所属科目和并发疾病
+
+    records = client.run("""
+    MATCH (d:疾病)
+    OPTIONAL MATCH (d)-[:疾病所属科目]->(dept:科目)
+    WITH d, collect(DISTINCT dept.名称) AS departments
+    OPTIONAL MATCH (d)-[:疾病并发疾病]->(comp:疾病)
+    RETURN d.名称 AS name, d.疾病病因 AS cause, departments, collect(DISTINCT comp.名称) AS complications
+    """).data()
+
+    return write_snapshot(
+        [(record["name"], record["cause"], record["departments"], record["complications"])
+         for record in records if record["name"]],
+        output_path
+    )
+
+
+class SnapshotLoader:
+    # 按文件变化热加载快照：导出任务替换文件后，下一次查询时切换到新版本
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.file_key = None
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self.snapshot is not None and now - self.last_check < self.check_interval:
+            return self.snapshot
+        with self.lock:
+            if self.snapshot is not None and now - self.last_check < self.check_interval:
+                return self.snapshot
+            self.last_check = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return self.snapshot
+            file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if file_key != self.file_key:
+                try:
+                    snapshot = GraphSnapshot.load(self.path)
+                except Exception as e:
+                    print(f"图快照加载失败，继续使用当前版本: {e}")
+                    return self.snapshot
+                if self.snapshot is not None:
+                    print(f"图快照已更新: {self.snapshot.version} -> {snapshot.version}")
+                self.snapshot = snapshot
+                self.file_key = file_key
+        return self.snapshot
+
+
+_loader = SnapshotLoader()
+
+
+def get_graph_snapshot():
+    # 快照文件不存在时返回 None，调用方回退到直接查询Neo4j
+    return _loader.get()
+
+
+if __name__ == "__main__":
+    import py2neo
+
+    parser = argparse.ArgumentParser(description="从neo4j导出疾病邻域快照")
+    parser.add_argument('--website', type=str, default='bolt://localhost:7687', help='neo4j的连接网站')
+    parser.add_argument('--user', type=str, default='neo4j', help='neo4j的用户名')
+    parser.add_argument('--password', type=str, default='neo4j123', help='neo4j的密码')
+    parser.add_argument('--dbname', type=str, default='neo4j', help='数据库名称')
+    parser.add_argument('--output', type=str, default=DEFAULT_SNAPSHOT_PATH, help='快照输出路径')
+    args = parser.parse_args()
+
+    client = py2neo.Graph(args.website, user=args.user, password=args.password, name=args.dbname)
+    export_graph_snapshot(client, args.output)
@@ -0,0 +1,184 @@
+import argparse
+import heapq
+import json
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+
+from src.utils.file_loader import FileLoader
+
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'lexical_index.pkl')
+
+# 与 hybrid_search 中 WeightedRanker(0.6, 0.4) 的字段权重保持一致
+FIELD_WEIGHTS = {"symptom": 0.6, "desc": 0.4}
+
+_NON_WORD = re.compile(r'[\s\W_]+')
+
+
+def char_bigrams(text):
+    # 中文没有天然分词，用字符二元组作为基础词项
+    text = _NON_WORD.sub('', text or '')
+    if len(text) < 2:
+        return [text] if text else []
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def normalize_symptoms(symptoms):
+    if isinstance(symptoms, str):
+        try:
+            symptoms = json.loads(symptoms)
+        except (ValueError, TypeError):
+            symptoms = [symptoms]
+    cleaned = []
+    for symptom in symptoms or []:
+        if not isinstance(symptom, str):
+            continue
+        symptom = symptom.strip()
+        if symptom.endswith('...'):
+            symptom = symptom[:-3]
+        if symptom:
+            cleaned.append(symptom)
+    return cleaned
+
+
+class LexicalIndex:
+    # 基于 BM25 的本地倒排索引，字段为 symptom（完整症状词 + 二元组）和 desc（二元组）
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = []
+        self.fields = {
+            field: {"postings": defaultdict(list), "lengths": [], "idf": {}, "avgdl": 0.0}
+            for field in FIELD_WEIGHTS
+        }
+        self.terms_by_char = defaultdict(set)
+
+    def add(self, oid, name, desc, symptoms):
+        symptoms = normalize_symptoms(symptoms)
+        doc_id = len(self.docs)
+        # 只保存主键，desc / symptom 由记录库补全
+        self.docs.append((oid, name))
+
+        symptom_tokens = [f"#{symptom}" for symptom in symptoms]
+        for symptom in symptoms:
+            symptom_tokens.extend(char_bigrams(symptom))
+            self.terms_by_char[symptom[0]].add(symptom)
+
+        for field, tokens in (("symptom", symptom_tokens), ("desc", char_bigrams(desc))):
+            index = self.fields[field]
+            for term, tf in Counter(tokens).items():
+                index["postings"][term].append((doc_id, tf))
+            index["lengths"].append(len(tokens))
+
+    def finalize(self):
+        doc_count = len(self.docs)
+        for index in self.fields.values():
+            index["postings"] = dict(index["postings"])
+            index["avgdl"] = (sum(index["lengths"]) / doc_count) if doc_count else 0.0
+            index["idf"] = {
+                term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for term, postings in index["postings"].items()
+            }
+        self.terms_by_char = {char: sorted(terms, key=len, reverse=True) for char, terms in self.terms_by_char.items()}
+        return self
+
+    def query_tokens(self, query):
+        # 查询中出现的完整症状词（如"血尿""腰痛"）作为独立词项，精确匹配的权重高于二元组
+        tokens = char_bigrams(query)
+        for i, char in enumerate(query):
+            for term in self.terms_by_char.get(char, ()):
+                if query.startswith(term, i):
+                    tokens.append(f"#{term}")
+        return tokens
+
+    def search(self, query, top_k=10):
+        if not query or not self.docs:
+            return []
+        scores = defaultdict(float)
+        query_counts = Counter(self.query_tokens(query))
+        for field, weight in FIELD_WEIGHTS.items():
+            index = self.fields[field]
+            lengths = index["lengths"]
+            avgdl = index["avgdl"] or 1.0
+            for term in query_counts:
+                postings = index["postings"].get(term)
+                if not postings:
+                    continue
+                idf = index["idf"][term]
+                for doc_id, tf in postings:
+                    norm = self.k1 * (1 - self.b + self.b * lengths[doc_id] / avgdl)
+                    scores[doc_id] += weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        results = []
+        for doc_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            oid, name = self.docs[doc_id]
+            results.append({
+                'oid': oid,
+                'name': name,
+                'lexical_score': score
+            })
+        return results
+
+    def search_batch(self, queries, top_k=10):
+        return [self.search(query, top_k) for query in queries]
+
+    def state(self):
+        # 只序列化基础类型，避免pickle绑定到模块路径
+        return {"k1": self.k1, "b": self.b, "docs": self.docs, "fields": self.fields, "terms_by_char": self.terms_by_char}
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls(state["k1"], state["b"])
+        index.docs = state["docs"]
+        index.fields = state["fields"]
+        index.terms_by_char = state["terms_by_char"]
+        return index
+
+
+def build_lexical_index(records, output_path=DEFAULT_INDEX_PATH):
+    # records 与 MilvusInserter.load_data 的格式一致：{"_id": {"$oid": ...}, "name", "desc", "symptom": [...]}
+
+    index = LexicalIndex()
+    for record in records:
+        oid = record.get("_id", {}).get("$oid", "") if isinstance(record.get("_id"), dict) else record.get("oid", "")
+        if not oid:
+            continue
+        index.add(oid, record.get("name", ""), record.get("desc", ""), record.get("symptom", []))
+    index.finalize()
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    # 先写临时文件再替换，运行中的服务不会读到写了一半的索引
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(index.state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, output_path)
+    print(f"关键词索引构建完成: {len(index.docs)} 个疾病 -> {output_path}")
+    return index
+
+
+def load_lexical_index(path):
+    with open(path, 'rb') as f:
+        return LexicalIndex.from_state(pickle.load(f))
+
+
+_loader = FileLoader("关键词索引", load_lexical_index)
+
+
+def get_lexical_index(path=DEFAULT_INDEX_PATH):
+    # 索引文件被重建后自动切换到新版本；文件不存在时返回 None，检索退化为纯向量检索
+    return _loader.get(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建疾病症状/描述的BM25关键词索引")
+    parser.add_argument('--source', type=str, required=True, help='与insert.py相同格式的JSON数据文件')
+    parser.add_argument('--output', type=str, default=DEFAULT_INDEX_PATH, help='索引输出路径')
+    args = parser.parse_args()
+
+    with open(args.source, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    build_lexical_index(records, args.output)
@@ -1,74 +1,217 @@
-import sys
-import os
+import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
-from pymilvus import connections, db, Collection, AnnSearchRequest, WeightedRanker, MilvusClient
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'embedding'))
-from embedding import get_embedding
+from src.embedding.embedding import get_embeddings
+from src.model.config import MILVUS_CONFIG
+from src.utils.clients import get_milvus_client
+from src.search.fusion import fuse_results
+from src.search.lexical_index import get_lexical_index
+from src.search.graph_candidates import get_symptom_graph_index
+from src.search.record_store import get_record_store
+from src.search.search_params import get_search_params, build_ranker
+from src.search.partition_router import get_partition_router
 
-def search_similar_diseases(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+# 关键词(BM25)召回和图症状召回在融合分数中的权重，向量召回占剩余部分
+LEXICAL_WEIGHT = 0.3
+GRAPH_WEIGHT = 0.2
+
+_lexical_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical")
+
+def search_similar_diseases(query: str, top_k: int = 5, symptoms: List[str] = None, with_desc: bool = True) -> List[Dict[str, Any]]:
+
+    return search_similar_diseases_batch([query], top_k=top_k, symptom_lists=[symptoms], with_desc=with_desc)[0]
+
+def search_similar_diseases_batch(queries: List[str], top_k: int = 5, symptom_lists: List[List[str]] = None, vectors: list = None, with_desc: bool = True) -> List[List[Dict[str, Any]]]:
+    # symptom_lists: 每个查询已提取的结构化症状（可选），用于图症状召回
+    # vectors: 已有的查询向量（可选），提供时跳过向量化请求
+    # with_desc: 宽召回后还要预筛时传 False，desc 由 cascade_rank 只为预筛幸存的候选解码
+
+    if not queries:
+        return []
+    symptom_lists = symptom_lists or [None] * len(queries)
+
+    # 关键词和图召回只返回主键，需要本地记录库补全字段；记录库不存在时只做向量检索
+    record_store = get_record_store()
+
+    # 关键词召回不依赖向量化，先于embedding请求启动
+    lexical_index = get_lexical_index() if record_store is not None else None
+    lexical_future = None
+    if lexical_index is not None:
+        lexical_future = _lexical_executor.submit(lexical_index.search_batch, queries, top_k * 2)
+
+    # 图症状召回基于本地稀疏矩阵，亚毫秒级，直接同步执行
+    graph_index = get_symptom_graph_index() if record_store is not None else None
+    graph_results = None
+    if graph_index is not None:
+        graph_results = [
+            graph_index.search(query, symptoms=symptoms, top_k=top_k * 2)
+            for query, symptoms in zip(queries, symptom_lists)
+        ]
+
+    dense_results = dense_search_batch(queries, top_k, vectors, with_desc)
+
+    lexical_results = None
+    if lexical_future is not None:
+        try:
+            lexical_results = lexical_future.result()
+        except Exception as e:
+            print(f"关键词检索错误: {e}")
+
+    if lexical_results is None and graph_results is None:
+        return dense_results or [[] for _ in queries]
+    if dense_results is None:
+        # 向量化服务不可用时仅返回本地召回结果
+        print("向量检索不可用，使用关键词和图症状召回结果")
+
+    dense_weight = 1 - (LEXICAL_WEIGHT if lexical_results is not None else 0) - (GRAPH_WEIGHT if graph_results is not None else 0)
+    fused_results = []
+    for i in range(len(queries)):
+        fused = fuse_results([
+            (dense_results[i] if dense_results else [], 'similarity_score', dense_weight),
+            (lexical_results[i] if lexical_results else [], 'lexical_score', LEXICAL_WEIGHT),
+            (graph_results[i] if graph_results else [], 'graph_score', GRAPH_WEIGHT)
+        ], top_k)
+        # 关键词和图召回只返回 oid/name，融合后再从本地记录库补全字段
+        fused_results.append(record_store.hydrate(fused, with_desc))
+    return fused_results
+
+def embed_queries(queries: List[str]) -> list:
+    # 使用检索模块的向量化配置，供会话等需要复用查询向量的调用方使用
 
-    host = "localhost"
-    port = "19530"
     api_token = ""
-    database_name = "llm_medication"
-    collection_name = "medication2" 
-    partition_name = "knowledge_base"
-    dimension = 4096
-    
+    return get_embeddings(queries, api_token)
+
+def dense_search_batch(queries: List[str], top_k: int = 5, vectors: list = None, with_desc: bool = True):
+    # 返回每个查询的向量检索结果；向量化或Milvus不可用时返回 None
+
+    collection_name = MILVUS_CONFIG["collection"]
+    dimension = MILVUS_CONFIG["dimension"]
+
+    all_results = [[] for _ in queries]
+
     try:
+        # pymilvus 只在第一次检索时导入，客户端在进程内复用
+        from pymilvus import AnnSearchRequest
+
+        client = get_milvus_client()
+
+        # 一次请求向量化所有查询，向量化失败(None)的查询不参与检索；float32数组直接传给Milvus
+        query_vectors = vectors if vectors is not None else embed_queries(queries)
+        valid_indices = [i for i, vector in enumerate(query_vectors) if vector is not None and len(vector) == dimension]
+        if not valid_indices:
+            return all_results
+
+        # nprobe/单字段召回数/融合方式由 src/milvus/autotune.py 调参生成，未调参时使用默认值
+        search_params = get_search_params()
+        field_limit = top_k * search_params["search"]["limit_factor"]
+        param = dict(search_params["search"]["params"])
+        if "ef" in param:
+            # HNSW要求ef不小于召回数
+            param["ef"] = max(param["ef"], field_limit)
+        ranker = build_ranker(search_params["ranker"])
+
+        # 有本地记录库时只取主键和分数，避免每次检索通过gRPC传回完整desc
+        record_store = get_record_store()
+        output_fields = ["oid"] if record_store is not None else ["oid", "name", "desc", "symptom"]
+
+        def search_group(indices, partition_names):
+            requests = [
+                AnnSearchRequest(
+                    data=[query_vectors[i] for i in indices],
+                    anns_field=field,
+                    param=param,
+                    limit=field_limit
+                )
+                for field in ("symptom_vector", "desc_vector")
+            ]
+            return client.hybrid_search(
+                collection_name=collection_name,
+                reqs=requests,
+                ranker=ranker,
+                limit=top_k,
+                output_fields=output_fields,
+                partition_names=partition_names
+            )
+
+        # 有分区映射时每个查询只检索最相关的几个科室分区，路由到相同分区的查询合并为一次请求；
+        # 没有映射时检索整个collection（按科室写入后默认分区为空，不能只查默认分区）
+        router = get_partition_router()
+        groups = {}
+        full_search = set()
+        for i in valid_indices:
+            if router is None:
+                groups.setdefault(None, []).append(i)
+                full_search.add(i)
+                continue
+            names, is_full = router.route(query_vectors[i], field_limit)
+            groups.setdefault(tuple(names), []).append(i)
+            if is_full:
+                full_search.add(i)
+
+        hits_by_query = {}
+        searched_partitions = set()
+        for names, indices in groups.items():
+            if router is not None:
+                try:
+                    router.ensure_loaded(client, names)
+                    results = search_group(indices, list(names))
+                except Exception:
+                    # 分区可能已被其他进程释放，强制重新加载后重试一次
+                    router.ensure_loaded(client, names, force=True)
+                    results = search_group(indices, list(names))
+                searched_partitions.update(names)
+            else:
+                results = search_group(indices, None)
+            hits_by_query.update(zip(indices, results or []))
+
+        if router is not None:
+            # 路由分区内结果不足 top_k 的查询回退为全量检索
+            fallback = [i for i in valid_indices if i not in full_search and len(hits_by_query.get(i) or []) < top_k]
+            if fallback:
+                names = router.fallback(len(fallback))
+                router.ensure_loaded(client, names)
+                hits_by_query.update(zip(fallback, search_group(fallback, names) or []))
+                searched_partitions.update(names)
+
+        missing_oids = set()
+        for query_index, hits in hits_by_query.items():
+            search_results = []
+            for hit in hits:
+                oid = hit.entity.get('oid') or hit.id
+                record = record_store.get(oid) if record_store is not None else None
+                if record is not None:
+                    result_dict = record.to_result(float(hit.distance), with_desc)
+                else:
+                    result_dict = {
+                        'oid': oid,
+                        'name': hit.entity.get('name'),
+                        'desc': hit.entity.get('desc'),
+                        'symptom': hit.entity.get('symptom'),
+                        'similarity_score': float(hit.distance)
+                    }
+                    if record_store is not None:
+                        missing_oids.add(oid)
+                search_results.append(result_dict)
+            all_results[query_index] = search_results
+
+        if missing_oids:
+            # 记录库落后于collection时，只为缺失的OID回查Milvus
+            rows = client.query(
+                collection_name=collection_name,
+                filter=f"oid in {json.dumps(sorted(missing_oids))}",
+                output_fields=["oid", "name", "desc", "symptom"],
+                partition_names=sorted(searched_partitions) if router is not None else None
+            )
+            rows_by_oid = {row['oid']: row for row in rows}
+            for search_results in all_results:
+                for result_dict in search_results:
+                    row = rows_by_oid.get(result_dict['oid'])
+                    if row is not None and result_dict.get('name') is None:
+                        result_dict.update({'name': row['name'], 'desc': row['desc'], 'symptom': row['symptom']})
+
+        return all_results
 
-        client = MilvusClient(uri=f"http://{host}:{port}")
-
-        client.using_database(database_name)
-
-        query_vector = get_embedding(query, api_token)
-        if not query_vector or len(query_vector) != dimension:
-            return []
-
-        search_param_1 = {
-            "data": [query_vector],
-            "anns_field": "symptom_vector",
-            "param": {"nprobe": 16},
-            "limit": top_k * 2  
-        }
-        request_1 = AnnSearchRequest(**search_param_1)
-
-        search_param_2 = {
-            "data": [query_vector],
-            "anns_field": "desc_vector", 
-            "param": {"nprobe": 16},
-            "limit": top_k * 2  
-        }
-        request_2 = AnnSearchRequest(**search_param_2)
-
-        ranker = WeightedRanker(0.6, 0.4)
-
-        results = client.hybrid_search(
-            collection_name=collection_name,
-            reqs=[request_1, request_2],
-            ranker=ranker,
-            limit=top_k,
-            output_fields=["oid", "name", "desc", "symptom"],
-            partition_names=[partition_name]
-        )
-
-        if not results or len(results[0]) == 0:
-            return []
-        
-        search_results = []
-        for hit in results[0]:
-            result_dict = {
-                'oid': hit.entity.get('oid'),
-                'name': hit.entity.get('name'),
-                'desc': hit.entity.get('desc'),
-                'symptom': hit.entity.get('symptom'),
-                'similarity_score': float(hit.distance)
-            }
-            search_results.append(result_dict)
-        
-        return search_results
-        
     except Exception as e:
         print(f"混合搜索错误: {e}")
-        return []
+        return None
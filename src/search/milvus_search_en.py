@@ -1,11 +1,8 @@
-import sys
-import os
 from typing import List, Dict, Any
 from pymilvus import connections, db, Collection, AnnSearchRequest, WeightedRanker, MilvusClient
 
 
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'embedding'))
-from embedding import get_embedding
+from src.embedding.embedding import get_embedding
 
 def search_similar_diseases(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
 
@@ -25,7 +22,7 @@ def search_similar_diseases(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         
         # Vectorize query
         query_vector = get_embedding(query, api_token)
-        if not query_vector or len(query_vector) != dimension:
+        if len(query_vector) != dimension:
             return []
 
         search_param_1 = {
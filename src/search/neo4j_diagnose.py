@@ -1,10 +1,24 @@
-import py2neo
+from src.search.graph_snapshot import get_graph_snapshot, format_disease_info
+from src.utils.clients import get_neo4j_client, reset_client
+from src.utils.singleflight import get_flight
+
+_graph_flight = get_flight("graph")
 
 def neo4j_diagnosis_search(disease_name: str) -> str:
 
+    # 优先使用本地图快照；快照不存在时才直接查询Neo4j
+    snapshot = get_graph_snapshot()
+    if snapshot is not None:
+        return snapshot.describe(disease_name)
+
+    # 同一疾病的并发查询只访问一次Neo4j
+    return _graph_flight.do(disease_name, lambda: query_neo4j(disease_name))
+
+def query_neo4j(disease_name: str) -> str:
+
     try:
 
-        client = py2neo.Graph("bolt://localhost:7687", user="neo4j", password="neo4j123", name="neo4j")
+        client = get_neo4j_client()
         
         disease_query = f"""
         MATCH (n:疾病{{名称:'{disease_name}'}})
@@ -31,20 +45,9 @@ def neo4j_diagnosis_search(disease_name: str) -> str:
         complication_result = client.run(complication_query).data()
         complications = [record['并发疾病'] for record in complication_result]
 
-        result_text = f"疾病名称：{disease_name}\n\n"
-
-        cause = disease_info.get('病因', '')
-        if cause:
-            result_text += f"疾病病因：{cause}\n\n"
-
-        if departments:
-            result_text += f"治疗科室：{' '.join(departments)}\n\n"
-
-        if complications:
-            result_text += f"并发症：{' '.join(complications)}\n\n"
-        
-        return result_text.strip()
+        return format_disease_info(disease_name, disease_info.get('病因', ''), departments, complications)
         
     except Exception as e:
         print(f"Neo4j诊断查询错误: {e}")
+        reset_client("neo4j")
         return ""
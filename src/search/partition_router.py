@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.model.config import MILVUS_CONFIG, PARTITION_CONFIG
+
+
+DEFAULT_PARTITION_MAP_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'partition_map.json')
+DEFAULT_CENTROIDS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'partition_centroids.npy')
+
+
+def department_of(record, snapshot=None):
+    # 优先使用源数据的 cure_department，其次是图快照中的疾病所属科目；取最末一级，与图谱一致
+    departments = record.get("cure_department") or []
+    if departments:
+        return departments[-1]
+    if snapshot is not None:
+        info = snapshot.lookup(record.get("name", ""))
+        if info and info["departments"]:
+            return info["departments"][-1]
+    return PARTITION_CONFIG["default_department"]
+
+
+def partition_name(department):
+    # Milvus分区名只允许字母、数字和下划线，中文科室名取哈希；科室名与分区名的对应关系写入映射文件
+    return "dept_" + hashlib.sha1(department.encode('utf-8')).hexdigest()[:12]
+
+
+def write_partition_map(partitions, centroids, map_path=DEFAULT_PARTITION_MAP_PATH, centroids_path=DEFAULT_CENTROIDS_PATH):
+    # partitions: [{"name", "department", "count"}]，与 centroids 的行一一对应；先写临时文件再原子替换
+    os.makedirs(os.path.dirname(os.path.abspath(map_path)), exist_ok=True)
+    tmp_centroids = centroids_path + ".tmp"
+    with open(tmp_centroids, 'wb') as f:
+        np.save(f, np.asarray(centroids, dtype=np.float32))
+    os.replace(tmp_centroids, centroids_path)
+
+    tmp_map = map_path + ".tmp"
+    with open(tmp_map, 'w', encoding='utf-8') as f:
+        json.dump({
+            "version": 1,
+            "collection": MILVUS_CONFIG["collection"],
+            "field": "symptom_vector",
+            "partitions": partitions,
+        }, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_map, map_path)
+    print(f"分区映射写入完成: {len(partitions)} 个分区 -> {map_path}")
+
+
+class PartitionRouter:
+    # 最近质心分类器：查询向量与各科室分区的症状向量质心做余弦相似度，只检索最相关的几个分区
+
+    def __init__(self, partitions, centroids, config=None):
+        self.config = config or PARTITION_CONFIG
+        self.names = [partition["name"] for partition in partitions]
+        self.departments = {partition["name"]: partition["department"] for partition in partitions}
+        self.counts = np.array([partition["count"] for partition in partitions], dtype=np.int64)
+        centroids = np.asarray(centroids, dtype=np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.maximum(norms, 1e-12)
+        # 预热时整个collection已加载
+        self.loaded = set(self.names)
+        self.last_used = {name: time.monotonic() for name in self.names}
+        self.stats = {"routed": 0, "full": 0, "fallback": 0, "released": 0}
+        self.lock = threading.Lock()
+
+    def route(self, vector, min_candidates=0):
+        # 返回 (分区列表, 是否全量检索)；分区合计记录数不足 min_candidates 时继续加入次优分区
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0 or not self.names:
+            return self.full(), True
+
+        scores = self.centroids @ (vector / norm)
+        order = np.argsort(-scores)
+        if scores[order[0]] < self.config["min_score"]:
+            return self.full(), True
+
+        chosen = list(order[:self.config["top_n"]])
+        total = int(self.counts[chosen].sum())
+        for index in order[len(chosen):]:
+            if total >= min_candidates:
+                break
+            chosen.append(index)
+            total += int(self.counts[index])
+        if len(chosen) == len(self.names):
+            return self.full(), True
+
+        names = [self.names[index] for index in chosen]
+        self.touch(names)
+        with self.lock:
+            self.stats["routed"] += 1
+        return names, False
+
+    def full(self):
+        self.touch(self.names)
+        with self.lock:
+            self.stats["full"] += 1
+        return list(self.names)
+
+    def fallback(self, count):
+        # 路由分区内结果不足，回退为全量检索
+        self.touch(self.names)
+        with self.lock:
+            self.stats["fallback"] += count
+        return list(self.names)
+
+    def touch(self, names):
+        now = time.monotonic()
+        with self.lock:
+            for name in names:
+                self.last_used[name] = now
+
+    def ensure_loaded(self, client, names, force=False):
+        # 被释放的分区在下一次路由到时重新加载
+        with self.lock:
+            pending = list(names) if force else [name for name in names if name not in self.loaded]
+        if not pending:
+            return
+        client.load_partitions(MILVUS_CONFIG["collection"], pending)
+        with self.lock:
+            self.loaded.update(pending)
+
+    def release_idle(self, client, idle_seconds=None):
+        # 释放长时间未被检索的分区，冷门科室不常驻查询节点内存
+        idle_seconds = idle_seconds if idle_seconds is not None else self.config["idle_release_seconds"]
+        now = time.monotonic()
+        with self.lock:
+            idle = [name for name in self.loaded if now - self.last_used.get(name, 0.0) > idle_seconds]
+        if not idle:
+            return []
+        client.release_partitions(MILVUS_CONFIG["collection"], idle)
+        with self.lock:
+            self.loaded.difference_update(idle)
+            self.stats["released"] += len(idle)
+        print(f"释放空闲分区: {', '.join(self.departments[name] for name in idle)}")
+        return idle
+
+    def status(self):
+        with self.lock:
+            return {
+                "partitions": len(self.names),
+                "loaded": len(self.loaded),
+                **self.stats,
+            }
+
+    def inherit(self, previous):
+        # 重新加载映射时沿用旧路由的统计和分区加载状态；新出现的分区视为已加载（sync 结束时会加载collection）
+        with previous.lock:
+            released = set(previous.names) - previous.loaded
+            last_used = dict(previous.last_used)
+            stats = dict(previous.stats)
+        with self.lock:
+            self.loaded.difference_update(released)
+            for name in self.names:
+                if name in last_used:
+                    self.last_used[name] = last_used[name]
+            self.stats.update(stats)
+
+    @classmethod
+    def load(cls, map_path=DEFAULT_PARTITION_MAP_PATH, centroids_path=DEFAULT_CENTROIDS_PATH):
+        with open(map_path, 'r', encoding='utf-8') as f:
+            partition_map = json.load(f)
+        return cls(partition_map["partitions"], np.load(centroids_path))
+
+
+_router = None
+_router_mtime = None
+_router_lock = threading.Lock()
+
+
+def map_mtime(map_path):
+    try:
+        return os.stat(map_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_partition_router(map_path=DEFAULT_PARTITION_MAP_PATH, centroids_path=DEFAULT_CENTROIDS_PATH):
+    # 映射文件被 insert.py sync 重写后（修改时间变化）重新加载，新增的科室分区随之参与检索；
+    # 未启用分区或映射文件不存在时返回 None，检索整个collection
+    global _router, _router_mtime
+    if not PARTITION_CONFIG["enabled"]:
+        return None
+    mtime = map_mtime(map_path)
+    if mtime == _router_mtime:
+        return _router
+    with _router_lock:
+        if mtime != _router_mtime:
+            router = PartitionRouter.load(map_path, centroids_path) if mtime is not None else None
+            if router is not None and _router is not None:
+                router.inherit(_router)
+            _router, _router_mtime = router, mtime
+        return _router
+
+
+def searchable_partitions():
+    # 离线工具需要遍历全部数据时使用的分区列表；没有分区映射时为 None，即整个collection
+    router = get_partition_router()
+    return list(router.names) if router is not None else None
+
+
+def release_idle_partitions():
+    router = get_partition_router()
+    if router is None:
+        return []
+    from src.utils.clients import get_milvus_client
+    return router.release_idle(get_milvus_client())
@@ -0,0 +1,164 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+from src.utils.file_loader import FileLoader
+
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'disease_records.bin')
+
+# 文件格式：MAGIC | header长度(uint64) | header JSON | desc 二进制拼接区
+# header 中每条记录为 [oid, name, symptom, desc_offset, desc_length]
+MAGIC = b"DREC0001"
+
+
+class DiseaseRecord:
+    __slots__ = ("oid", "name", "symptom", "_desc", "_store")
+
+    def __init__(self, oid, name, symptom, desc, store=None):
+        self.oid = sys.intern(oid)
+        self.name = sys.intern(name)
+        self.symptom = symptom
+        self._desc = desc
+        self._store = store
+
+    @property
+    def desc(self):
+        # mmap模式下 _desc 为 (offset, length)，访问时才解码
+        if isinstance(self._desc, tuple):
+            return self._store.read_desc(*self._desc)
+        return self._desc
+
+    def to_result(self, score=None, with_desc=True):
+        # with_desc=False 时不解码 desc，由 RecordStore.hydrate 按需补全
+        result = {
+            'oid': self.oid,
+            'name': self.name,
+            'symptom': self.symptom,
+        }
+        if with_desc:
+            result['desc'] = self.desc
+        if score is not None:
+            result['similarity_score'] = score
+        return result
+
+
+class RecordStore:
+    # 以 OID 和疾病名称为键的本地疾病记录，向量检索只返回主键，由此处补全字段
+
+    def __init__(self):
+        self.by_oid = {}
+        self.by_name = {}
+        self.mm = None
+        self.blob_offset = 0
+
+    def add(self, record):
+        self.by_oid[record.oid] = record
+        # 同名疾病保留第一条
+        self.by_name.setdefault(record.name, record)
+
+    def get(self, oid):
+        return self.by_oid.get(oid)
+
+    def get_by_name(self, name):
+        return self.by_name.get(name)
+
+    def read_desc(self, offset, length):
+        start = self.blob_offset + offset
+        return self.mm[start:start + length].decode('utf-8')
+
+    def hydrate(self, results, with_desc=True):
+        # 为只有 oid 或 name 的召回结果补全 desc / symptom；with_desc=False 时只补 symptom，desc 留到需要时再解码
+        for result in results:
+            if result.get('symptom') and (result.get('desc') or not with_desc):
+                continue
+            record = self.get(result.get('oid')) if result.get('oid') else None
+            if record is None:
+                record = self.get_by_name(result.get('name'))
+            if record is None:
+                if with_desc:
+                    result.setdefault('desc', '')
+                result.setdefault('symptom', '[]')
+                continue
+            result['oid'] = result.get('oid') or record.oid
+            if with_desc:
+                result['desc'] = record.desc
+            result['symptom'] = record.symptom
+        return results
+
+    def __len__(self):
+        return len(self.by_oid)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STORE_PATH, use_mmap=True):
+        store = cls()
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是有效的疾病记录文件: {path}")
+            header_length = struct.unpack('<Q', f.read(8))[0]
+            header = json.loads(f.read(header_length).decode('utf-8'))
+            store.blob_offset = len(MAGIC) + 8 + header_length
+            if use_mmap:
+                store.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                blob = None
+            else:
+                blob = f.read()
+
+        for oid, name, symptom, offset, length in header["records"]:
+            if use_mmap:
+                desc = (offset, length)
+            else:
+                desc = blob[offset:offset + length].decode('utf-8')
+            store.add(DiseaseRecord(oid, name, symptom, desc, store))
+        return store
+
+
+def build_record_store(records, output_path=DEFAULT_STORE_PATH):
+    # records 与 MilvusInserter.load_data 的格式一致；在入库时一并生成
+
+    entries = []
+    blob = bytearray()
+    for record in records:
+        oid = record.get("_id", {}).get("$oid", "") if isinstance(record.get("_id"), dict) else record.get("oid", "")
+        if not oid:
+            continue
+        desc_bytes = (record.get("desc", "") or "").encode('utf-8')
+        symptom = record.get("symptom", [])
+        if not isinstance(symptom, str):
+            symptom = json.dumps(symptom, ensure_ascii=False)
+        entries.append([oid, record.get("name", ""), symptom, len(blob), len(desc_bytes)])
+        blob.extend(desc_bytes)
+
+    header = json.dumps({"version": 1, "count": len(entries), "records": entries}, ensure_ascii=False).encode('utf-8')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(blob)
+    os.replace(tmp_path, output_path)
+    print(f"疾病记录库构建完成: {len(entries)} 条记录 -> {output_path}")
+
+
+_loader = FileLoader("疾病记录库", RecordStore.load)
+
+
+def get_record_store(path=DEFAULT_STORE_PATH):
+    # 文件被 insert.py sync 原子替换后自动切换到新版本；文件不存在时返回 None，检索退化为由Milvus返回全部字段
+    # 旧版本的mmap仍指向被替换前的文件，正在使用它的请求不受影响
+    return _loader.get(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建本地疾病记录库")
+    parser.add_argument('--source', type=str, required=True, help='与insert.py相同格式的JSON数据文件')
+    parser.add_argument('--output', type=str, default=DEFAULT_STORE_PATH, help='记录库输出路径')
+    args = parser.parse_args()
+
+    with open(args.source, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    build_record_store(records, args.output)
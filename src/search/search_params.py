@@ -0,0 +1,49 @@
+import json
+import os
+
+from src.utils.file_loader import FileLoader
+
+
+DEFAULT_PARAMS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'search_params.json')
+
+# 未运行调参工具时使用的参数，与最初针对小规模语料设定的值一致
+DEFAULT_SEARCH_PARAMS = {
+    "index": {"index_type": "IVF_FLAT", "metric_type": "COSINE", "params": {"nlist": 128}},
+    "search": {"params": {"nprobe": 16}, "limit_factor": 2},
+    "ranker": {"type": "weighted", "weights": [0.6, 0.4]},
+}
+
+
+def build_ranker(ranker_config):
+    # weighted: 按权重合并两个向量字段的归一化分数；rrf: 只按排名融合，不依赖分数尺度
+    from pymilvus import RRFRanker, WeightedRanker
+
+    if ranker_config["type"] == "rrf":
+        return RRFRanker(ranker_config.get("k", 60))
+    return WeightedRanker(*ranker_config["weights"])
+
+
+def describe_config(config):
+    ranker = config["ranker"]
+    ranker_text = f"rrf(k={ranker.get('k', 60)})" if ranker["type"] == "rrf" else f"weighted{tuple(ranker['weights'])}"
+    return (f"{config['index']['index_type']}{config['index']['params']} "
+            f"search{config['search']['params']} limit×{config['search']['limit_factor']} {ranker_text}")
+
+
+def load_search_params(path=DEFAULT_PARAMS_PATH):
+    # 调参结果中的字段覆盖默认值；文件损坏时抛出异常，由调用方决定是否沿用当前参数
+    params = {key: dict(value) for key, value in DEFAULT_SEARCH_PARAMS.items()}
+    with open(path, 'r', encoding='utf-8') as f:
+        tuned = json.load(f)
+    for key in DEFAULT_SEARCH_PARAMS:
+        if key in tuned:
+            params[key] = {**params[key], **tuned[key]}
+    return params
+
+
+_loader = FileLoader("检索参数", load_search_params)
+
+
+def get_search_params(path=DEFAULT_PARAMS_PATH):
+    # autotune 重写参数文件后自动切换到新参数，不需要重启；文件缺失或从未成功加载时使用默认参数
+    return _loader.get(path) or DEFAULT_SEARCH_PARAMS
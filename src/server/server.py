@@ -0,0 +1,382 @@
+import argparse
+import asyncio
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from aiohttp import web
+
+from agentic_rag_pipeline import medical_diagnosis_pipeline
+from src.model.router import router
+from src.model.verifier import verifier_status
+from src.search.milvus_search import search_similar_diseases_batch
+from src.search.record_store import get_record_store
+from src.utils.resilience import backend_status
+from src.utils.scheduler import tenant_context, scheduler_status
+from src.utils.warmup import warmup, load_queries
+from src.utils.singleflight import get_flight, singleflight_status
+from src.model.config import CASCADE_CONFIG, PARTITION_CONFIG
+from src.search.partition_router import get_partition_router, release_idle_partitions
+
+
+DEFAULT_SERVER_CONFIG = {
+    "host": "0.0.0.0",
+    "port": 8000,
+    "executor": "thread",        # 诊断流程的执行方式：thread 或 process
+    "workers": 8,                # 同时执行的诊断流程数
+    "queue_size": 64,            # 等待队列上限，队列满时直接返回503
+    "default_deadline": 120.0,   # 请求未指定deadline时的默认截止时间(秒)
+    "max_deadline": 300.0,
+    "top_k": 5,
+    "batch_size": 16,            # 向量检索微批的最大请求数
+    "batch_wait_ms": 10,         # 向量检索微批的等待窗口
+    "batch_workers": 4,
+    "shutdown_grace": 30.0,      # 优雅退出时等待队列排空的时间(秒)
+    "response_margin": 1.0,      # 诊断流程的时间预算比deadline少留出的余量(秒)
+    "disease_list_file": None,
+    "mode": "two_call",          # 诊断方式：two_call（分析+诊断）或 fused（合并为一次调用）
+    "warmup": True,              # 启动时预热连接池、本地索引和collection
+    "warmup_queries_file": None, # 预热时执行的高频查询，每行一条
+}
+
+
+def warmup_worker():
+    # 进程池模式下每个子进程各自建立连接并加载本地索引
+    warmup()
+
+
+def run_pipeline(user_input, model_name, disease_list_file, milvus_results, latency_budget=None, tenant=None, priority=None, mode="two_call"):
+    # 顶层函数，保证在进程池中可以被pickle；租户和优先级在执行线程/进程内重新设置
+    with tenant_context(tenant, priority):
+        return medical_diagnosis_pipeline(
+            user_input,
+            model_name=model_name,
+            disease_list_file=disease_list_file,
+            silent_mode=True,
+            milvus_results=milvus_results,
+            latency_budget=latency_budget,
+            return_details=True,
+            mode=mode
+        )
+
+
+class MicroBatcher:
+    # 将一个时间窗口内的并发检索请求合并为一次批量向量化+一次hybrid_search
+
+    def __init__(self, batch_fn, executor, max_batch_size=16, max_wait_ms=10):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pending = []
+        self.flush_handle = None
+        self.batch_count = 0
+        self.item_count = 0
+        self.flight = get_flight("retrieve")
+
+    async def submit(self, query, top_k):
+        # 相同查询的并发请求共享一次检索；结果字典按调用方复制，下游流程可以安全修改
+        results = await self.flight.do_async((query, top_k), lambda: self._submit(query, top_k))
+        return [dict(result) for result in results]
+
+    async def _submit(self, query, top_k):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((query, top_k, future))
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        queries = [query for query, _, _ in batch]
+        top_k = max(k for _, k, _ in batch)
+        self.batch_count += 1
+        self.item_count += len(batch)
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, queries, top_k)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, k, future), result in zip(batch, results):
+            # 已超时被取消的请求直接丢弃结果
+            if not future.done():
+                future.set_result(result[:k])
+
+
+class DiagnosisServer:
+
+    def __init__(self, config=None):
+        self.config = {**DEFAULT_SERVER_CONFIG, **(config or {})}
+        self.queue = None
+        self.workers = []
+        self.accepting = False
+        self.retrieve_inflight = 0
+        self.readiness = None
+        self.stats = {"accepted": 0, "rejected": 0, "timeout": 0, "completed": 0, "failed": 0}
+
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=self.config["batch_workers"], thread_name_prefix="batch"
+        )
+        if self.config["executor"] == "process":
+            self.pipeline_executor = ProcessPoolExecutor(
+                max_workers=self.config["workers"],
+                initializer=warmup_worker if self.config["warmup"] else None
+            )
+        else:
+            self.pipeline_executor = ThreadPoolExecutor(
+                max_workers=self.config["workers"], thread_name_prefix="pipeline"
+            )
+        # 诊断请求的宽召回不带 desc，由级联预筛后按需解码；/retrieve 在返回前补全
+        self.batcher = MicroBatcher(
+            partial(search_similar_diseases_batch, with_desc=False),
+            self.io_executor,
+            max_batch_size=self.config["batch_size"],
+            max_wait_ms=self.config["batch_wait_ms"]
+        )
+
+    def build_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/diagnose", self.handle_diagnose),
+            web.post("/retrieve", self.handle_retrieve),
+            web.get("/health", self.handle_health),
+        ])
+        app.on_startup.append(self.on_startup)
+        app.on_shutdown.append(self.on_shutdown)
+        return app
+
+    async def on_startup(self, app):
+        self.queue = asyncio.Queue(maxsize=self.config["queue_size"])
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.config["workers"])]
+        self.accepting = True
+        if self.config["warmup"]:
+            asyncio.create_task(self.run_warmup())
+        self.release_task = asyncio.create_task(self.release_partitions())
+        print(f"诊断服务启动: executor={self.config['executor']}, workers={self.config['workers']}, "
+              f"queue_size={self.config['queue_size']}")
+
+    async def run_warmup(self):
+        # 预热完成前 /health 返回503，负载均衡不会把流量导到尚未就绪的实例
+        queries = load_queries(self.config["warmup_queries_file"]) if self.config["warmup_queries_file"] else None
+        loop = asyncio.get_running_loop()
+        self.readiness = await loop.run_in_executor(self.io_executor, warmup, queries)
+        print(f"预热完成，就绪: {self.readiness['ready']}")
+
+    async def release_partitions(self):
+        # 定期释放长时间未被路由到的科室分区
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(PARTITION_CONFIG["release_check_interval"])
+            try:
+                await loop.run_in_executor(self.io_executor, release_idle_partitions)
+            except Exception as e:
+                print(f"释放空闲分区失败: {e}")
+
+    def ready(self):
+        return not self.config["warmup"] or (self.readiness is not None and self.readiness["ready"])
+
+    async def on_shutdown(self, app):
+        # 停止接收新请求，在宽限期内处理完已排队的请求
+        self.accepting = False
+        print("诊断服务正在退出，等待队列中的请求完成...")
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=self.config["shutdown_grace"])
+        except asyncio.TimeoutError:
+            print(f"宽限期结束，仍有 {self.queue.qsize()} 个请求未处理")
+        for task in self.workers + [self.release_task]:
+            task.cancel()
+        await asyncio.gather(*self.workers, self.release_task, return_exceptions=True)
+        self.pipeline_executor.shutdown(wait=False, cancel_futures=True)
+        self.io_executor.shutdown(wait=False, cancel_futures=True)
+
+    def request_deadline(self, payload):
+        deadline = payload.get("deadline", self.config["default_deadline"])
+        try:
+            deadline = float(deadline)
+        except (TypeError, ValueError):
+            deadline = self.config["default_deadline"]
+        return max(0.1, min(deadline, self.config["max_deadline"]))
+
+    def reject(self, reason):
+        self.stats["rejected"] += 1
+        return web.json_response({"error": reason}, status=503, headers={"Retry-After": "1"})
+
+    async def worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            payload, deadline_at, future = await self.queue.get()
+            try:
+                # 排队期间已超时的请求不再执行
+                if future.done() or loop.time() >= deadline_at:
+                    continue
+                user_input = payload["input"]
+                milvus_results = await asyncio.wait_for(
+                    # 诊断请求按级联检索的第一级深度宽召回，后续由流程内本地预筛和重排序收窄
+                    self.batcher.submit(user_input, CASCADE_CONFIG["ann_depth"]),
+                    timeout=deadline_at - loop.time()
+                )
+                result = await loop.run_in_executor(
+                    self.pipeline_executor,
+                    run_pipeline,
+                    user_input,
+                    payload.get("model_name"),
+                    self.config["disease_list_file"],
+                    milvus_results,
+                    # 剩余的截止时间交给流程内的规划器，预留少量时间返回响应
+                    max(0.0, deadline_at - loop.time() - self.config["response_margin"]),
+                    payload.get("tenant"),
+                    payload.get("priority"),
+                    payload.get("mode") if payload.get("mode") in ("two_call", "fused") else self.config["mode"]
+                )
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def read_payload(self, request):
+        try:
+            payload = await request.json()
+        except Exception:
+            raise web.HTTPBadRequest(text="请求体必须是JSON")
+        if not isinstance(payload, dict):
+            raise web.HTTPBadRequest(text="请求体必须是JSON对象")
+        return payload
+
+    async def handle_diagnose(self, request):
+        if not self.accepting:
+            return self.reject("服务正在退出")
+        payload = await self.read_payload(request)
+        if not payload.get("input"):
+            raise web.HTTPBadRequest(text="缺少input字段")
+        # 租户和优先级优先取请求头，调度器据此做配额和公平排队
+        payload["tenant"] = request.headers.get("X-Tenant-Id") or payload.get("tenant")
+        payload["priority"] = request.headers.get("X-Priority") or payload.get("priority")
+
+        loop = asyncio.get_running_loop()
+        deadline = self.request_deadline(payload)
+        future = loop.create_future()
+        try:
+            self.queue.put_nowait((payload, loop.time() + deadline, future))
+        except asyncio.QueueFull:
+            return self.reject("请求队列已满")
+        self.stats["accepted"] += 1
+
+        start = time.time()
+        try:
+            result = await asyncio.wait_for(future, timeout=deadline)
+        except asyncio.TimeoutError:
+            self.stats["timeout"] += 1
+            return web.json_response({"error": "诊断超时"}, status=504)
+        except Exception as e:
+            self.stats["failed"] += 1
+            return web.json_response({"error": f"诊断失败: {str(e)}"}, status=500)
+        self.stats["completed"] += 1
+        return web.json_response({
+            "diagnosis": result["diagnosis"],
+            "reviewed": result["reviewed"],
+            "verification": result["verification"],
+            "skipped_stages": result["skipped_stages"],
+            "elapsed": round(time.time() - start, 3)
+        })
+
+    async def handle_retrieve(self, request):
+        if not self.accepting:
+            return self.reject("服务正在退出")
+        if self.retrieve_inflight >= self.config["queue_size"]:
+            return self.reject("检索请求过多")
+        payload = await self.read_payload(request)
+        query = payload.get("query")
+        if not query:
+            raise web.HTTPBadRequest(text="缺少query字段")
+        try:
+            top_k = int(payload.get("top_k", self.config["top_k"]))
+        except (TypeError, ValueError):
+            raise web.HTTPBadRequest(text="top_k必须是整数")
+
+        self.retrieve_inflight += 1
+        try:
+            results = await asyncio.wait_for(
+                self.batcher.submit(query, top_k), timeout=self.request_deadline(payload)
+            )
+        except asyncio.TimeoutError:
+            self.stats["timeout"] += 1
+            return web.json_response({"error": "检索超时"}, status=504)
+        finally:
+            self.retrieve_inflight -= 1
+        record_store = get_record_store()
+        if record_store is not None:
+            record_store.hydrate(results)
+        return web.json_response({"results": results})
+
+    async def handle_health(self, request):
+        partition_router = get_partition_router()
+        return web.json_response({
+            "accepting": self.accepting,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "retrieve_inflight": self.retrieve_inflight,
+            "stats": self.stats,
+            "batches": self.batcher.batch_count,
+            "batched_items": self.batcher.item_count,
+            "models": router.status(),
+            "backends": backend_status(),
+            "scheduler": scheduler_status(),
+            "coalescing": singleflight_status(),
+            "partitions": partition_router.status() if partition_router is not None else None,
+            "verifier": verifier_status(),
+            "ready": self.ready(),
+            "warmup": self.readiness,
+        }, status=200 if self.accepting and self.ready() else 503)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="医疗诊断HTTP服务")
+    parser.add_argument('--host', type=str, default=DEFAULT_SERVER_CONFIG["host"])
+    parser.add_argument('--port', type=int, default=DEFAULT_SERVER_CONFIG["port"])
+    parser.add_argument('--executor', type=str, choices=["thread", "process"], default=DEFAULT_SERVER_CONFIG["executor"], help='诊断流程的执行方式')
+    parser.add_argument('--workers', type=int, default=DEFAULT_SERVER_CONFIG["workers"], help='同时执行的诊断流程数')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_SERVER_CONFIG["queue_size"], help='等待队列上限')
+    parser.add_argument('--deadline', type=float, default=DEFAULT_SERVER_CONFIG["default_deadline"], help='默认请求截止时间(秒)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_SERVER_CONFIG["batch_size"], help='向量检索微批大小')
+    parser.add_argument('--batch-wait-ms', type=int, default=DEFAULT_SERVER_CONFIG["batch_wait_ms"], help='向量检索微批等待窗口(毫秒)')
+    parser.add_argument('--disease-list-file', type=str, default=None, help='可选疾病列表文件')
+    parser.add_argument('--mode', type=str, choices=["two_call", "fused"], default=DEFAULT_SERVER_CONFIG["mode"], help='诊断方式：分析+诊断两次调用，或合并为一次调用')
+    parser.add_argument('--no-warmup', action='store_true', help='启动时不预热')
+    parser.add_argument('--warmup-queries-file', type=str, default=None, help='预热时执行的高频查询文件')
+    args = parser.parse_args()
+
+    server = DiagnosisServer({
+        "host": args.host,
+        "port": args.port,
+        "executor": args.executor,
+        "workers": args.workers,
+        "queue_size": args.queue_size,
+        "default_deadline": args.deadline,
+        "batch_size": args.batch_size,
+        "batch_wait_ms": args.batch_wait_ms,
+        "disease_list_file": args.disease_list_file,
+        "mode": args.mode,
+        "warmup": not args.no_warmup,
+        "warmup_queries_file": args.warmup_queries_file,
+    })
+    web.run_app(
+        server.build_app(),
+        host=args.host,
+        port=args.port,
+        shutdown_timeout=DEFAULT_SERVER_CONFIG["shutdown_grace"]
+    )
@@ -0,0 +1,67 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.model.config import MILVUS_CONFIG, NEO4J_CONFIG
+
+
+# 进程内复用的客户端：openai / pymilvus / py2neo 在第一次使用时才导入
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_or_create(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+
+def get_http_session():
+    # 连接池复用TCP/TLS连接，避免每次请求重新握手
+    def create():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+    return _get_or_create("http", create)
+
+
+def get_openai_client(model_config):
+    def create():
+        from openai import OpenAI
+        # 重试由 resilient_call 统一负责
+        return OpenAI(api_key=model_config["api_key"], base_url=model_config["base_url"], max_retries=0)
+    return _get_or_create(("openai", model_config["api_key"], model_config["base_url"]), create)
+
+
+def get_milvus_client():
+    def create():
+        from pymilvus import MilvusClient
+        client = MilvusClient(uri=MILVUS_CONFIG["uri"])
+        client.using_database(MILVUS_CONFIG["database"])
+        return client
+    return _get_or_create("milvus", create)
+
+
+def get_neo4j_client():
+    def create():
+        import py2neo
+        return py2neo.Graph(
+            NEO4J_CONFIG["uri"],
+            user=NEO4J_CONFIG["user"],
+            password=NEO4J_CONFIG["password"],
+            name=NEO4J_CONFIG["name"]
+        )
+    return _get_or_create("neo4j", create)
+
+
+def reset_client(key):
+    # 连接失效时丢弃缓存的客户端，下次使用时重新创建
+    with _clients_lock:
+        _clients.pop(key, None)
@@ -18,3 +18,15 @@ def extract_diagnosis_result(content):
         return {"error": "JSON格式解析失败"}
     except Exception as e:
         return {"error": f"结果提取失败: {str(e)}"}
+
+def extract_tagged_json(content, tag):
+    # 提取 <tag>...</tag> 中的JSON对象；没有该标签或解析失败时返回 None
+
+    match = re.search(rf'<{tag}>(.*?)</{tag}>', content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        result = json.loads(match.group(1).strip())
+    except json.JSONDecodeError:
+        return None
+    return result if isinstance(result, dict) else None
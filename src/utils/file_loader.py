@@ -0,0 +1,51 @@
+import os
+import threading
+import time
+
+# 两次检查文件变化的最短间隔(秒)，检索热路径上不必每次都 stat
+RELOAD_CHECK_INTERVAL = 5.0
+
+
+class FileLoader:
+    # 按文件变化热加载本地数据文件：构建任务原子替换文件后，下一次访问时切换到新版本，不需要重启服务
+    # load(path) 负责解析文件；加载失败时继续使用当前版本，文件不存在且从未加载过时返回 None
+
+    def __init__(self, name, load, check_interval=RELOAD_CHECK_INTERVAL):
+        self.name = name
+        self.load = load
+        self.check_interval = check_interval
+        self.value = None
+        self.file_key = None
+        self.path = None
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+    def fresh(self, path, now):
+        return path == self.path and now - self.last_check < self.check_interval
+
+    def get(self, path):
+        now = time.monotonic()
+        if self.fresh(path, now):
+            return self.value
+        with self.lock:
+            if self.fresh(path, now):
+                return self.value
+            if path != self.path:
+                self.path, self.value, self.file_key = path, None, None
+            self.last_check = now
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return self.value
+            file_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if file_key != self.file_key:
+                try:
+                    value = self.load(path)
+                except Exception as e:
+                    print(f"{self.name}加载失败，继续使用当前版本: {e}")
+                    return self.value
+                if self.value is not None:
+                    print(f"{self.name}已更新: {path}")
+                self.value = value
+                self.file_key = file_key
+        return self.value
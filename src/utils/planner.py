@@ -0,0 +1,54 @@
+import time
+
+from src.model.config import STAGE_LATENCY_DEFAULTS, PLANNER_SAFETY_FACTOR, PLANNER_MIN_SAMPLES
+from src.model.router import router
+
+
+class ExecutionPlanner:
+    # 单次诊断请求的截止时间规划：根据已用时间和各阶段的实时延迟估计，决定可选阶段是否执行
+
+    def __init__(self, latency_budget=None, model_name=None):
+        self.latency_budget = latency_budget
+        self.model_name = model_name
+        self.start = time.monotonic()
+        self.skipped = []
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def remaining(self):
+        if self.latency_budget is None:
+            return float("inf")
+        return self.latency_budget - self.elapsed()
+
+    def estimate(self, stage):
+        # 只使用该阶段自己的延迟统计；样本不足时使用默认值，不借用其他阶段的数据
+        latency = router.estimate(stage, self.model_name, min_samples=PLANNER_MIN_SAMPLES)
+        if latency is None:
+            latency = STAGE_LATENCY_DEFAULTS.get(stage, 0.0)
+        return latency * PLANNER_SAFETY_FACTOR
+
+    def can_afford(self, *stages):
+        return self.remaining() >= sum(self.estimate(stage) for stage in stages)
+
+    def wait_time(self, limit, *stages):
+        # 可选阶段最多等待的时间：不超过 limit，并为其后的 stages 留出预估耗时
+        return max(0.0, min(limit, self.remaining() - sum(self.estimate(stage) for stage in stages)))
+
+    def allow(self, name, *stages):
+        # name 为可选阶段的名称，stages 为执行它以及其后必须保留时间的模型阶段
+        if self.can_afford(*stages):
+            return True
+        self.skip(name)
+        return False
+
+    def skip(self, stage):
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    def details(self):
+        return {
+            "latency_budget": self.latency_budget,
+            "elapsed": round(self.elapsed(), 3),
+            "skipped_stages": list(self.skipped),
+        }
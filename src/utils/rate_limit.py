@@ -0,0 +1,35 @@
+import threading
+import time
+
+
+class TokenBucket:
+    # 令牌桶：rate 为每秒补充的令牌数，capacity 为突发上限
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens=1.0):
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1.0):
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                return 0.0
+            if self.rate <= 0:
+                return float("inf")
+            return (tokens - self.tokens) / self.rate
@@ -0,0 +1,296 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from src.model.config import BACKEND_POLICIES
+
+
+class BackendError(Exception):
+    # 远程后端调用失败的基类
+
+    def __init__(self, backend, message, cause=None):
+        super().__init__(f"[{backend}] {message}")
+        self.backend = backend
+        self.cause = cause
+
+
+class BackendTimeoutError(BackendError):
+    pass
+
+
+class BackendUnavailableError(BackendError):
+    # 熔断器打开或在途调用已满，调用被直接拒绝
+    pass
+
+
+class BackendResponseError(BackendError):
+    # 后端返回了无法使用的响应（4xx、格式错误等），重试无意义
+    pass
+
+
+class LatencyTracker:
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+
+    def percentile(self, q):
+        with self.lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class CircuitBreaker:
+    # closed -> 连续失败达到阈值 -> open -> reset_timeout后 half_open -> 探测成功则closed
+    # half_open 时同一时刻只放行一个探测请求，探测结束前其余调用直接拒绝
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "half_open":
+                if self.probing:
+                    return False
+                self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.probing = False
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class InflightLimiter:
+    # 限制单个后端占用共享线程池的调用数：名额在线程真正结束(或被取消)时才归还，
+    # 卡死的后端最多占住 limit 个线程，不会让其它后端的调用排在失效请求后面
+    # hung 统计调用方已放弃(超时或对冲落败)但仍在运行的调用
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.inflight = 0
+        self.hung = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            if self.inflight >= self.limit:
+                return False
+            self.inflight += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def submit(self, fn, timeout):
+        # 调用前须已通过 try_acquire 取得名额
+        future = _executor.submit(fn, timeout)
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def abandon(self, future):
+        with self.lock:
+            self.hung += 1
+        future.add_done_callback(lambda _: self.finish_hung())
+
+    def finish_hung(self):
+        with self.lock:
+            self.hung -= 1
+
+    def can_hedge(self):
+        # 仍有被放弃的调用在运行时说明后端可能卡死，对冲只会再多占一个线程
+        with self.lock:
+            return self.hung == 0
+
+
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="backend")
+_breakers = {}
+_trackers = {}
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def get_policy(backend):
+    return {**BACKEND_POLICIES["default"], **BACKEND_POLICIES.get(backend, {})}
+
+
+def get_breaker(key, policy):
+    with _registry_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(policy["failure_threshold"], policy["reset_timeout"])
+        return _breakers[key]
+
+
+def get_tracker(key):
+    with _registry_lock:
+        if key not in _trackers:
+            _trackers[key] = LatencyTracker()
+        return _trackers[key]
+
+
+def get_limiter(key, policy):
+    with _registry_lock:
+        if key not in _limiters:
+            _limiters[key] = InflightLimiter(policy["max_inflight"])
+        return _limiters[key]
+
+
+def breaker_state(key):
+    with _registry_lock:
+        breaker = _breakers.get(key)
+    return breaker.state if breaker is not None else "closed"
+
+
+def backend_status():
+    with _registry_lock:
+        return {
+            key: {
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "p50": _trackers[key].percentile(0.5) if key in _trackers else None,
+                "p95": _trackers[key].percentile(0.95) if key in _trackers else None,
+                "inflight": _limiters[key].inflight if key in _limiters else 0,
+                "hung": _limiters[key].hung if key in _limiters else 0,
+            }
+            for key, breaker in _breakers.items()
+        }
+
+
+def is_retryable(error):
+    if isinstance(error, BackendResponseError):
+        return False
+    if isinstance(error, (BackendTimeoutError, requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    # requests.HTTPError 和 openai.APIStatusError 都带有状态码
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError")
+
+
+def _run_attempt(backend, fn, policy, tracker, limiter):
+    # 单次尝试：超过p95仍未返回时发出一个对冲请求，取先成功的结果
+    # 调用方已为首个请求取得 limiter 名额；对冲请求需另取名额
+    timeout = policy["timeout"]
+    start = time.monotonic()
+    futures = [limiter.submit(fn, timeout)]
+
+    hedge_delay = None
+    if policy["hedge"] and len(tracker) >= policy["hedge_min_samples"]:
+        hedge_delay = max(policy["hedge_min_delay"], tracker.percentile(0.95))
+
+    last_error = None
+    while futures:
+        elapsed = time.monotonic() - start
+        if elapsed >= timeout:
+            break
+        wait_time = timeout - elapsed
+        if hedge_delay is not None:
+            wait_time = min(wait_time, max(0.0, hedge_delay - elapsed))
+        done, pending = wait(futures, timeout=wait_time, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            tracker.record(time.monotonic() - start)
+            for other in pending:
+                if not other.cancel():
+                    limiter.abandon(other)
+            return result
+        futures = list(pending)
+        if hedge_delay is not None and time.monotonic() - start >= hedge_delay:
+            if limiter.can_hedge() and limiter.try_acquire():
+                futures.append(limiter.submit(fn, timeout))
+            hedge_delay = None
+        elif done and not futures:
+            break
+
+    if last_error is not None and not futures:
+        raise last_error
+    # 超时的请求无法中断，留在后台线程自行结束；结束前继续占用该后端的名额
+    for future in futures:
+        limiter.abandon(future)
+    raise BackendTimeoutError(backend, f"调用超时({timeout}s)")
+
+
+def resilient_call(backend, fn, endpoint=None, fallback=None):
+    # fn(timeout) 执行一次远程调用；失败时按策略重试，最终失败抛出BackendError或返回fallback()
+    policy = get_policy(backend)
+    key = f"{backend}:{endpoint}" if endpoint else backend
+    breaker = get_breaker(key, policy)
+    tracker = get_tracker(key)
+    limiter = get_limiter(key, policy)
+
+    last_error = None
+    for attempt in range(policy["max_retries"] + 1):
+        # 在途调用已满时直接拒绝，不计入熔断器，也不占用半开状态的探测名额
+        if not limiter.try_acquire():
+            last_error = BackendUnavailableError(backend, f"在途调用已达上限({limiter.limit})，暂停调用")
+            break
+        if not breaker.allow():
+            limiter.release()
+            last_error = BackendUnavailableError(backend, "熔断器已打开，暂停调用")
+            break
+        try:
+            result = _run_attempt(backend, fn, policy, tracker, limiter)
+            breaker.record_success()
+            return result
+        except Exception as e:
+            last_error = e
+            if isinstance(e, BackendResponseError) or not is_retryable(e):
+                # 后端有响应只是结果不可用，说明后端可达，探测也以此结束
+                breaker.record_success()
+                break
+            breaker.record_failure()
+            if attempt < policy["max_retries"]:
+                # full jitter 指数退避
+                delay = min(policy["backoff_max"], policy["backoff_base"] * (2 ** attempt))
+                time.sleep(random.uniform(0, delay))
+
+    if not isinstance(last_error, BackendError):
+        if is_retryable(last_error):
+            last_error = BackendError(backend, str(last_error), cause=last_error)
+        else:
+            last_error = BackendResponseError(backend, str(last_error), cause=last_error)
+    if fallback is not None:
+        print(f"后端 {key} 调用失败，使用降级结果: {last_error}")
+        return fallback()
+    raise last_error
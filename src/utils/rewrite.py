@@ -1,32 +1,42 @@
 import re
 import json
-import openai
-from ..model.config import MODELS, DEFAULT_MODEL
+from ..model.config import MODELS
 from ..model.prompt import SYMPTOM_REWRITE_PROMPT
+from ..model.router import router
+from .scheduler import estimate_tokens
+from .clients import get_openai_client
+from .singleflight import get_flight
+from .structured import structured_enabled, structured_prompt, completion_options, max_tokens
+
+_symptom_flight = get_flight("symptom")
 
 def call_symptom_api(dialog_text, model_name=None):
 
-    if model_name is None:
-        model_name = DEFAULT_MODEL
-    
-    if model_name not in MODELS:
+    if model_name is not None and model_name not in MODELS:
         raise ValueError(f"不支持的模型: {model_name}")
     
-    config = MODELS[model_name]
-    
-    client = openai.OpenAI(
-        api_key=config["api_key"],
-        base_url=config["base_url"]
-    )
+    structured = structured_enabled()
+    system_prompt = structured_prompt("symptom", SYMPTOM_REWRITE_PROMPT)
+    output_tokens = (max_tokens("symptom") or 1000) if structured else 1000
+
+    def request_symptoms(config, timeout):
+        client = get_openai_client(config)
+        options = completion_options("symptom", config) if structured else {"max_tokens": 1000}
+        return client.chat.completions.create(
+            model=config["model_name"],
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": dialog_text}
+            ],
+            temperature=0.1,
+            timeout=timeout,
+            **options
+        )
     
-    response = client.chat.completions.create(
-        model=config["model_name"],
-        messages=[
-            {"role": "system", "content": SYMPTOM_REWRITE_PROMPT},
-            {"role": "user", "content": dialog_text}
-        ],
-        temperature=0.1,
-        max_tokens=1000
+    # 相同对话的并发症状提取共享一次模型调用
+    response = _symptom_flight.do(
+        (dialog_text, model_name, structured),
+        lambda: router.call("symptom", request_symptoms, model_name, tokens=estimate_tokens(system_prompt, dialog_text, max_tokens=output_tokens))
     )
     
     return response.choices[0].message.content
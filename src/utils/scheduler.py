@@ -0,0 +1,216 @@
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from src.model.config import SCHEDULER_CONFIG
+from src.utils.rate_limit import TokenBucket
+from src.utils.resilience import BackendUnavailableError
+
+
+# 当前请求所属租户和优先级；服务端按请求头设置，线程池中执行时需显式传递上下文
+current_tenant = contextvars.ContextVar("tenant", default="default")
+current_priority = contextvars.ContextVar("priority", default="interactive")
+
+
+class AdmissionRejectedError(BackendUnavailableError):
+    # 队列过深或等待超时，请求被调度器拒绝
+    pass
+
+
+@contextmanager
+def tenant_context(tenant=None, priority=None):
+    tenant_token = current_tenant.set(tenant or "default")
+    priority_token = current_priority.set(priority if priority in SCHEDULER_CONFIG["classes"] else "interactive")
+    try:
+        yield
+    finally:
+        current_priority.reset(priority_token)
+        current_tenant.reset(tenant_token)
+
+
+def estimate_tokens(*texts, max_tokens=0):
+    # 中文文本按每字符约一个token粗略估算，再加上输出上限
+    return sum(len(text) for text in texts if text) + max_tokens
+
+
+class TenantLimiter:
+    # 每个租户两个令牌桶：请求数和token数（均按每分钟配置）
+
+    def __init__(self, requests_per_minute, tokens_per_minute, weight=1.0):
+        self.weight = weight
+        self.requests = TokenBucket(requests_per_minute / 60.0, capacity=max(1.0, requests_per_minute / 10.0))
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, capacity=max(1.0, tokens_per_minute / 10.0))
+
+    def clamp(self, tokens):
+        # 单个请求的token数超过桶容量时按容量计，避免永远无法放行
+        return min(tokens, self.tokens.capacity)
+
+    def wait_time(self, tokens):
+        return max(self.requests.wait_time(1.0), self.tokens.wait_time(self.clamp(tokens)))
+
+    def consume(self, tokens):
+        self.requests.try_acquire(1.0)
+        self.tokens.try_acquire(self.clamp(tokens))
+
+
+class Ticket:
+    __slots__ = ("finish_tag", "sequence", "priority", "tenant", "tokens")
+
+    def __init__(self, finish_tag, sequence, priority, tenant, tokens):
+        self.finish_tag = finish_tag
+        self.sequence = sequence
+        self.priority = priority
+        self.tenant = tenant
+        self.tokens = tokens
+
+    def __lt__(self, other):
+        return (self.finish_tag, self.sequence) < (other.finish_tag, other.sequence)
+
+
+class FairScheduler:
+    # 单个后端的加权公平队列：按 (优先级, 租户) 分流，虚拟完成时间最小且租户配额允许的请求先获得并发槽位
+
+    def __init__(self, name, concurrency, config=None):
+        self.name = name
+        self.config = config or SCHEDULER_CONFIG
+        self.concurrency = concurrency
+        self.inflight = {priority: 0 for priority in self.config["classes"]}
+        self.waiting = []
+        self.depth = {priority: 0 for priority in self.config["classes"]}
+        self.virtual_time = 0.0
+        self.last_finish = {}
+        self.limiters = {}
+        self.sequence = itertools.count()
+        self.stats = {"admitted": 0, "rejected": 0, "wait_total": 0.0}
+        self.cond = threading.Condition()
+
+    def limiter(self, tenant):
+        limiter = self.limiters.get(tenant)
+        if limiter is None:
+            settings = {**self.config["tenant_defaults"], **self.config["tenants"].get(tenant, {})}
+            limiter = self.limiters[tenant] = TenantLimiter(
+                settings["requests_per_minute"], settings["tokens_per_minute"], settings.get("weight", 1.0)
+            )
+        return limiter
+
+    def slots_for(self, priority):
+        # 批处理请求不能占用为交互请求预留的槽位
+        reserve = self.config["classes"][priority].get("reserve_for_interactive", 0)
+        return max(1, self.concurrency - reserve)
+
+    def has_slot(self, priority):
+        if sum(self.inflight.values()) >= self.concurrency:
+            return False
+        return self.inflight[priority] < self.slots_for(priority)
+
+    def next_ticket(self):
+        # 虚拟完成时间最小、且有空闲槽位和租户配额的请求；同时返回最短的配额等待时间
+        min_wait = None
+        for ticket in sorted(self.waiting):
+            if not self.has_slot(ticket.priority):
+                continue
+            wait = self.limiter(ticket.tenant).wait_time(ticket.tokens)
+            if wait <= 0:
+                return ticket, 0.0
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    def acquire(self, tokens=1, priority=None, tenant=None):
+        priority = priority or current_priority.get()
+        tenant = tenant or current_tenant.get()
+        class_config = self.config["classes"][priority]
+        start = time.monotonic()
+        deadline = start + self.config["max_wait"]
+
+        with self.cond:
+            if self.depth[priority] >= class_config["max_queue"]:
+                self.stats["rejected"] += 1
+                raise AdmissionRejectedError(self.name, f"{priority}队列已满({class_config['max_queue']})，拒绝租户 {tenant} 的请求")
+
+            limiter = self.limiter(tenant)
+            flow = (priority, tenant)
+            weight = class_config["weight"] * limiter.weight
+            start_tag = max(self.virtual_time, self.last_finish.get(flow, 0.0))
+            ticket = Ticket(start_tag + max(1, tokens) / weight, next(self.sequence), priority, tenant, tokens)
+            self.last_finish[flow] = ticket.finish_tag
+            self.waiting.append(ticket)
+            self.depth[priority] += 1
+
+            try:
+                while True:
+                    chosen, wait = self.next_ticket()
+                    if chosen is ticket:
+                        break
+                    if chosen is not None:
+                        # 轮到其他请求，唤醒它们后继续等待
+                        self.cond.notify_all()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["rejected"] += 1
+                        raise AdmissionRejectedError(self.name, f"租户 {tenant} 的请求排队超过 {self.config['max_wait']}s")
+                    self.cond.wait(min(remaining, wait if wait else 0.05))
+            except BaseException:
+                self.waiting.remove(ticket)
+                self.depth[priority] -= 1
+                self.cond.notify_all()
+                raise
+
+            self.waiting.remove(ticket)
+            self.depth[priority] -= 1
+            limiter.consume(tokens)
+            self.inflight[priority] += 1
+            self.virtual_time = max(self.virtual_time, ticket.finish_tag - max(1, tokens) / weight)
+            self.stats["admitted"] += 1
+            self.stats["wait_total"] += time.monotonic() - start
+        return priority
+
+    def release(self, priority):
+        with self.cond:
+            self.inflight[priority] -= 1
+            self.cond.notify_all()
+
+    def status(self):
+        with self.cond:
+            return {
+                "inflight": dict(self.inflight),
+                "queued": dict(self.depth),
+                "admitted": self.stats["admitted"],
+                "rejected": self.stats["rejected"],
+                "avg_wait": round(self.stats["wait_total"] / self.stats["admitted"], 4) if self.stats["admitted"] else 0.0,
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(backend):
+    with _schedulers_lock:
+        scheduler = _schedulers.get(backend)
+        if scheduler is None:
+            backends = SCHEDULER_CONFIG["backends"]
+            concurrency = backends.get(backend, backends["default"])["concurrency"]
+            scheduler = _schedulers[backend] = FairScheduler(backend, concurrency)
+        return scheduler
+
+
+@contextmanager
+def admission(backend, tokens=1):
+    # 所有外部模型调用的入口：按当前租户和优先级排队，取得并发槽位后再执行
+    if not SCHEDULER_CONFIG["enabled"]:
+        yield
+        return
+    scheduler = get_scheduler(backend)
+    priority = scheduler.acquire(tokens)
+    try:
+        yield
+    finally:
+        scheduler.release(priority)
+
+
+def scheduler_status():
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {name: scheduler.status() for name, scheduler in schedulers.items()}
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    # 相同key的并发调用只执行一次，其余调用等待并共享同一结果（或同一异常）
+    # 线程和asyncio调用方共用 concurrent.futures.Future，可以互相合并
+
+    def __init__(self, name):
+        self.name = name
+        self.inflight = {}
+        self.calls = 0
+        self.executed = 0
+        self.lock = threading.Lock()
+
+    def _join(self, key):
+        with self.lock:
+            self.calls += 1
+            future = self.inflight.get(key)
+            if future is not None:
+                return future, False
+            future = self.inflight[key] = Future()
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        # 先移出在途表，之后到达的调用会发起新的请求
+        with self.lock:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key, coro_fn):
+        future, leader = self._join(key)
+        if leader:
+            # 共享的请求放在独立任务中执行，发起者超时取消不会影响其他等待者
+            asyncio.ensure_future(self._run(key, future, coro_fn))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _run(self, key, future, coro_fn):
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            return
+        self._finish(key, future, result=result)
+
+    def status(self):
+        with self.lock:
+            coalesced = self.calls - self.executed
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "coalesced": coalesced,
+                "ratio": round(coalesced / self.calls, 4) if self.calls else 0.0,
+                "inflight": len(self.inflight),
+            }
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name):
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def singleflight_status():
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.status() for name, flight in flights.items()}
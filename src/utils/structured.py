@@ -0,0 +1,154 @@
+import json
+
+import jiter
+
+from src.model.config import STRUCTURED_OUTPUT_CONFIG
+from src.model.prompt import STRUCTURED_OUTPUT_INSTRUCTION, STRUCTURED_OUTPUT_EXAMPLES, STRUCTURED_REPAIR_PROMPT
+from src.model.router import router
+from src.utils.clients import get_openai_client
+from src.utils.resilience import BackendResponseError
+from src.utils.scheduler import estimate_tokens
+
+# 各阶段输出的JSON Schema；所有字段都是必填且不允许多余字段，可直接用于 json_schema 严格模式
+STRING_LIST = {"type": "array", "items": {"type": "string"}}
+SCHEMAS = {
+    "analyzer": {
+        "type": "object",
+        "properties": {"need_more_info": {"type": "boolean"}, "diseases": STRING_LIST},
+        "required": ["need_more_info", "diseases"],
+        "additionalProperties": False,
+    },
+    "symptom": {
+        "type": "object",
+        "properties": {"symptom": STRING_LIST},
+        "required": ["symptom"],
+        "additionalProperties": False,
+    },
+    "cause_rewrite": {
+        "type": "object",
+        "properties": {"simplified_cause": {"type": "string"}},
+        "required": ["simplified_cause"],
+        "additionalProperties": False,
+    },
+    "expert": {
+        "type": "object",
+        "properties": {"is_correct": {"type": "boolean"}, "recommended_diseases": STRING_LIST, "reason": {"type": "string"}},
+        "required": ["is_correct", "recommended_diseases", "reason"],
+        "additionalProperties": False,
+    },
+}
+
+TYPES = {"object": dict, "array": list, "string": str, "boolean": bool}
+
+
+def structured_enabled():
+    return STRUCTURED_OUTPUT_CONFIG["enabled"]
+
+
+def structured_prompt(stage, prompt):
+    # 在提示词末尾追加JSON输出格式；未启用结构化输出时原样返回
+    if not structured_enabled():
+        return prompt
+    return prompt + STRUCTURED_OUTPUT_INSTRUCTION.replace("{example}", STRUCTURED_OUTPUT_EXAMPLES[stage])
+
+
+def max_tokens(stage):
+    return STRUCTURED_OUTPUT_CONFIG["stages"][stage]["max_tokens"]
+
+
+def completion_options(stage, model_config):
+    # 该阶段请求需要附加的 max_tokens 和 response_format；端点不支持JSON模式时只靠提示词约束
+    stage_config = STRUCTURED_OUTPUT_CONFIG["stages"][stage]
+    options = {}
+    if stage_config["max_tokens"]:
+        options["max_tokens"] = stage_config["max_tokens"]
+    mode = model_config.get("response_format") if stage_config["json_mode"] else None
+    if mode == "json_schema":
+        options["response_format"] = {"type": "json_schema", "json_schema": {"name": stage, "schema": SCHEMAS[stage], "strict": True}}
+    elif mode == "json_object":
+        options["response_format"] = {"type": "json_object"}
+    return options
+
+
+def validate(value, schema, path="$"):
+    # 按Schema校验类型和必填字段，返回第一处错误的描述；合格时返回 None
+    expected = TYPES[schema["type"]]
+    if not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+        return f"{path} 应为 {schema['type']}"
+    if schema["type"] == "object":
+        for key in schema["required"]:
+            if key not in value:
+                return f"缺少字段 {path}.{key}"
+        for key, item in value.items():
+            if key not in schema["properties"]:
+                return f"多余字段 {path}.{key}"
+            error = validate(item, schema["properties"][key], f"{path}.{key}")
+            if error:
+                return error
+    elif schema["type"] == "array":
+        for index, item in enumerate(value):
+            error = validate(item, schema["items"], f"{path}[{index}]")
+            if error:
+                return error
+    return None
+
+
+def parse_json(content):
+    # 取出最外层的JSON对象后用jiter解析；部分模型在JSON模式下仍会包一层代码块
+    start = content.find("{")
+    end = content.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("没有找到JSON对象")
+    return jiter.from_json(content[start:end + 1].encode('utf-8'))
+
+
+def check(stage, content):
+    if not content:
+        raise ValueError("输出为空")
+    result = parse_json(content)
+    error = validate(result, SCHEMAS[stage])
+    if error:
+        raise ValueError(error)
+    return result
+
+
+def request_repair(stage, content, error, model_name=None):
+    # 轻量模型只根据原输出修正格式，不重复发送该阶段的上下文
+    system_prompt = STRUCTURED_REPAIR_PROMPT.format(error=error, schema=json.dumps(SCHEMAS[stage], ensure_ascii=False))
+    repair_tokens = STRUCTURED_OUTPUT_CONFIG["repair_max_tokens"]
+
+    def request(model_config, timeout):
+        options = {"max_tokens": repair_tokens}
+        if model_config.get("response_format"):
+            options["response_format"] = {"type": "json_object"}
+        client = get_openai_client(model_config)
+        return client.chat.completions.create(
+            model=model_config["model_name"],
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content or ""}
+            ],
+            temperature=0.0,
+            stream=False,
+            timeout=timeout,
+            **options
+        )
+
+    response = router.call("repair", request, model_name, tokens=estimate_tokens(system_prompt, content, max_tokens=repair_tokens))
+    return response.choices[0].message.content
+
+
+def parse_structured(stage, content, model_name=None):
+    # 解析并校验该阶段的JSON输出；不合格时做一次修复调用，仍不合格时抛出 BackendResponseError
+
+    try:
+        return check(stage, content)
+    except ValueError as e:
+        error = str(e)
+    print(f"{stage} 输出不符合格式({error})，尝试修复")
+
+    repaired = request_repair(stage, content, error, model_name)
+    try:
+        return check(stage, repaired)
+    except ValueError as e:
+        raise BackendResponseError("llm", f"{stage} 输出修复后仍不符合格式: {str(e)}")
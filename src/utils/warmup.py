@@ -0,0 +1,148 @@
+import argparse
+import mmap
+import sys
+import time
+
+from src.model.config import MODELS, MILVUS_CONFIG
+from src.utils.clients import get_http_session, get_openai_client, get_milvus_client, get_neo4j_client
+
+
+def _run_step(report, name, fn, required=True):
+    start = time.monotonic()
+    try:
+        detail = fn()
+        report[name] = {"ready": True, "required": required, "detail": detail}
+    except Exception as e:
+        report[name] = {"ready": False, "required": required, "error": str(e)}
+    report[name]["elapsed"] = round(time.monotonic() - start, 3)
+    return report[name]["ready"]
+
+
+def _import_modules():
+    import openai
+    import pymilvus
+    return {"openai": openai.__version__, "pymilvus": pymilvus.__version__}
+
+
+def _create_llm_clients():
+    # 为每个已配置的模型端点提前建立客户端
+    names = [name for name, config in MODELS.items() if config.get("base_url")]
+    for name in names:
+        get_openai_client(MODELS[name])
+    get_http_session()
+    return names
+
+
+def _load_collection():
+    # 确认collection已加载到查询节点，未加载时同步加载
+    client = get_milvus_client()
+    collection_name = MILVUS_CONFIG["collection"]
+    state = client.get_load_state(collection_name).get("state")
+    state_name = getattr(state, "name", str(state))
+    if state_name != "Loaded":
+        client.load_collection(collection_name)
+        state = client.get_load_state(collection_name).get("state")
+        state_name = getattr(state, "name", str(state))
+        if state_name != "Loaded":
+            raise RuntimeError(f"collection {collection_name} 加载状态: {state_name}")
+    return state_name
+
+
+def _load_record_store():
+    from src.search.record_store import get_record_store
+
+    store = get_record_store()
+    if store is None:
+        raise FileNotFoundError("疾病记录库不存在")
+    # 提示内核预读desc区，首批请求不再因缺页读盘
+    if store.mm is not None and hasattr(store.mm, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+        store.mm.madvise(mmap.MADV_WILLNEED)
+    return len(store)
+
+
+def _load_lexical_index():
+    from src.search.lexical_index import get_lexical_index
+
+    if get_lexical_index() is None:
+        raise FileNotFoundError("关键词索引不存在")
+    return "loaded"
+
+
+def _load_graph_index():
+    from src.search.graph_candidates import get_symptom_graph_index
+
+    index = get_symptom_graph_index()
+    if index is None:
+        raise FileNotFoundError("症状矩阵不存在")
+    return len(index.diseases)
+
+
+def _load_graph_snapshot():
+    from src.search.graph_snapshot import get_graph_snapshot
+
+    snapshot = get_graph_snapshot()
+    if snapshot is None:
+        raise FileNotFoundError("图快照不存在")
+    return {"diseases": len(snapshot), "version": snapshot.version}
+
+
+def _load_disease_graph():
+    from src.search.disease_graph import get_disease_graph
+
+    graph = get_disease_graph()
+    if graph is None:
+        raise FileNotFoundError("疾病近邻表不存在")
+    return len(graph)
+
+
+def _check_neo4j():
+    get_neo4j_client().run("RETURN 1").data()
+    return "connected"
+
+
+def _run_queries(queries):
+    # 预热向量化连接和各检索组件
+    from src.search.milvus_search import search_similar_diseases_batch
+
+    results = search_similar_diseases_batch(queries, top_k=5)
+    return sum(1 for result in results if result)
+
+
+def warmup(frequent_queries=None):
+    # 启动时建立连接池、加载本地索引并确认collection已加载；返回各组件的就绪状态
+
+    report = {}
+    _run_step(report, "imports", _import_modules)
+    _run_step(report, "llm_clients", _create_llm_clients)
+    _run_step(report, "milvus", _load_collection)
+    _run_step(report, "record_store", _load_record_store, required=False)
+    _run_step(report, "lexical_index", _load_lexical_index, required=False)
+    _run_step(report, "graph_index", _load_graph_index, required=False)
+    _run_step(report, "disease_graph", _load_disease_graph, required=False)
+    has_snapshot = _run_step(report, "graph_snapshot", _load_graph_snapshot, required=False)
+    # 有图快照时请求路径不访问Neo4j，仅在缺少快照时检查Neo4j连接
+    if not has_snapshot:
+        _run_step(report, "neo4j", _check_neo4j)
+    if frequent_queries:
+        _run_step(report, "frequent_queries", lambda: _run_queries(frequent_queries), required=False)
+
+    ready = all(step["ready"] for step in report.values() if step["required"])
+    return {"ready": ready, "components": report}
+
+
+def load_queries(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预热诊断服务依赖并报告各组件就绪状态")
+    parser.add_argument('--queries-file', type=str, default=None, help='高频查询文件，每行一条')
+    args = parser.parse_args()
+
+    result = warmup(load_queries(args.queries_file) if args.queries_file else None)
+    for name, step in result["components"].items():
+        status = "✓" if step["ready"] else ("✗" if step["required"] else "-")
+        print(f"{status} {name:<18} {step['elapsed']:>7.3f}s  {step.get('detail', step.get('error', ''))}")
+    print(f"\n就绪: {result['ready']}")
+    sys.exit(0 if result["ready"] else 1)
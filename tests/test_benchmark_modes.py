@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import benchmark_modes
+
+
+class FakeClient:
+
+    def __init__(self, content):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.content = content
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+
+def test_judge_bypasses_router(monkeypatch):
+    client = FakeClient("<r>1</r>")
+    monkeypatch.setattr(benchmark_modes, "get_openai_client", lambda model_config: client)
+
+    def routed(*args, **kwargs):
+        raise AssertionError("评估不应经过router")
+
+    monkeypatch.setattr(benchmark_modes.router, "call", routed)
+    calls_before = benchmark_modes.llm_calls()
+    assert benchmark_modes.judge("对话", "胃炎", "胃炎") is True
+    assert len(client.calls) == 1
+    assert benchmark_modes.llm_calls() == calls_before
+
+
+def test_judge_returns_none_without_verdict(monkeypatch):
+    monkeypatch.setattr(benchmark_modes, "get_openai_client", lambda model_config: FakeClient("无法判断"))
+    assert benchmark_modes.judge("对话", "胃炎", "肠炎") is None
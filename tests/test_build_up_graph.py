@@ -0,0 +1,36 @@
+from src.neo4j import build_up_graph
+from src.neo4j.build_up_graph import create_all_relationship, import_disease_data, import_entity
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.runs = []
+
+    def run(self, order, **params):
+        self.runs.append((order, params))
+
+
+def test_imports_are_batched_from_generators(monkeypatch):
+    monkeypatch.setattr(build_up_graph, "BATCH_SIZE", 2)
+    client = FakeClient()
+
+    import_entity(client, "药品", ["奥美拉唑", "阿莫西林", "布洛芬"])
+    assert [params["names"] for _, params in client.runs] == [["奥美拉唑", "阿莫西林"], ["布洛芬"]]
+
+    client.runs.clear()
+    diseases = ({name: f"{name}{i}" for name in build_up_graph.DISEASE_PROPERTIES} | {"symptom": []} for i in range(3))
+    import_disease_data(client, "疾病", diseases, 3)
+    assert [len(params["rows"]) for _, params in client.runs] == [2, 1]
+    assert "symptom" not in client.runs[0][1]["rows"][0]
+
+    client.runs.clear()
+    relations = iter([
+        ("疾病", "胃炎", "疾病使用药品", "药品", "奥美拉唑"),
+        ("疾病", "胃炎", "疾病的症状", "疾病症状", "腹痛"),
+        ("疾病", "感冒", "疾病使用药品", "药品", "布洛芬"),
+    ])
+    create_all_relationship(client, relations, 3)
+    assert len(client.runs) == 3
+    assert client.runs[0][1]["rows"] == [{"head": "胃炎", "tail": "奥美拉唑"}]
+    assert "疾病使用药品" in client.runs[0][0] and ":药品{名称:row.tail}" in client.runs[0][0]
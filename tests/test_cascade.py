@@ -0,0 +1,69 @@
+import json
+
+from src.search import cascade
+from src.search.cascade import adaptive_cut, cascade_rank
+from src.search.record_store import DiseaseRecord, RecordStore
+
+
+class CountingStore(RecordStore):
+    # desc 以 (offset, length) 保存，记录每次解码的偏移
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def read_desc(self, offset, length):
+        self.reads.append(offset)
+        return f"描述{offset}"
+
+
+def make_store(count):
+    store = CountingStore()
+    for i in range(count):
+        symptom = json.dumps(["腹痛", "发热"] if i % 2 == 0 else [f"症状{i}"], ensure_ascii=False)
+        store.add(DiseaseRecord(f"oid{i}", f"疾病{i}", symptom, (i, 0), store))
+    return store
+
+
+def test_adaptive_cut_keeps_results_above_ratio():
+    results = [{"score": score} for score in (1.0, 0.9, 0.6, 0.4, 0.1)]
+    assert [r["score"] for r in adaptive_cut(results, "score", 1, 5, 0.5)] == [1.0, 0.9, 0.6]
+
+
+def test_adaptive_cut_respects_bounds():
+    results = [{"score": score} for score in (0.2, 1.0, 0.95, 0.9, 0.85)]
+    assert [r["score"] for r in adaptive_cut(results, "score", 1, 3, 0.5)] == [1.0, 0.95, 0.9]
+    assert [r["score"] for r in adaptive_cut(results, "score", 2, 5, 0.99)] == [1.0, 0.95]
+    assert len(adaptive_cut(results[:2], "score", 3, 5, 0.5)) == 2
+
+
+def test_adaptive_cut_without_positive_score_returns_min_k():
+    results = [{"score": 0.0}, {"score": None}, {}]
+    assert len(adaptive_cut(results, "score", 1, 3, 0.5)) == 1
+
+
+def test_cascade_decodes_desc_only_for_prefilter_survivors(monkeypatch):
+    store = make_store(40)
+    monkeypatch.setattr(cascade, "get_record_store", lambda: store)
+    # 重排序不可用时 rerank_diseases 原样返回输入
+    monkeypatch.setattr(cascade, "rerank_diseases", lambda query, candidates: candidates)
+
+    candidates = [record.to_result(1.0 - i / 100, with_desc=False) for i, record in enumerate(store.by_oid.values())]
+    assert store.reads == []
+    assert all('desc' not in candidate for candidate in candidates)
+
+    config = dict(cascade.CASCADE_CONFIG, prefilter_min=5, prefilter_max=8, llm_max=3)
+    final, depths = cascade_rank("腹痛发热", candidates, ["腹痛", "发热"], config)
+
+    assert depths == {"ann": 40, "prefilter": 8, "llm": 3}
+    assert len(store.reads) == depths["prefilter"]
+    assert all(candidate['desc'] == f"描述{candidate['oid'][3:]}" for candidate in final)
+    assert sum('desc' in candidate for candidate in candidates) == depths["prefilter"]
+
+
+def test_hydrate_without_desc_fills_symptom_only():
+    store = make_store(2)
+    results = store.hydrate([{"name": "疾病1"}], with_desc=False)
+    assert results == [{"name": "疾病1", "oid": "oid1", "symptom": '["症状1"]'}]
+    assert store.reads == []
+    store.hydrate(results)
+    assert results[0]["desc"] == "描述1"
@@ -0,0 +1,34 @@
+import diagnosis_session
+from diagnosis_session import DiagnosisSession
+
+
+def test_stage_scores_do_not_leak_between_turns(monkeypatch):
+    pools = [
+        [{"oid": "a", "name": "胃炎", "similarity_score": 0.9}],
+        [{"oid": "b", "name": "肠炎", "similarity_score": 0.8}],
+    ]
+    received = []
+
+    def search(queries, top_k, symptom_lists=None, vectors=None, with_desc=True):
+        return [[dict(c) for c in pools[len(received)]] for _ in queries]
+
+    def pipeline(dialog, milvus_results=None, **kwargs):
+        received.append([dict(c) for c in milvus_results])
+        # 模拟重排序和级联预筛在候选上写入分数
+        for rank, candidate in enumerate(milvus_results):
+            candidate['prefilter_score'] = 1.0
+            candidate['relevance_score'] = 1.0 - rank / 10
+        return f"诊断{len(received)}"
+
+    monkeypatch.setattr(diagnosis_session, "embed_queries", lambda queries: [None])
+    monkeypatch.setattr(diagnosis_session, "get_symptom_graph_index", lambda: None)
+    monkeypatch.setattr(diagnosis_session, "search_similar_diseases_batch", search)
+    monkeypatch.setattr(diagnosis_session, "medical_diagnosis_pipeline", pipeline)
+
+    session = DiagnosisSession()
+    assert session.add_message("胃痛") == "诊断1"
+    assert session.add_message("腹泻") == "诊断2"
+
+    assert [c["name"] for c in received[1]] == ["胃炎", "肠炎"]
+    assert all("relevance_score" not in c and "prefilter_score" not in c for turn in received for c in turn)
+    assert all("relevance_score" not in c for c in session.candidates.values())
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from src.search import disease_graph
+from src.search.disease_graph import DiseaseGraph, build_disease_graph, compute_neighbors
+
+CONFIG = {"k": 2, "max_complications": 1, "complication_bonus": 0.5}
+
+
+def brute_force(symptom_vectors, desc_vectors, k, weights):
+    symptom = symptom_vectors / np.linalg.norm(symptom_vectors, axis=1, keepdims=True)
+    desc = desc_vectors / np.linalg.norm(desc_vectors, axis=1, keepdims=True)
+    similarity = weights[0] * symptom @ symptom.T + weights[1] * desc @ desc.T
+    np.fill_diagonal(similarity, -np.inf)
+    return np.argsort(-similarity, axis=1)[:, :k], -np.sort(-similarity, axis=1)[:, :k]
+
+
+def test_compute_neighbors_matches_brute_force_across_blocks(monkeypatch):
+    monkeypatch.setattr(disease_graph, "BLOCK_SIZE", 7)
+    rng = np.random.default_rng(0)
+    symptom_vectors = rng.normal(size=(30, 8))
+    desc_vectors = rng.normal(size=(30, 8))
+    indices, scores = compute_neighbors(symptom_vectors, desc_vectors, 4, (0.7, 0.3))
+    expected_indices, expected_scores = brute_force(symptom_vectors, desc_vectors, 4, (0.7, 0.3))
+    assert (indices == expected_indices).all()
+    assert scores == pytest.approx(expected_scores, abs=1e-5)
+
+
+def test_compute_neighbors_small_inputs():
+    indices, scores = compute_neighbors(np.eye(2), np.eye(2), 5, (0.5, 0.5))
+    assert indices.tolist() == [[1], [0]]
+    assert scores.tolist() == [[0.0], [0.0]]
+    indices, _ = compute_neighbors(np.ones((1, 3)), np.ones((1, 3)), 5, (0.5, 0.5))
+    assert indices.shape == (1, 0)
+
+
+def make_graph():
+    names = ["胃炎", "胃溃疡", "肠炎", "感冒"]
+    neighbors = np.array([[1, 2], [0, 2], [0, -1], [-1, -1]], dtype=np.int32)
+    scores = np.array([[0.9, 0.5], [0.9, 0.4], [0.5, 0.0], [0.0, 0.0]], dtype=np.float32)
+    kinds = np.array([[1, 3], [1, 1], [1, 0], [0, 0]], dtype=np.uint8)
+    return DiseaseGraph(names, neighbors, scores, kinds)
+
+
+def test_lookup_stops_at_padding():
+    graph = make_graph()
+    assert graph.lookup("胃炎") == [("胃溃疡", pytest.approx(0.9), "vector"), ("肠炎", pytest.approx(0.5), "both")]
+    assert graph.lookup("肠炎") == [("胃炎", pytest.approx(0.5), "vector")]
+    assert graph.lookup("胃炎", limit=1) == [("胃溃疡", pytest.approx(0.9), "vector")]
+    assert graph.lookup("感冒") == [] and graph.lookup("未知") == []
+
+
+def test_expand_skips_known_and_duplicate_neighbors():
+    graph = make_graph()
+    assert graph.expand(["胃炎", "胃溃疡"], 1) == ["肠炎"]
+    assert graph.expand(["胃炎"], 2, exclude={"胃溃疡"}) == ["肠炎"]
+    assert graph.expand(["未知", "肠炎"], 1) == ["胃炎"]
+    assert graph.expand(["胃炎"], 0) == []
+
+
+def test_build_merges_complications_and_round_trips(tmp_path, monkeypatch):
+    monkeypatch.setattr(disease_graph, "field_weights", lambda: (0.5, 0.5))
+    names = ["胃炎", "胃溃疡", "肠炎", "感冒"]
+    vectors = np.array([[1.0, 0.0], [0.9, 0.1], [0.6, 0.4], [0.0, 1.0]])
+    path = str(tmp_path / "knn.npz")
+    graph = build_disease_graph(names, vectors, vectors, {"胃炎": ["感冒", "胃炎"]}, output_path=path, config=CONFIG)
+
+    # 并发疾病不在向量近邻中时按实际相似度并入，排序时加分；自身不作为并发疾病
+    assert [name for name, _, _ in graph.lookup("胃炎")] == ["胃溃疡", "肠炎", "感冒"]
+    assert graph.lookup("胃炎")[2][1:] == (pytest.approx(0.0, abs=1e-6), "complication")
+    assert "感冒" not in [name for name, _, _ in graph.lookup("胃溃疡")]
+
+    loaded = DiseaseGraph.load(path)
+    assert loaded.names == names
+    assert loaded.lookup("胃炎") == graph.lookup("胃炎")
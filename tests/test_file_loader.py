@@ -0,0 +1,61 @@
+import os
+
+from src.search import lexical_index
+from src.search.lexical_index import build_lexical_index, get_lexical_index
+from src.utils.file_loader import FileLoader
+
+
+def write(path, text):
+    tmp_path = str(path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text == "坏文件":
+        raise ValueError("无法解析")
+    return text
+
+
+def test_reloads_when_file_is_replaced(tmp_path):
+    path = str(tmp_path / "data.txt")
+    loader = FileLoader("测试数据", read, check_interval=0)
+    assert loader.get(path) is None
+
+    write(path, "v1")
+    assert loader.get(path) == "v1"
+    write(path, "version 2")
+    assert loader.get(path) == "version 2"
+
+    # 新文件无法加载或被删除时继续使用当前版本
+    write(path, "坏文件")
+    assert loader.get(path) == "version 2"
+    os.remove(path)
+    assert loader.get(path) == "version 2"
+
+
+def test_checks_are_throttled(tmp_path):
+    path = str(tmp_path / "data.txt")
+    loader = FileLoader("测试数据", read, check_interval=60)
+    write(path, "v1")
+    assert loader.get(path) == "v1"
+    write(path, "version 2")
+    assert loader.get(path) == "v1"
+    loader.last_check = 0.0
+    assert loader.get(path) == "version 2"
+
+
+def test_rebuilt_lexical_index_is_served_without_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical_index, "_loader", lexical_index.FileLoader("关键词索引", lexical_index.load_lexical_index, 0))
+    path = str(tmp_path / "lexical_index.pkl")
+    build_lexical_index([{"_id": {"$oid": "o1"}, "name": "胃炎", "desc": "胃黏膜炎症", "symptom": ["腹痛"]}], path)
+    assert len(get_lexical_index(path).docs) == 1
+
+    build_lexical_index([
+        {"_id": {"$oid": "o1"}, "name": "胃炎", "desc": "胃黏膜炎症", "symptom": ["腹痛"]},
+        {"_id": {"$oid": "o2"}, "name": "感冒", "desc": "上呼吸道感染", "symptom": ["发热"]},
+    ], path)
+    assert len(get_lexical_index(path).docs) == 2
@@ -0,0 +1,33 @@
+import pytest
+
+from src.search.fusion import fuse_results
+
+
+def test_scores_are_normalized_per_leg_and_weighted():
+    dense = [{"name": "胃炎", "similarity_score": 0.8}, {"name": "肠炎", "similarity_score": 0.4}]
+    lexical = [{"name": "肠炎", "lexical_score": 12.0}, {"name": "胆囊炎", "lexical_score": 6.0}]
+    fused = fuse_results([(dense, "similarity_score", 0.6), (lexical, "lexical_score", 0.4)], top_k=5)
+
+    scores = {result["name"]: result["similarity_score"] for result in fused}
+    assert scores == pytest.approx({"肠炎": 0.6 * 0.5 + 0.4, "胃炎": 0.6, "胆囊炎": 0.2})
+    assert [result["name"] for result in fused] == ["肠炎", "胃炎", "胆囊炎"]
+
+
+def test_missing_fields_are_filled_from_other_legs():
+    dense = [{"name": "胃炎", "oid": "o1", "desc": None, "similarity_score": 1.0}]
+    graph = [{"name": "胃炎", "desc": "胃黏膜炎症", "graph_score": 1.0}]
+    fused = fuse_results([(dense, "similarity_score", 0.5), (graph, "graph_score", 0.5)], top_k=5)
+    assert fused == [{"name": "胃炎", "oid": "o1", "desc": "胃黏膜炎症", "similarity_score": pytest.approx(1.0), "graph_score": 1.0}]
+
+
+def test_empty_legs_and_keyless_results_are_skipped():
+    dense = [{"name": None, "similarity_score": 1.0}, {"name": "胃炎", "similarity_score": 0.0}]
+    fused = fuse_results([([], "lexical_score", 0.5), (dense, "similarity_score", 0.5)], top_k=1)
+    assert fused == [{"name": "胃炎", "similarity_score": 0.0}]
+
+
+def test_inputs_are_not_mutated_and_top_k_applies():
+    dense = [{"name": f"疾病{i}", "similarity_score": 1.0 - i / 10} for i in range(5)]
+    fused = fuse_results([(dense, "similarity_score", 1.0)], top_k=3)
+    assert [result["name"] for result in fused] == ["疾病0", "疾病1", "疾病2"]
+    assert dense[1]["similarity_score"] == 0.9
@@ -0,0 +1,123 @@
+import json
+from types import SimpleNamespace
+
+from pymilvus.orm.prepare import Prepare
+
+from src.milvus import insert
+from src.milvus.insert import MilvusInserter
+
+DIMENSION = 3
+
+
+def oids_of(expr):
+    return set(json.loads(expr[len("oid in "):]))
+
+
+class FakeIterator:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def next(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class PartitionedCollection:
+    # 按分区保存行，insert 经过 pymilvus 的列式数据准备；release 会打断线上检索，这里直接报错
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.parts = {}
+
+    @property
+    def partitions(self):
+        return [SimpleNamespace(name=name) for name in self.parts]
+
+    def has_partition(self, name):
+        return name in self.parts
+
+    def create_partition(self, name):
+        self.parts[name] = []
+
+    def insert(self, data, partition_name=None):
+        entities = Prepare.prepare_data(data, self.schema)
+        columns = {entity["name"]: entity["values"] for entity in entities}
+        for index in range(len(columns["oid"])):
+            self.parts[partition_name].append({name: values[index] for name, values in columns.items()})
+
+    def query_iterator(self, batch_size, expr, output_fields, partition_names):
+        return FakeIterator([dict(row) for name in partition_names for row in self.parts[name]])
+
+    def query(self, expr, output_fields):
+        oids = oids_of(expr)
+        return [dict(row) for rows in self.parts.values() for row in rows if row["oid"] in oids]
+
+    def delete(self, expr):
+        oids = oids_of(expr)
+        for name, rows in self.parts.items():
+            self.parts[name] = [row for row in rows if row["oid"] not in oids]
+
+    def located(self):
+        return {row["oid"]: name for name, rows in self.parts.items() for row in rows}
+
+    def release(self):
+        raise AssertionError("同步期间不应释放collection")
+
+    def has_index(self, index_name):
+        return True
+
+    def load(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def compact(self):
+        pass
+
+    def wait_for_compaction_completed(self):
+        pass
+
+
+def source(oid, dept, desc):
+    return {"_id": {"$oid": oid}, "name": f"疾病{oid}", "desc": desc, "symptom": ["腹痛"], "dept": dept}
+
+
+def test_department_change_moves_vectors_without_reembedding(monkeypatch):
+    inserter = MilvusInserter()
+    inserter.dimension = DIMENSION
+    inserter.partition_by_department = True
+    collection = PartitionedCollection(inserter.create_collection_schema())
+
+    embedded = []
+    monkeypatch.setattr(inserter, "vectorize_symptoms", lambda symptoms: embedded.append(symptoms) or [0.1, 0.2, 0.3])
+    monkeypatch.setattr(inserter, "vectorize_desc", lambda desc: [0.4, 0.5, 0.6])
+    monkeypatch.setattr(inserter, "record_partition", lambda record: record["dept"])
+    for name in ("connect_milvus", "create_database", "build_partition_map"):
+        monkeypatch.setattr(inserter, name, lambda *args: None)
+    monkeypatch.setattr(inserter, "create_collection", lambda: collection)
+    monkeypatch.setattr(insert, "build_lexical_index", lambda data: None)
+    monkeypatch.setattr(insert, "build_record_store", lambda data: None)
+
+    original = [source("o1", "dept_a", "描述1"), source("o2", "dept_a", "描述2")]
+    monkeypatch.setattr(inserter, "load_data", lambda path: original)
+    inserter.sync("data.json")
+    assert collection.located() == {"o1": "dept_a", "o2": "dept_a"}
+    assert len(embedded) == 2
+    vectors = {row["oid"]: row["symptom_vector"] for row in collection.parts["dept_a"]}
+
+    # o1 只换科室，o2 内容变化，o3 为新增记录
+    updated = [source("o1", "dept_b", "描述1"), source("o2", "dept_a", "新描述"), source("o3", "dept_b", "描述3")]
+    monkeypatch.setattr(inserter, "load_data", lambda path: updated)
+    embedded.clear()
+    inserter.sync("data.json")
+
+    assert collection.located() == {"o1": "dept_b", "o2": "dept_a", "o3": "dept_b"}
+    assert len(embedded) == 2
+    moved = next(row for row in collection.parts["dept_b"] if row["oid"] == "o1")
+    assert moved["symptom_vector"] == vectors["o1"]
+    assert moved["content_hash"] == inserter.content_hash("疾病o1", "描述1", '["腹痛"]')
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from src.model.config import MILVUS_CONFIG
+from src.search import milvus_search, partition_router
+from src.search.partition_router import PartitionRouter, write_partition_map
+
+PARTITIONS = [
+    {"name": "dept_a", "department": "消化内科", "count": 10},
+    {"name": "dept_b", "department": "呼吸内科", "count": 10},
+    {"name": "dept_c", "department": "皮肤科", "count": 10},
+]
+CENTROIDS = np.eye(3, dtype=np.float32)
+CONFIG = {"top_n": 1, "min_score": 0.2, "idle_release_seconds": 0}
+
+
+def test_route_picks_nearest_partition_and_widens_for_min_candidates():
+    router = PartitionRouter(PARTITIONS, CENTROIDS, CONFIG)
+    assert router.route([0.9, 0.1, 0.0]) == (["dept_a"], False)
+    names, is_full = router.route([0.9, 0.5, 0.0], min_candidates=15)
+    assert names == ["dept_a", "dept_b"] and not is_full
+    # 与所有质心都不相似时全量检索
+    assert router.route([0.0, 0.0, 0.0]) == (["dept_a", "dept_b", "dept_c"], True)
+
+
+def test_router_reloads_when_map_changes(tmp_path, monkeypatch):
+    map_path = str(tmp_path / "partition_map.json")
+    centroids_path = str(tmp_path / "partition_centroids.npy")
+    monkeypatch.setattr(partition_router, "_router", None)
+    monkeypatch.setattr(partition_router, "_router_mtime", None)
+
+    assert partition_router.get_partition_router(map_path, centroids_path) is None
+
+    write_partition_map(PARTITIONS[:2], CENTROIDS[:2], map_path, centroids_path)
+    first = partition_router.get_partition_router(map_path, centroids_path)
+    assert first.names == ["dept_a", "dept_b"]
+    assert partition_router.get_partition_router(map_path, centroids_path) is first
+
+    # sync 新增分区后重写映射文件
+    write_partition_map(PARTITIONS, CENTROIDS, map_path, centroids_path)
+    stat = os.stat(map_path)
+    os.utime(map_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = partition_router.get_partition_router(map_path, centroids_path)
+    assert second is not first
+    assert second.names == ["dept_a", "dept_b", "dept_c"]
+
+
+class FakeHit:
+
+    def __init__(self, oid, distance):
+        self.id = oid
+        self.distance = distance
+        self.entity = {"oid": oid, "name": oid, "desc": "", "symptom": "[]"}
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.partition_names = []
+
+    def hybrid_search(self, collection_name, reqs, ranker, limit, output_fields, partition_names):
+        self.partition_names.append(partition_names)
+        return [[FakeHit("o1", 0.9)] for _ in reqs[0].data]
+
+
+def test_dense_search_without_partition_map_searches_whole_collection(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(milvus_search, "get_milvus_client", lambda: client)
+    monkeypatch.setattr(milvus_search, "get_record_store", lambda: None)
+    monkeypatch.setattr(milvus_search, "get_partition_router", lambda: None)
+
+    vector = np.ones(MILVUS_CONFIG["dimension"], dtype=np.float32)
+    results = milvus_search.dense_search_batch(["腹痛"], top_k=1, vectors=[vector])
+
+    assert client.partition_names == [None]
+    assert results[0][0]["oid"] == "o1"
@@ -0,0 +1,43 @@
+from src.model.config import STAGE_LATENCY_DEFAULTS, PLANNER_SAFETY_FACTOR, PLANNER_MIN_SAMPLES
+from src.model.router import ModelRouter
+from src.utils import planner as planner_module
+from src.utils.planner import ExecutionPlanner
+
+
+def make_router(monkeypatch):
+    router = ModelRouter({"deepseek": {"max_concurrency": 4}}, {"doctor": ["deepseek"], "expert": ["deepseek"]})
+    monkeypatch.setattr(planner_module, "router", router)
+    return router
+
+
+def record(router, stage, latency, count):
+    endpoint = router.endpoints["deepseek"]
+    for _ in range(count):
+        assert endpoint.try_acquire()
+        endpoint.release(stage, latency, True)
+
+
+def test_estimate_falls_back_to_defaults_until_enough_samples(monkeypatch):
+    router = make_router(monkeypatch)
+    planner = ExecutionPlanner(latency_budget=100)
+    record(router, "doctor", 1.0, PLANNER_MIN_SAMPLES - 1)
+    assert planner.estimate("doctor") == STAGE_LATENCY_DEFAULTS["doctor"] * PLANNER_SAFETY_FACTOR
+    record(router, "doctor", 1.0, 1)
+    assert planner.estimate("doctor") == 1.0 * PLANNER_SAFETY_FACTOR
+
+
+def test_other_stage_latency_does_not_affect_gate(monkeypatch):
+    router = make_router(monkeypatch)
+    record(router, "doctor", 100.0, PLANNER_MIN_SAMPLES)
+    planner = ExecutionPlanner(latency_budget=60)
+    # 专家阶段没有自己的样本，按默认40秒估算，不受doctor阶段的慢调用影响
+    assert planner.allow("expert_review", "expert")
+    assert not planner.allow("final_doctor", "doctor")
+    assert planner.skipped == ["final_doctor"]
+
+
+def test_unbounded_budget_allows_everything(monkeypatch):
+    make_router(monkeypatch)
+    planner = ExecutionPlanner()
+    assert planner.allow("retries", "doctor", "expert")
+    assert planner.details()["skipped_stages"] == []
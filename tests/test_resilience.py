@@ -0,0 +1,151 @@
+import threading
+import time
+
+import pytest
+
+from src.utils import resilience
+from src.utils.resilience import CircuitBreaker, BackendResponseError, BackendUnavailableError, resilient_call, get_breaker, get_policy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.failures == 0
+    open_breaker(breaker)
+    assert not breaker.allow()
+
+
+def test_half_open_admits_one_probe_at_a_time(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 10
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    open_breaker(breaker)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_non_retryable_probe_closes_breaker(clock):
+    backend = "test_probe"
+    breaker = get_breaker(backend, get_policy(backend))
+    open_breaker(breaker)
+    clock.now += breaker.reset_timeout
+
+    def reject(timeout):
+        raise BackendResponseError(backend, "400")
+
+    with pytest.raises(BackendResponseError):
+        resilient_call(backend, reject)
+    assert breaker.state == "closed"
+    assert resilient_call(backend, lambda timeout: "ok") == "ok"
+
+
+def test_open_breaker_rejects_without_calling(clock):
+    backend = "test_open"
+    breaker = get_breaker(backend, get_policy(backend))
+    open_breaker(breaker)
+    calls = []
+    with pytest.raises(BackendUnavailableError):
+        resilient_call(backend, lambda timeout: calls.append(timeout))
+    assert calls == []
+
+
+def test_hung_call_blocks_hedge_and_holds_its_slot(monkeypatch):
+    backend = "test_hung"
+    monkeypatch.setitem(resilience.BACKEND_POLICIES, backend, {
+        "timeout": 0.05, "max_retries": 0, "hedge": True, "hedge_min_samples": 1, "hedge_min_delay": 0.01,
+        "max_inflight": 2,
+    })
+    tracker = resilience.get_tracker(backend)
+    tracker.record(0.001)
+    limiter = resilience.get_limiter(backend, get_policy(backend))
+    release = threading.Event()
+    calls = []
+
+    def stall(timeout):
+        calls.append(timeout)
+        release.wait(5)
+        return "late"
+
+    # 首次尝试：主请求超时前发出一个对冲请求，两者都卡住
+    with pytest.raises(resilience.BackendTimeoutError):
+        resilient_call(backend, stall)
+    assert len(calls) == 2
+    assert limiter.inflight == 2 and limiter.hung == 2
+
+    # 卡住的调用占满名额，新调用直接拒绝且不计入熔断器
+    failures = get_breaker(backend, get_policy(backend)).failures
+    with pytest.raises(BackendUnavailableError):
+        resilient_call(backend, stall)
+    assert len(calls) == 2
+    assert get_breaker(backend, get_policy(backend)).failures == failures
+
+    release.set()
+    for _ in range(100):
+        if limiter.inflight == 0:
+            break
+        time.sleep(0.01)
+    assert limiter.inflight == 0 and limiter.hung == 0
+    assert resilient_call(backend, lambda timeout: "ok") == "ok"
+
+
+def test_no_hedge_while_previous_call_is_hung(monkeypatch):
+    backend = "test_no_hedge"
+    monkeypatch.setitem(resilience.BACKEND_POLICIES, backend, {
+        "timeout": 0.05, "max_retries": 0, "hedge": True, "hedge_min_samples": 1, "hedge_min_delay": 0.01,
+    })
+    resilience.get_tracker(backend).record(0.001)
+    limiter = resilience.get_limiter(backend, get_policy(backend))
+    release = threading.Event()
+    hung = limiter.try_acquire() and limiter.submit(lambda timeout: release.wait(5), 1)
+    limiter.abandon(hung)
+    calls = []
+
+    def slow(timeout):
+        calls.append(timeout)
+        time.sleep(0.03)
+        return "ok"
+
+    assert resilient_call(backend, slow) == "ok"
+    assert len(calls) == 1
+    release.set()
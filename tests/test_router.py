@@ -0,0 +1,61 @@
+from src.model.router import ModelRouter
+
+MODELS = {
+    "deepseek": {"max_concurrency": 4},
+    "qwen": {"max_concurrency": 4},
+}
+STAGE_MODELS = {
+    "doctor": ["deepseek", "qwen"],
+    "expert": ["deepseek"],
+    "analyzer": ["qwen", "deepseek"],
+}
+
+
+def record(router, stage, name, latency, success=True):
+    endpoint = router.endpoints[name]
+    assert endpoint.try_acquire()
+    endpoint.release(stage, latency, success)
+
+
+def test_latency_is_tracked_per_stage():
+    router = ModelRouter(MODELS, STAGE_MODELS)
+    record(router, "expert", "deepseek", 60.0)
+    record(router, "analyzer", "qwen", 1.0)
+    record(router, "doctor", "deepseek", 5.0)
+    record(router, "doctor", "qwen", 8.0)
+
+    assert router.estimate("doctor") == 5.0
+    assert router.estimate("expert") == 60.0
+    # 慢的专家调用不会让doctor阶段切到qwen
+    endpoint = router.acquire("doctor")
+    assert endpoint.name == "deepseek"
+    endpoint.release("doctor", 5.0, True)
+
+
+def test_unsampled_stage_keeps_configured_order():
+    router = ModelRouter(MODELS, STAGE_MODELS)
+    record(router, "expert", "deepseek", 60.0)
+    record(router, "analyzer", "qwen", 1.0)
+
+    assert router.estimate("doctor") is None
+    assert router.acquire("doctor").name == "deepseek"
+
+
+def test_estimate_requires_min_samples():
+    router = ModelRouter(MODELS, STAGE_MODELS)
+    record(router, "doctor", "deepseek", 5.0)
+    assert router.estimate("doctor", min_samples=3) is None
+    record(router, "doctor", "deepseek", 5.0)
+    record(router, "doctor", "deepseek", 5.0)
+    assert router.estimate("doctor", min_samples=3) == 5.0
+
+
+def test_errors_only_mark_the_failing_stage_unhealthy():
+    router = ModelRouter(MODELS, STAGE_MODELS)
+    for _ in range(5):
+        record(router, "expert", "deepseek", 1.0, success=False)
+    assert not router.healthy("expert", router.endpoints["deepseek"])
+    assert router.healthy("doctor", router.endpoints["deepseek"])
+    status = router.status()["deepseek"]
+    assert status["calls"] == 5
+    assert status["stages"]["expert"]["calls"] == 5
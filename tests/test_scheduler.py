@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from src.utils.scheduler import AdmissionRejectedError, FairScheduler
+
+
+def make_config(max_wait=5.0, batch_queue=16, tenants=None):
+    return {
+        "enabled": True,
+        "max_wait": max_wait,
+        "classes": {
+            "interactive": {"weight": 8, "max_queue": 16},
+            "batch": {"weight": 1, "max_queue": batch_queue, "reserve_for_interactive": 1},
+        },
+        "backends": {"default": {"concurrency": 1}},
+        "tenant_defaults": {"requests_per_minute": 6000, "tokens_per_minute": 1000000, "weight": 1.0},
+        "tenants": tenants or {},
+    }
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+def test_tenants_are_interleaved_by_finish_tag():
+    scheduler = FairScheduler("test", 1, make_config())
+    holder = scheduler.acquire(tenant="holder")
+    order = []
+
+    def request(label, tenant):
+        priority = scheduler.acquire(tenant=tenant)
+        order.append(label)
+        scheduler.release(priority)
+
+    threads = []
+    # 租户a先连续提交三个请求，租户b随后提交一个
+    for label, tenant in (("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b")):
+        thread = threading.Thread(target=request, args=(label, tenant))
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: scheduler.depth["interactive"] == len(threads))
+
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(2.0)
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert scheduler.status()["admitted"] == 5
+
+
+def test_batch_cannot_take_reserved_interactive_slot():
+    scheduler = FairScheduler("test", 2, make_config(max_wait=0.1))
+    scheduler.acquire(priority="batch", tenant="t")
+    with pytest.raises(AdmissionRejectedError):
+        scheduler.acquire(priority="batch", tenant="t")
+    assert scheduler.acquire(priority="interactive", tenant="t") == "interactive"
+    assert scheduler.status()["inflight"] == {"interactive": 1, "batch": 1}
+
+
+def test_full_queue_is_rejected_immediately():
+    scheduler = FairScheduler("test", 1, make_config(batch_queue=0))
+    start = time.monotonic()
+    with pytest.raises(AdmissionRejectedError):
+        scheduler.acquire(priority="batch", tenant="t")
+    assert time.monotonic() - start < 0.05
+    assert scheduler.status()["rejected"] == 1
+
+
+def test_tenant_quota_limits_admission():
+    scheduler = FairScheduler("test", 4, make_config(max_wait=0.1, tenants={"slow": {"requests_per_minute": 6}}))
+    scheduler.release(scheduler.acquire(tenant="slow"))
+    with pytest.raises(AdmissionRejectedError):
+        scheduler.acquire(tenant="slow")
+    # 其他租户不受影响
+    scheduler.release(scheduler.acquire(tenant="other"))
+    assert scheduler.status()["queued"] == {"interactive": 0, "batch": 0}
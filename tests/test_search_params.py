@@ -0,0 +1,32 @@
+import json
+import os
+
+from src.search import search_params
+from src.search.search_params import DEFAULT_SEARCH_PARAMS, get_search_params
+from src.utils.file_loader import FileLoader
+
+
+def write(path, params):
+    with open(str(path) + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    os.replace(str(path) + ".tmp", path)
+
+
+def test_tuned_params_are_reloaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_params, "_loader", FileLoader("检索参数", search_params.load_search_params, 0))
+    path = str(tmp_path / "search_params.json")
+    assert get_search_params(path) == DEFAULT_SEARCH_PARAMS
+
+    write(path, {"search": {"params": {"nprobe": 32}}})
+    params = get_search_params(path)
+    assert params["search"] == {"params": {"nprobe": 32}, "limit_factor": 2}
+    assert params["ranker"] == DEFAULT_SEARCH_PARAMS["ranker"]
+
+    write(path, {"search": {"params": {"nprobe": 64}, "limit_factor": 3}, "ranker": {"type": "rrf", "k": 60}})
+    assert get_search_params(path)["search"]["limit_factor"] == 3
+    assert get_search_params(path)["ranker"]["type"] == "rrf"
+
+    # 损坏的文件不会覆盖当前参数
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{")
+    assert get_search_params(path)["search"]["params"] == {"nprobe": 64}
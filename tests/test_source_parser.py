@@ -0,0 +1,90 @@
+import json
+
+from src.neo4j.source_parser import GraphColumns, MilvusRecords, extract_record, iter_batches, parse_line, parse_source, split_ranges
+
+RECORDS = [
+    {"_id": {"$oid": "o1"}, "name": "胃炎", "desc": "胃黏膜炎症", "symptom": ["腹痛", "恶心..."],
+     "cure_department": ["内科", "消化内科"], "common_drug": ["奥美拉唑"], "acompany": ["胃溃疡"],
+     "cure_way": [["药物治疗"], "手", "支持性治疗"], "drug_detail": ["奥美拉唑,某药厂", "格式错误"]},
+    {"_id": {"$oid": "o2"}, "name": "感冒", "desc": "上呼吸道感染", "symptom": ["发热"],
+     "cure_department": ["呼吸内科"], "do_eat": ["梨"], "not_eat": ["辣椒"]},
+    {"_id": {"$oid": "o3"}, "name": "胃溃疡", "desc": "胃黏膜溃疡", "symptom": ["腹痛"]},
+]
+
+
+def write_source(path):
+    lines = [json.dumps(record, ensure_ascii=False) + "," for record in RECORDS[:2]]
+    # 非标准JSON（单引号）的行退化为 literal_eval
+    lines.append(repr(RECORDS[2]))
+    lines.append("[1, 2, 3]")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_parse_line_accepts_trailing_comma_and_python_literals():
+    assert parse_line(b'{"name": "a"},\n') == {"name": "a"}
+    assert parse_line("{'name': '胃炎'}".encode("utf-8")) == {"name": "胃炎"}
+    assert parse_line(b"[1, 2]") is None
+    assert parse_line(b"{,\n") is None
+    assert parse_line(b" ,\n") is None
+
+
+def test_extract_record_matches_graph_rules():
+    properties, relations, entities = extract_record(RECORDS[0])
+    assert properties["oid"] == "o1"
+    assert properties["symptom"] == ["腹痛", "恶心"]
+    assert ("疾病所属科目", "胃炎", "消化内科") in relations
+    assert ("疾病所属科目", "胃炎", "内科") not in relations
+    assert ("治疗的方法", "胃炎", "药物治疗") in relations
+    assert ("治疗的方法", "胃炎", "手") not in relations
+    assert ("生产", "某药厂", "奥美拉唑") in relations
+    assert ("疾病并发疾病", "胃炎", "胃溃疡") in relations
+    assert ("药品商", "某药厂") in entities
+
+
+def test_split_ranges_align_to_lines(tmp_path):
+    path = tmp_path / "source.json"
+    write_source(path)
+    data = path.read_bytes()
+    ranges = split_ranges(str(path), 3)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start and data[start - 1:start] == b"\n"
+    empty = tmp_path / "empty.json"
+    empty.write_bytes(b"")
+    assert split_ranges(str(empty), 2) == []
+
+
+def test_parse_source_round_trip(tmp_path):
+    path = tmp_path / "source.json"
+    write_source(path)
+    manifest = parse_source(str(path), str(tmp_path / "columns"), workers=2)
+    assert manifest["diseases"] == 3
+    assert manifest["skipped"] == 1
+
+    columns = GraphColumns(str(tmp_path / "columns"))
+    assert [disease["名称"] for disease in columns.diseases()] == ["胃炎", "感冒", "胃溃疡"]
+    relations = set(columns.relations())
+    assert ("疾病", "感冒", "疾病忌吃食物", "食物", "辣椒") in relations
+    assert ("疾病", "胃炎", "疾病的症状", "疾病症状", "腹痛") in relations
+    assert len(relations) == manifest["relations"]
+    assert columns.departments() == {"胃炎": "消化内科", "感冒": "呼吸内科"}
+    assert sorted(columns.entities()["食物"]) == ["梨", "辣椒"]
+
+    records = list(columns.milvus_records())
+    assert records[0] == {"_id": {"$oid": "o1"}, "name": "胃炎", "desc": "胃黏膜炎症",
+                          "symptom": ["腹痛", "恶心"], "cure_department": ["消化内科"]}
+    assert records[2]["cure_department"] == []
+
+
+def test_iter_batches_consumes_generators():
+    assert list(iter_batches((i for i in range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_batches([], 2)) == []
+
+
+def test_milvus_records_can_be_iterated_repeatedly(tmp_path):
+    path = tmp_path / "source.json"
+    write_source(path)
+    parse_source(str(path), str(tmp_path / "columns"), workers=1)
+    records = MilvusRecords(GraphColumns(str(tmp_path / "columns")))
+    assert len(records) == 3
+    assert [r["name"] for r in records] == [r["name"] for r in records] == ["胃炎", "感冒", "胃溃疡"]
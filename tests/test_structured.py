@@ -0,0 +1,67 @@
+import pytest
+
+from src.utils import structured
+from src.utils.resilience import BackendResponseError
+from src.utils.structured import SCHEMAS, check, parse_json, validate
+
+
+def test_validate_accepts_each_stage_example():
+    assert validate({"need_more_info": False, "diseases": ["胃炎"]}, SCHEMAS["analyzer"]) is None
+    assert validate({"symptom": []}, SCHEMAS["symptom"]) is None
+    assert validate({"simplified_cause": "饮食不规律"}, SCHEMAS["cause_rewrite"]) is None
+    assert validate({"is_correct": True, "recommended_diseases": [], "reason": ""}, SCHEMAS["expert"]) is None
+
+
+@pytest.mark.parametrize("value, error", [
+    ([], "$ 应为 object"),
+    ({"diseases": []}, "缺少字段 $.need_more_info"),
+    ({"need_more_info": False, "diseases": [], "extra": 1}, "多余字段 $.extra"),
+    ({"need_more_info": "false", "diseases": []}, "$.need_more_info 应为 boolean"),
+    ({"need_more_info": 0, "diseases": []}, "$.need_more_info 应为 boolean"),
+    ({"need_more_info": False, "diseases": "胃炎"}, "$.diseases 应为 array"),
+    ({"need_more_info": False, "diseases": ["胃炎", 1]}, "$.diseases[1] 应为 string"),
+])
+def test_validate_reports_first_error(value, error):
+    assert validate(value, SCHEMAS["analyzer"]) == error
+
+
+def test_bool_is_not_accepted_as_other_types():
+    assert validate({"simplified_cause": True}, SCHEMAS["cause_rewrite"]) == "$.simplified_cause 应为 string"
+
+
+def test_parse_json_strips_code_fences():
+    assert parse_json('```json\n{"symptom": ["发热"]}\n```') == {"symptom": ["发热"]}
+    with pytest.raises(ValueError):
+        parse_json("没有JSON")
+    with pytest.raises(ValueError):
+        check("symptom", "")
+
+
+def test_parse_structured_repairs_once(monkeypatch):
+    repairs = []
+
+    def repair(stage, content, error, model_name=None):
+        repairs.append(error)
+        return '{"symptom": ["发热"]}'
+
+    monkeypatch.setattr(structured, "request_repair", repair)
+    assert structured.parse_structured("symptom", '{"symptom": "发热"}') == {"symptom": ["发热"]}
+    assert repairs == ["$.symptom 应为 array"]
+    assert structured.parse_structured("symptom", '{"symptom": []}') == {"symptom": []}
+    assert len(repairs) == 1
+
+
+def test_parse_structured_raises_when_repair_fails(monkeypatch):
+    monkeypatch.setattr(structured, "request_repair", lambda *args: "仍然不是JSON")
+    with pytest.raises(BackendResponseError):
+        structured.parse_structured("symptom", "不是JSON")
+
+
+def test_completion_options_follow_endpoint_support(monkeypatch):
+    stages = {"analyzer": {"max_tokens": 256, "json_mode": True}}
+    monkeypatch.setattr(structured, "STRUCTURED_OUTPUT_CONFIG", {"stages": stages})
+    options = structured.completion_options("analyzer", {"response_format": "json_schema"})
+    assert options["max_tokens"] == 256
+    assert options["response_format"]["json_schema"]["schema"] is SCHEMAS["analyzer"]
+    assert structured.completion_options("analyzer", {"response_format": "json_object"})["response_format"] == {"type": "json_object"}
+    assert structured.completion_options("analyzer", {}) == {"max_tokens": 256}
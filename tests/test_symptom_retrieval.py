@@ -0,0 +1,40 @@
+import threading
+import time
+
+import agentic_rag_pipeline as pipeline
+from src.utils.planner import ExecutionPlanner
+
+SPECULATIVE = [{"name": "感冒", "similarity_score": 0.9}]
+
+
+def test_slow_symptom_extraction_falls_back_to_speculative_hits(monkeypatch):
+    release = threading.Event()
+
+    def slow_extraction(dialog_text, model_name=None):
+        release.wait(5)
+        return ["发热"]
+
+    def search(query, top_k=10, symptoms=None, with_desc=True):
+        assert symptoms is None, "提取超时后不应再做症状检索"
+        return list(SPECULATIVE)
+
+    monkeypatch.setattr(pipeline, "process_dialog_symptoms", slow_extraction)
+    monkeypatch.setattr(pipeline, "search_similar_diseases", search)
+    monkeypatch.setattr(pipeline, "SYMPTOM_WAIT_MAX", 0.05)
+
+    planner = ExecutionPlanner(latency_budget=None)
+    start = time.monotonic()
+    results, symptoms = pipeline.retrieve_with_symptom_extraction("发烧两天", silent_mode=True, planner=planner)
+    release.set()
+
+    assert time.monotonic() - start < 1.0
+    assert results == SPECULATIVE and symptoms == []
+    assert "symptom_extraction" in planner.skipped
+
+
+def test_wait_time_reserves_budget_for_later_stages(monkeypatch):
+    planner = ExecutionPlanner(latency_budget=30)
+    monkeypatch.setattr(planner, "estimate", lambda stage: 25.0)
+    assert 4.0 < planner.wait_time(8.0, "doctor") <= 5.0
+    assert planner.wait_time(8.0, "doctor", "expert") == 0.0
+    assert ExecutionPlanner().wait_time(8.0, "doctor") == 8.0
@@ -0,0 +1,96 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from pymilvus.orm.prepare import Prepare
+
+from src.milvus import vector_snapshot
+from src.milvus.insert import MilvusInserter
+from src.model.config import MILVUS_CONFIG
+
+DIMENSION = 3
+ROWS = [
+    {"oid": "o1", "name": "感冒", "desc": "上呼吸道感染", "symptom": '["发热"]', "content_hash": "h1",
+     "symptom_vector": [0.1, 0.2, 0.3], "desc_vector": [0.4, 0.5, 0.6]},
+    {"oid": "o2", "name": "胃炎", "desc": "胃黏膜炎症", "symptom": '["腹痛"]', "content_hash": "h2",
+     "symptom_vector": [0.7, 0.8, 0.9], "desc_vector": [1.0, 1.1, 1.2]},
+]
+
+
+class FakeIterator:
+
+    def __init__(self, rows, batch_size):
+        self.batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+
+    def next(self):
+        return self.batches.pop(0) if self.batches else []
+
+    def close(self):
+        pass
+
+
+class FakeCollection:
+    # 使用真实的collection schema，insert 经过 pymilvus 的列式数据准备，按字段名记录写入的值
+
+    def __init__(self, rows=()):
+        inserter = MilvusInserter()
+        inserter.dimension = DIMENSION
+        self.schema = inserter.create_collection_schema()
+        self.rows = list(rows)
+        self.inserted = []
+
+    def query(self, expr, output_fields, partition_names):
+        return [{"count(*)": len(self.rows)}]
+
+    def query_iterator(self, batch_size, expr, output_fields, partition_names):
+        return FakeIterator(self.rows, batch_size)
+
+    def insert(self, data, partition_name=None):
+        entities = Prepare.prepare_data(data, self.schema)
+        columns = {entity["name"]: entity["values"] for entity in entities}
+        for index in range(len(columns["oid"])):
+            self.inserted.append({name: values[index] for name, values in columns.items()})
+
+
+def test_snapshot_round_trip_matches_schema_order(tmp_path):
+    directory = str(tmp_path / "dept_x")
+    written = vector_snapshot.export_partition(FakeCollection(ROWS), "dept_x", directory, DIMENSION, batch_size=1)
+    assert written == len(ROWS)
+
+    target = FakeCollection()
+    assert vector_snapshot.import_partition_batched(target, "dept_x", directory, batch_size=1) == len(ROWS)
+    assert len(target.inserted) == len(ROWS)
+    for expected, actual in zip(ROWS, target.inserted):
+        for field in vector_snapshot.SCALAR_FIELDS:
+            assert actual[field] == expected[field]
+        for field in vector_snapshot.VECTOR_FIELDS:
+            np.testing.assert_allclose(np.asarray(actual[field], dtype=np.float32), expected[field], rtol=1e-6)
+
+
+def test_load_manifest_rejects_modified_file(tmp_path):
+    directory = tmp_path / "dept_x"
+    vector_snapshot.export_partition(FakeCollection(ROWS), "dept_x", str(directory), DIMENSION)
+    files = {
+        field: {"path": f"dept_x/{field}.npy", "sha256": vector_snapshot.file_sha256(str(directory / f"{field}.npy"))}
+        for field in vector_snapshot.FIELDS
+    }
+    manifest = {"format_version": vector_snapshot.FORMAT_VERSION, "partitions": {"dept_x": {"rows": 2, "files": files}}, "routing": {}}
+    with open(tmp_path / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    assert vector_snapshot.load_manifest(str(tmp_path))["partitions"]["dept_x"]["rows"] == 2
+
+    np.save(os.path.join(directory, "name.npy"), np.array(["篡改", "胃炎"]))
+    with pytest.raises(ValueError, match="name.npy"):
+        vector_snapshot.load_manifest(str(tmp_path))
+
+
+@pytest.mark.parametrize("collection_name, expected", [(None, MILVUS_CONFIG["collection"]), ("other", "other")])
+def test_snapshot_targets_search_collection(monkeypatch, tmp_path, collection_name, expected):
+    checked = []
+    monkeypatch.setattr(MilvusInserter, "connect_milvus", lambda self: None)
+    monkeypatch.setattr(MilvusInserter, "create_database", lambda self: None)
+    monkeypatch.setattr(vector_snapshot.utility, "has_collection", lambda name: checked.append(name) or False)
+    with pytest.raises(RuntimeError):
+        vector_snapshot.export_snapshot(str(tmp_path), collection_name=collection_name)
+    assert checked == [expected]
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.model import verifier
+from src.model.verifier import ACCEPT, ESCALATE, REJECT, verify_diagnosis
+from src.search.disease_graph import DiseaseGraph
+
+CONFIG = {"enabled": True, "accept_min_score": 0.5, "accept_margin": 0.2, "suggestions": 2}
+CANDIDATES = [
+    {"name": "胃炎", "relevance_score": 0.9},
+    {"name": "肠炎", "relevance_score": 0.4},
+    {"name": "胃溃疡", "relevance_score": 0.3},
+]
+
+
+def diagnosis(*diseases):
+    return f"<final_diagnosis>{json.dumps({'diseases': list(diseases)}, ensure_ascii=False)}</final_diagnosis>"
+
+
+@pytest.fixture(autouse=True)
+def no_local_data(monkeypatch):
+    monkeypatch.setattr(verifier, "get_disease_graph", lambda: None)
+    monkeypatch.setattr(verifier, "get_record_store", lambda: None)
+
+
+def test_accepts_clear_rerank_winner():
+    result = verify_diagnosis(diagnosis("胃炎"), CANDIDATES, config=CONFIG)
+    assert result["decision"] == ACCEPT
+    assert result["diagnostic_suggestions"] is None
+
+
+@pytest.mark.parametrize("candidates, diseases", [
+    (CANDIDATES, ["肠炎"]),
+    ([{"name": "胃炎", "relevance_score": 0.9}, {"name": "肠炎", "relevance_score": 0.8}], ["胃炎"]),
+    ([{"name": "胃炎", "relevance_score": 0.4}], ["胃炎"]),
+    ([{"name": "胃炎"}, {"name": "肠炎"}], ["胃炎"]),
+])
+def test_escalates_when_not_clearly_first(candidates, diseases):
+    assert verify_diagnosis(diagnosis(*diseases), candidates, config=CONFIG)["decision"] == ESCALATE
+
+
+def test_escalates_after_expert_rejection():
+    assert verify_diagnosis(diagnosis("胃炎"), CANDIDATES, expert_rejected=True, config=CONFIG)["decision"] == ESCALATE
+
+
+def test_rejects_malformed_output_with_candidate_suggestions():
+    result = verify_diagnosis("诊断为胃炎", CANDIDATES, config=CONFIG)
+    assert result["decision"] == REJECT
+    assert result["diagnostic_suggestions"]["recommended_diseases"] == ["胃炎", "肠炎"]
+    assert verify_diagnosis(diagnosis(), CANDIDATES, config=CONFIG)["decision"] == REJECT
+    assert verify_diagnosis("诊断为胃炎", CANDIDATES, allow_reject=False, config=CONFIG)["decision"] == ESCALATE
+
+
+def test_rejects_names_outside_catalog():
+    result = verify_diagnosis(diagnosis("胃炎", "阑尾炎"), CANDIDATES, disease_names=["胃炎", "肠炎", "胆囊炎"], config=CONFIG)
+    assert result["decision"] == REJECT
+    assert "阑尾炎" in result["reason"]
+    # 有疾病列表时只推荐列表内的疾病
+    assert result["diagnostic_suggestions"]["recommended_diseases"] == ["胃炎", "肠炎"]
+    result = verify_diagnosis(diagnosis("阑尾炎"), CANDIDATES, disease_names=["胃炎"], allow_reject=False, config=CONFIG)
+    assert result["decision"] == ESCALATE
+
+
+def test_unknown_catalog_defers_to_expert():
+    # 没有疾病列表和记录库时无法判断候选之外的名称，交给专家
+    result = verify_diagnosis(diagnosis("阑尾炎"), CANDIDATES, config=CONFIG)
+    assert result["decision"] == ESCALATE
+
+
+def test_suggestions_include_graph_neighbors(monkeypatch):
+    graph = DiseaseGraph(["胃炎", "胃溃疡"], np.array([[1], [0]]), np.array([[0.9], [0.9]]), np.array([[1], [1]]))
+    monkeypatch.setattr(verifier, "get_disease_graph", lambda: graph)
+    candidates = [{"name": "胃炎", "relevance_score": 0.9}]
+    result = verify_diagnosis("无格式输出", candidates, config=CONFIG)
+    assert result["diagnostic_suggestions"]["recommended_diseases"] == ["胃炎", "胃溃疡"]
+
+
+def test_disabled_always_escalates():
+    assert verify_diagnosis(diagnosis("胃炎"), CANDIDATES, config={**CONFIG, "enabled": False})["decision"] == ESCALATE